@@ -0,0 +1,88 @@
+from base import *
+from config import PROGRESS_FORMAT
+from exceptions import InvalidArgumentsException, InvalidLabelsException, WindowShapeChangedException
+from Session import pop_option, Command
+from Export import Export, export_stats
+
+import sys
+import traceback
+
+"""
+Exit codes of our commands, so whatever runs them can tell whether they failed
+    and if it was due to how they were ran.
+"""
+EXIT_SUCCESS = 0
+EXIT_FAILURE = 1
+EXIT_INVALID = 2
+
+class Ingest(Command):
+    """
+    Converts any new or changed images in input/ as a session would, without the GUI, via
+
+        python tako.py ingest input/ output.npy labels.txt 512 512 [--workers N] [--store npy|sqlite]
+
+    So that the slowest part of starting a session can be done ahead of time.
+    """
+
+    def __init__(self, argv):
+        super(Ingest, self).__init__(argv)
+        self.read_dataset()
+        self.dataset.close()
+
+        self.result = {"images": len(self.dataset.images), "ingested": len(self.dataset.images.ingested)}
+
+class Stats(Command):
+    """
+    Writes only the stats of a session without the GUI, via
+
+        python tako.py stats input/ output.npy labels.txt 512 512 [--workers N] [--store npy|sqlite]
+
+    Which converts any new or changed images in input/ as a session would, then writes output_stats.csv,
+        see export_stats().
+    """
+
+    def __init__(self, argv):
+        super(Stats, self).__init__(argv)
+        self.read_dataset()
+        csv_fname = self.output_fname.replace(".npy", "") + "_stats.csv"
+        totals = export_stats(self.dataset, csv_fname, None, self.workers)
+        self.dataset.close()
+
+        self.result = {"images": len(self.dataset.images), "outputs": [csv_fname],
+                "windows": dict(zip(["Nothing"] + list(self.dataset.labels), totals.tolist()))}
+
+COMMANDS = {"ingest": Ingest, "export": Export, "stats": Stats}
+
+def run(argv):
+    """
+    Runs the command argv[1] with the rest of argv, for when we're ran as a batch job, so never imports Qt.
+
+    With --progress json, everything we print to stdout is a json line, see progress(),
+        and the last is either {"event": "done", "command": ..., ...} with what the command did,
+        or {"event": "error", "message": ...}.
+
+    Returns our exit code, see EXIT_SUCCESS.
+    """
+    fmt = PROGRESS_FORMAT
+    try:
+        fmt, argv = pop_option(argv, "--progress", PROGRESS_FORMAT, cast=str, valid=lambda fmt: fmt in ("bar", "json"))
+        set_progress_format(fmt)
+
+        command = COMMANDS[argv[1]](argv[:1] + argv[2:])
+        if fmt == "json":
+            report(event="done", command=argv[1], **command.result)
+        return EXIT_SUCCESS
+
+    except (InvalidArgumentsException, InvalidLabelsException, WindowShapeChangedException) as e:
+        if fmt == "json":
+            report(event="error", message=str(e).strip())
+        else:
+            print(e, file=sys.stderr)
+        return EXIT_INVALID
+
+    except Exception as e:
+        if fmt == "json":
+            report(event="error", message="{}: {}".format(type(e).__name__, e))
+        else:
+            traceback.print_exc()
+        return EXIT_FAILURE
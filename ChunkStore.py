@@ -0,0 +1,254 @@
+import os, json, zlib, threading
+import numpy as np
+from config import CHUNK_CODECS, CHUNK_MIN_BYTES
+
+"""
+Compressors we can use for our chunks, in the format
+    name: (compress, decompress)
+
+zlib is always available, the others only if their library is installed.
+"""
+CODECS = {"zlib": (lambda b: zlib.compress(b, 1), zlib.decompress)}
+try:
+    import lz4.frame
+    CODECS["lz4"] = (lz4.frame.compress, lz4.frame.decompress)
+except ImportError:
+    pass
+try:
+    import zstandard
+    CODECS["zstd"] = (zstandard.ZstdCompressor(level=1).compress, zstandard.ZstdDecompressor().decompress)
+except ImportError:
+    pass
+try:
+    import blosc
+    CODECS["blosc"] = (blosc.compress, blosc.decompress)
+except ImportError:
+    pass
+
+MAGIC = b"TAKOCHK1"
+
+class ChunkStore():
+    """
+    A single file holding many images, each divided into a grid of chunks which are
+        compressed individually, so that reading part of an image only reads and
+        decompresses the chunks it touches.
+
+    The file is laid out as
+        MAGIC, chunk, chunk, ..., chunk
+
+    With its json index next to it in fpath + ".index.json", which has the codec used,
+        the end of the chunks it uses, and for each image its shape, dtype, chunk shape,
+        and the (offset, length) of each of its chunks in row-major order.
+
+    Chunks are only ever appended, so rewriting an image or part of one leaves its
+        old chunks in the file as unused space until the store is reset. Our index is
+        only replaced once the chunks it points to are on disk, and new chunks are only
+        written past the end of the chunks our index uses, so if we crash at any point
+        we still have our previous index and every chunk it points to.
+    """
+    def __init__(self, fpath, win_h, win_w):
+        self.fpath = fpath
+        self.index_fpath = fpath + ".index.json"
+        self.win_h, self.win_w = win_h, win_w
+        self.lock = threading.Lock()
+
+        if not os.path.exists(fpath):
+            open(fpath, "wb").close()
+        self.f = open(fpath, "r+b")
+
+        if os.path.exists(self.index_fpath):
+            with open(self.index_fpath) as f:
+                self.index = json.load(f)
+        else:
+            self.clear()
+
+        if self.index["codec"] not in CODECS:
+            raise ImportError("{} was compressed with {}, which is not installed.".format(fpath, self.index["codec"]))
+        self.compress, self.decompress = CODECS[self.index["codec"]]
+
+    def __getstate__(self):
+        #So we can be sent to spawned processes, which reopen our file. Forked ones share our handle, see read_chunk()
+        return (self.fpath, self.win_h, self.win_w)
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def clear(self):
+        #Removes all images from the store, and switches to the first available codec
+        codec = [codec for codec in CHUNK_CODECS if codec in CODECS][0]
+        self.compress, self.decompress = CODECS[codec]
+        with self.lock:
+            self.index = {"codec": codec, "end": len(MAGIC), "images": []}
+            self.f.seek(0)
+            self.f.write(MAGIC)
+            self.f.truncate()
+            self.save_index()
+
+    def chunk_shape(self, img_shape, itemsize):
+        """
+        Our chunks are sized to a multiple of our win_h x win_w windows,
+            so that reading a window never touches more chunks than it needs to.
+            We use the smallest multiple of at least CHUNK_MIN_BYTES, since compressing
+            very small chunks individually would mostly be overhead.
+        """
+        pixel_bytes = itemsize*int(np.prod(img_shape[2:]))
+        m = 1
+        while (self.win_h*m)*(self.win_w*m)*pixel_bytes < CHUNK_MIN_BYTES and (self.win_h*m < img_shape[0] or self.win_w*m < img_shape[1]):
+            m += 1
+        return [self.win_h*m, self.win_w*m]
+
+    def append_chunk(self, chunk):
+        #Writes the compressed chunk at the end of the chunks our index uses, moving that end after it
+        data = self.compress(np.ascontiguousarray(chunk).tobytes())
+        offset = self.index["end"]
+        self.f.seek(offset)
+        self.f.write(data)
+        self.f.flush()#So it can be read, see read_chunk()
+        self.index["end"] += len(data)
+        return [offset, len(data)]
+
+    def save_index(self):
+        #Syncs our chunks, then replaces our index file with our index, so it never points to chunks that aren't on disk
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        tmp_fpath = self.index_fpath + ".tmp"
+        with open(tmp_fpath, "w") as f:
+            json.dump(self.index, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_fpath, self.index_fpath)
+
+    def __setitem__(self, i, img):
+        #Stores img as image i, where i may be len(self) to add a new image
+        with self.lock:
+            ch, cw = self.chunk_shape(img.shape, img.dtype.itemsize)
+            chunks = [self.append_chunk(img[y:y+ch, x:x+cw])
+                    for y in range(0, img.shape[0], ch)
+                    for x in range(0, img.shape[1], cw)]
+
+            entry = {"shape": list(img.shape), "dtype": img.dtype.str, "chunk_shape": [ch, cw], "chunks": chunks}
+            if i == len(self.index["images"]):
+                self.index["images"].append(entry)
+            else:
+                self.index["images"][i] = entry
+            self.save_index()
+
+    def __getitem__(self, i):
+        #Lazy view of the entire image i, nothing is read until it's sliced
+        shape = self.index["images"][i]["shape"]
+        return ChunkedImage(self, i, 0, 0, shape[0], shape[1])
+
+    def __len__(self):
+        return len(self.index["images"])
+
+    def read_chunk(self, i, chunk_i):
+        #Reads and decompresses one chunk of image i
+        entry = self.index["images"][i]
+        offset, length = entry["chunks"][chunk_i]
+
+        #Without seeking, since forked worker processes share our file's position with us and each other
+        data = os.pread(self.f.fileno(), length, offset)
+
+        ch, cw = entry["chunk_shape"]
+        cols = -(-entry["shape"][1]//cw)
+        y, x = (chunk_i//cols)*ch, (chunk_i%cols)*cw
+        shape = [min(ch, entry["shape"][0]-y), min(cw, entry["shape"][1]-x)] + entry["shape"][2:]
+        return np.frombuffer(self.decompress(data), dtype=entry["dtype"]).reshape(shape)
+
+    def read(self, i, y1, x1, y2, x2):
+        #Returns the region [y1:y2, x1:x2] of image i, decompressing only the chunks it touches
+        entry = self.index["images"][i]
+        ch, cw = entry["chunk_shape"]
+        cols = -(-entry["shape"][1]//cw)
+
+        region = np.empty([y2-y1, x2-x1] + entry["shape"][2:], dtype=entry["dtype"])
+        for cy in range(y1//ch*ch, y2, ch):
+            for cx in range(x1//cw*cw, x2, cw):
+                chunk = self.read_chunk(i, (cy//ch)*cols + cx//cw)
+
+                #Overlap of this chunk and our region, in image coordinates
+                oy1, ox1 = max(y1, cy), max(x1, cx)
+                oy2, ox2 = min(y2, cy+chunk.shape[0]), min(x2, cx+chunk.shape[1])
+                region[oy1-y1:oy2-y1, ox1-x1:ox2-x1] = chunk[oy1-cy:oy2-cy, ox1-cx:ox2-cx]
+        return region
+
+    def write(self, i, y1, x1, region):
+        #Writes region into image i at (y1, x1), recompressing only the chunks it touches
+        with self.lock:
+            entry = self.index["images"][i]
+        ch, cw = entry["chunk_shape"]
+        cols = -(-entry["shape"][1]//cw)
+        y2, x2 = y1+region.shape[0], x1+region.shape[1]
+
+        for cy in range(y1//ch*ch, y2, ch):
+            for cx in range(x1//cw*cw, x2, cw):
+                chunk_i = (cy//ch)*cols + cx//cw
+                chunk = self.read_chunk(i, chunk_i).copy()
+
+                oy1, ox1 = max(y1, cy), max(x1, cx)
+                oy2, ox2 = min(y2, cy+chunk.shape[0]), min(x2, cx+chunk.shape[1])
+                chunk[oy1-cy:oy2-cy, ox1-cx:ox2-cx] = region[oy1-y1:oy2-y1, ox1-x1:ox2-x1]
+                with self.lock:
+                    entry["chunks"][chunk_i] = self.append_chunk(chunk)
+
+        with self.lock:
+            self.save_index()
+
+class ChunkedImage():
+    """
+    Lazy view of the region of image i in a ChunkStore with its top-left
+        corner at (y, x) and shape (h, w), which acts like the array it views.
+
+    Slicing it reads and decompresses only the chunks the slice touches,
+        and returns a np.ndarray, while view() returns a smaller lazy view.
+        Writes go through the store, see ChunkStore.write.
+    """
+    def __init__(self, store, i, y, x, h, w):
+        self.store, self.i = store, i
+        self.y, self.x = y, x
+        entry = store.index["images"][i]
+        self.shape = (h, w) + tuple(entry["shape"][2:])
+        self.dtype = np.dtype(entry["dtype"])
+        self.ndim = len(self.shape)
+        self.nbytes = int(np.prod(self.shape))*self.dtype.itemsize
+
+    def view(self, y, x, h, w):
+        return ChunkedImage(self.store, self.i, self.y+y, self.x+x, h, w)
+
+    def __getitem__(self, key):
+        """
+        We read the bounding rows and columns of the key from the store,
+            then apply the full key to that region, so any numpy indexing
+            works while still only reading the chunks we need.
+        """
+        if not isinstance(key, tuple):
+            key = (key,)
+        key = key + (slice(None),)*(2-len(key))
+
+        bounds, local_key = [], []
+        for k, n in zip(key[:2], self.shape[:2]):
+            if isinstance(k, slice):
+                start, stop, step = k.indices(n)
+                if step < 0:
+                    start, stop, step = stop+1, start+1, -step
+                    local_key.append(slice(None, None, -step))
+                else:
+                    local_key.append(slice(None, None, step))
+                bounds.append((start, max(start, stop)))
+            else:
+                k = k + n if k < 0 else k
+                if not 0 <= k < n:
+                    raise IndexError("index {} is out of bounds for axis with size {}".format(k, n))
+                bounds.append((k, k+1))
+                local_key.append(0)
+
+        (y1, y2), (x1, x2) = bounds
+        region = self.store.read(self.i, self.y+y1, self.x+x1, self.y+y2, self.x+x2)
+        return region[tuple(local_key) + tuple(key[2:])]
+
+    def __array__(self, dtype=None, copy=None):
+        img = self[:, :]
+        return img if dtype is None else img.astype(dtype)
+
+    def __len__(self):
+        return self.shape[0]
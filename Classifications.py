@@ -1,7 +1,71 @@
 from base import *
-from config import NPY_CLASSIFICATION_DIR
+from config import NPY_CLASSIFICATION_DIR, EDIT_LOG_FNAME, EDIT_LOG_FSYNC_SECONDS, EDIT_LOG_COMPACT_SECONDS, EXPORT_SHARD_BYTES, EXPORT_BAND_DENSITY
+from EditLog import EditLog
+import glob
+import time
+import threading
 import numpy as np
-from tqdm import tqdm
+from numpy.lib.format import open_memmap
+from multiprocessing import Pool
+
+def write_windows(imgs, cells, fpaths, sample_shape, dtype, stage=None):
+    """
+    Arguments:
+        imgs: our Images
+        cells: (n, 4) array of the (image, row, col, label id) of each labeled window, in any order
+        fpaths: (X, Y, I) filepaths to write to, see Classifications
+        sample_shape, dtype: see Images.sample_format()
+        stage: if given, we show our progress through the rows of windows as this stage, see progress()
+
+    Writes each window in cells into its place in preallocated X, Y, I memmaps, in the order of cells.
+
+    So that we only read each row of windows of each image once, and only ever have one
+        in memory, we go through the cells grouped by image and row, and copy all of that
+        row's windows into their places at once. We read the band of the row from its first
+        to its last window we need if at least EXPORT_BAND_DENSITY of the windows in it are,
+        and otherwise only read each window we need, so that sparse rows (e.g. of a shuffled
+        shard) don't read many times the windows they use.
+    """
+    win_h, win_w = imgs.win_h, imgs.win_w
+    X = open_memmap(fpaths[0], mode="w+", dtype=dtype, shape=(len(cells),) + sample_shape)
+    Y = open_memmap(fpaths[1], mode="w+", dtype=np.uint8, shape=(len(cells),))
+    I = open_memmap(fpaths[2], mode="w+", dtype=np.int64, shape=(len(cells), 3))
+    Y[:] = cells[:, 3] - 1
+    I[:] = cells[:, :3]
+
+    #Where each group of cells in the same image and row starts and ends, once sorted by them
+    order = np.lexsort((cells[:, 2], cells[:, 1], cells[:, 0]))
+    changed = np.any(np.diff(cells[order, :2], axis=0) != 0, axis=1)
+    starts = np.flatnonzero(np.concatenate([[len(cells) > 0], changed]))
+    ends = np.append(starts[1:], len(cells))
+
+    groups = list(zip(starts, ends))
+    img, img_i = None, None
+    for start, end in (progress(groups, stage) if stage is not None else groups):
+        indices = order[start:end]
+        i, row = cells[indices[0], :2]
+        cols = cells[indices, 2]
+        if i != img_i:
+            img, img_i = imgs[i], i
+
+        #Our cols are sorted, so the windows from the first to the last we need are
+        first, n = cols[0], cols[-1]-cols[0]+1
+        if len(cols) >= EXPORT_BAND_DENSITY*n:
+            #Split this band of windows into (n, win_h, win_w, ...), and take the labeled ones
+            band = np.asarray(img[row*win_h:(row+1)*win_h, first*win_w:(first+n)*win_w])
+            windows = band.reshape((win_h, n, win_w) + band.shape[2:]).swapaxes(0, 1)
+            X[indices] = windows[cols-first]
+        else:
+            for index, col in zip(indices, cols):
+                X[index] = np.asarray(img[row*win_h:(row+1)*win_h, col*win_w:(col+1)*win_w])
+
+    for output in (X, Y, I):
+        output.flush()
+
+def write_shard(args):
+    #Ran in a worker process for the cells and filepaths of each shard, see Classifications.export_shards()
+    cells, fpaths = args
+    write_windows(worker["imgs"], cells, fpaths, worker["sample_shape"], worker["dtype"])
 
 class Classifications():
     """
@@ -10,103 +74,314 @@ class Classifications():
         of this class will read and write the exact same classifications
         as other instances.
 
-    Each image's classifications are like this:
+    Each image's classifications are a grid of label ids, one cell per window:
+        For an image of shape h, w and window shape wh, ww, this is a
+            (h//wh, w//ww) np.uint8 array, where cell (i, j) is the classification of
+            the window at rows i*wh:(i+1)*wh and columns j*ww:(j+1)*ww.
+        0 is the "Nothing" classification, and k > 0 is the label at index k-1 in our Labels.
+            See design.txt.
+
+    We keep only these label ids, rather than copies of each selected window's pixels,
+        since the pixels already live in our Images. They're only gathered from
+        them when exporting, into the format of our output file:
         (X,Y,I)
         Such that for a window shape wh, ww and with n samples selected, these are formatted as follows:
             X: (n, wh, ww) - List of window inputs
-            Y: (n,) - List of the classifications of those inputs
-            I: (n, 2) - List of (i, j) indicating the row and column index 
+            Y: (n,) - List of the classifications of those inputs, as indices into our Labels
+            I: (n, 3) - List of (image, i, j) indicating the image index, and the row and column index
                 relative to wh and ww.
 
         Since .npy files don't work that way, they don't have tuples,
-            We need three files like index_X.npy, index_Y.npy, index_I.npy
-            For each image.
+            We need three files like output_X.npy, output_Y.npy, output_I.npy
+
+    So that we can constantly save progress without lagging, edits are made to
+        grids we keep in memory and appended to an EditLog, which is flushed to disk
+        every EDIT_LOG_FSYNC_SECONDS. A background thread saves the edited grids to their
+        files and empties the log every EDIT_LOG_COMPACT_SECONDS. If we crash before then,
+        the log is replayed when we next start, so no edits are lost.
+        close() stops the background thread and saves everything.
 
-        We wrap it as if it's stored in one file in that format, but we are actually 
-            referencing 3 for reads and writes.
+    If given a Database, our grids are stored in it instead of in .npy files, and edits are
+        written to it rather than to an EditLog, and committed every EDIT_LOG_FSYNC_SECONDS.
+        Since edits are saved as they're made, there's nothing to recover or compact.
+        A new database is first given the grids of our .npy files, see import_files().
     """
 
-    def __init__(self, imgs, output_fname, reset):
+    def __init__(self, imgs, output_fname, reset, database=None):
+        self.imgs = imgs
         self.output_fname = output_fname.replace(".npy","")
+        self.database = None#Only set once it has our grids, see import_files()
+
+        #Grids we've loaded into memory to edit, and which of them have edits not yet saved to their files
+        self.grids = {}
+        self.dirty = set()
+        self.lock = threading.Lock()
 
+        if database is None:
+            self.open_files(reset)
+        else:
+            #A new database starts with the classifications of any earlier sessions with our .npy files
+            if database.new and not reset and os.path.isdir(NPY_CLASSIFICATION_DIR):
+                self.import_files(database)
+
+            #Images (re)converted this session start with no labeled cells, and on reset the database is already empty
+            for i in imgs.ingested:
+                database.clear_cells(i)
+            database.commit()
+        self.database = database
+
+        #Start saving our edits in the background
+        self.stopped = threading.Event()
+        self.saver = threading.Thread(target=self.save_periodically, daemon=True)
+        self.saver.start()
+
+    def open_files(self, reset):
+        #Opens our EditLog and .npy files, recovering any edits which weren't saved to them
+        os.makedirs(NPY_CLASSIFICATION_DIR, exist_ok=True)
+        self.log = EditLog(EDIT_LOG_FNAME)
         if reset:
-            #Delete all old files in the classification directory
+            #Delete all old files in the classification directory, and any edits to them
             clear_dir(NPY_CLASSIFICATION_DIR)
+            self.log.clear()
+
+        #Our list of classification files we provide an interface for with this class, one for each image
+        self.classifications = [os.path.join(NPY_CLASSIFICATION_DIR, "{:04d}.npy".format(i)) for i in range(len(self.imgs))]
+
+        #Recover any edits from a previous session which weren't saved to their files yet
+        for timestamp, i, row, col, mask, label_id in self.log.records():
+            if i < len(self.classifications) and os.path.exists(self.classifications[i]):
+                self.apply(i, row, col, mask, label_id)
+        self.compact()
+
+        """
+        Create empty classification files for every image that was (re)converted
+            this session, or that doesn't have any yet, leaving the classifications
+            of all other images alone. On reset, this is every image.
+        """
+        ingested = set(self.imgs.ingested)
+        for i, fpath in enumerate(self.classifications):
+            if i in ingested or not os.path.exists(fpath):
+                np.save(fpath, np.zeros(self.grid_shape(i), dtype=np.uint8))
+                self.grids.pop(i, None)
+
+    def import_files(self, database):
+        #Copies the grids of our .npy files, with any edits recovered from our EditLog, into database
+        self.open_files(False)
+        self.log.close()
+        for i, fpath in enumerate(self.classifications):
+            grid = np.load(fpath)
+            for label_id in np.unique(grid[grid != 0]):
+                database.label(i, 0, 0, grid == label_id, int(label_id))
+        self.grids = {}
+        database.commit()
+
+    def grid_shape(self, i):
+        #Amount of whole windows along each axis of image i
+        img_shape = self.imgs.shape(i)
+        return (img_shape[0]//self.imgs.win_h, img_shape[1]//self.imgs.win_w)
+
+    def label(self, i, row, col, mask, label_id):
+        """
+        Sets the cells of image i's grid where mask is True to label_id,
+            with the top-left of mask at (row, col) in the grid.
+
+        This only edits our grid in memory and appends the edit to our log,
+            the background thread takes care of saving it.
 
-            #Create empty classification files for every image
-            for i in range(len(imgs)):
-                fpath = "{:04d}".format(os.path.join(NPY_CLASSIFICATION_DIR,i))
-                np.save("{}_X.npy".format(fpath), np.array([]))
-                np.save("{}_Y.npy".format(fpath), np.array([]))
-                np.save("{}_I.npy".format(fpath), np.array([]))
+        Returns the (row, col, mask) which were inside the grid, see apply().
+        """
+        with self.lock:
+            row, col, mask = self.apply(i, row, col, mask, label_id)
+            if mask.size > 0 and self.database is not None:
+                self.database.label(i, row, col, mask, label_id)
+            elif mask.size > 0:
+                self.log.append(i, row, col, mask, label_id)
+        return row, col, mask
+
+    def apply(self, i, row, col, mask, label_id):
+        """
+        Edits our grid in memory, loading it first if needed.
+
+        Parts of the mask outside the grid are ignored, and we return the
+            (row, col, mask) which were actually inside it.
+        """
+        if i not in self.grids:
+            self.grids[i] = self.load(i)
+        grid = self.grids[i]
+
+        #Clip the mask to the grid
+        r1, c1 = max(row, 0), max(col, 0)
+        r2, c2 = min(row+mask.shape[0], grid.shape[0]), min(col+mask.shape[1], grid.shape[1])
+        mask = mask[r1-row:max(r2, r1)-row, c1-col:max(c2, c1)-col]
+
+        grid[r1:r1+mask.shape[0], c1:c1+mask.shape[1]][mask] = label_id
+        self.dirty.add(i)
+        return r1, c1, mask
 
+    def load(self, i):
+        #Image i's grid as last saved
+        if self.database is not None:
+            return self.database.grid(i, self.grid_shape(i))
+        return np.load(self.classifications[i])
 
-        #Our list of classification files we provide an interface for with this class
-        self.classifications = fpaths(NPY_CLASSIFICATION_DIR)
+    def flush(self):
+        #Makes sure the edits made so far would survive a crash
+        with self.lock:
+            if self.database is not None:
+                self.database.commit()
+            else:
+                self.log.flush()
 
+    def compact(self):
         """
-        This list needs to only have the prefixes for each file, i.e. 
-           none of the _X, _Y, _I, to make it easier for our wrapper to operate.
-        
-        Since fpaths returns a sorted list, we take advantage of this
-           to get every third filename and then remove the _X.npy from it.
-        
-        This assumes there are no other files in this directory, just like the other
-           wrappers.
+        Saves every grid with edits to its file, then removes the edits from our log.
+
+        We rotate the log and copy the edited grids while holding our lock, so that edits
+            made while we're saving go into the new log and aren't lost, and save the copies
+            without holding it, so that edits aren't blocked on disk writes.
+            Grids are saved to a temporary file and moved into place, so a crash never leaves
+            one half-written, and the old log is only removed once they're all saved.
+
+        With a database, our edits are already in it, so we only need to commit them.
+        """
+        if self.database is not None:
+            with self.lock:
+                self.dirty = set()
+            self.flush()
+            return
+
+        with self.lock:
+            self.log.rotate()
+            grids = {i: self.grids[i].copy() for i in self.dirty}
+            self.dirty = set()
+
+        for i, grid in grids.items():
+            tmp_fpath = self.classifications[i] + ".tmp.npy"
+            np.save(tmp_fpath, grid)
+            os.replace(tmp_fpath, self.classifications[i])
+
+        self.log.remove_old()
+
+    def save_periodically(self):
+        #Flush our log every EDIT_LOG_FSYNC_SECONDS, and compact it every EDIT_LOG_COMPACT_SECONDS, until closed
+        last_compact = time.time()
+        while not self.stopped.wait(EDIT_LOG_FSYNC_SECONDS):
+            self.flush()
+            if time.time() - last_compact >= EDIT_LOG_COMPACT_SECONDS:
+                self.compact()
+                last_compact = time.time()
+
+    def close(self):
+        #Stops saving in the background, and saves all remaining edits
+        self.stopped.set()
+        self.saver.join()
+        self.compact()
+
+    def export(self):
         """
-        self.classifications = list(map(lambda f: f.replace("_X.npy",""), self.classifications[::3]))
+        Gather all our classifications into three files and save it to output_fname
+           This means each labeled window of every image is combined into output_fname_X.npy,
+           and same for their labels in _Y and their indices in _I.
 
-    def __del__(self):
+        We do this in two passes, so that we never need more than one row of windows
+           of one image in memory at once:
+            1. Find the labeled cells in each image's grid, see labeled_cells().
+            2. Preallocate the output files as memmaps of the total size, and copy
+                each labeled window from our memory-mapped images directly into its place in them,
+                reading one row of windows at a time, see write_windows().
         """
-        Combine all our classifications into three files and save it to output_fname
-           This means all _X files are combined into output_fname_X.npy,
-           and same for _Y and _I files.
+        #Remove the shards of any earlier export_shards(), since they'd be read instead of our outputs, see Loader
+        if os.path.exists(self.output_fname + "_index.json"):
+            os.remove(self.output_fname + "_index.json")
+        self.remove_shards()
+
+        sample_shape, dtype = self.imgs.sample_format()
+        fpaths = [self.output_fname + "_{}.npy".format(output) for output in "XYI"]
+        write_windows(self.imgs, self.labeled_cells(), fpaths, sample_shape, dtype, "export")
 
-        We make use of our __iter__ method to ease this process.
+    def remove_shards(self, keep=()):
+        #Removes the shards of any earlier export_shards(), other than the filepaths in keep
+        for output in "XYI":
+            for fpath in glob.glob(glob.escape(self.output_fname) + "_{}_[0-9][0-9][0-9][0-9][0-9].npy".format(output)):
+                if fpath not in keep:
+                    os.remove(fpath)
+
+    def labeled_cells(self):
+        #Returns an (n, 4) array of the (image, row, col, label id) of every labeled cell, in order of image, row and column
+        cells = [np.zeros((0, 4), dtype=np.int64)]
+        for i, grid in enumerate(self):
+            rows, cols = np.nonzero(grid)
+            cells.append(np.stack([np.full(len(rows), i), rows, cols, grid[rows, cols]], axis=1).astype(np.int64))
+        return np.concatenate(cells)
+
+    def export_shards(self, shard_samples=None, shard_bytes=EXPORT_SHARD_BYTES, seed=None, workers=1, labels=None):
+        """
+        Exports our classifications like export(), but split into shards so that none of our
+            outputs have to be loaded all at once, each of shard_samples samples, or as many
+            as fit in shard_bytes of X if not given. For shard k, these are
+            output_fname_X_{k:05d}.npy, output_fname_Y_{k:05d}.npy, output_fname_I_{k:05d}.npy
 
-        I did some theoretical calculations. 
-            For windows of size 300x300, we'd need 100,000 classifications to get up to 9GB
-            For windows of size 500x500, we'd need 10,000 classifications to get up to 2.5GB
+        Along with output_fname_index.json, which lists the files, amount of samples and amount of
+            each label in each shard, so a loader can choose which shards to read without opening them.
 
-        Since we're using uint8 for our image data / for each pixel, this means 1 byte per pixel,
-            which is how I got the above numbers.
+        Samples are in the same order as export(), unless given a seed, in which case they're shuffled
+            across all shards, the same way every time for the same seed and classifications.
 
-        Considering the very large amount of classifications necessary to get the memory required
-            up to an amount where holding it in RAM wouldn't be possible, i'm electing
-            to not yet use memmaps here and just vstack each array to one global array as we load it in
-            in our loop.
+        Each shard is written by one of workers processes, see write_windows().
 
-        This may change in the future if it presents a problem.
+        Returns the index.
         """
-        X = self.__getitem__(0)
-        Y = self.__getitem__(0)
-        I = self.__getitem__(0)
-        for (x,y,i) in tqdm(self.__iter__()[1:]):
-            X = np.vstack((X,x))
-            Y = np.vstack((Y,y))
-            I = np.vstack((I,i))
-
-        np.save(self.output_fname + "_X.npy", X)
-        np.save(self.output_fname + "_Y.npy", Y)
-        np.save(self.output_fname + "_I.npy", I)
+        sample_shape, dtype = self.imgs.sample_format()
+        if shard_samples is None:
+            shard_samples = max(int(shard_bytes//(np.prod(sample_shape)*np.dtype(dtype).itemsize)), 1)
+
+        cells = self.labeled_cells()
+        if seed is not None:
+            cells = cells[np.random.RandomState(seed).permutation(len(cells))]
+
+        n_label_ids = len(labels)+1 if labels is not None else int(cells[:, 3].max(initial=0))+1
+        index = {"samples": len(cells), "sample_shape": list(sample_shape), "dtype": np.dtype(dtype).name,
+                "labels": list(labels) if labels is not None else None, "seed": seed, "shards": []}
+        shards = []
+        for k, start in enumerate(range(0, len(cells), shard_samples)):
+            shard_cells = cells[start:start+shard_samples]
+            fpaths = ["{}_{}_{:05d}.npy".format(self.output_fname, output, k) for output in "XYI"]
+            shards.append((shard_cells, fpaths))
+            index["shards"].append({"X": fpaths[0], "Y": fpaths[1], "I": fpaths[2], "samples": len(shard_cells),
+                    "histogram": np.bincount(shard_cells[:, 3]-1, minlength=n_label_ids-1).tolist()})
+
+        state = {"imgs": self.imgs, "sample_shape": sample_shape, "dtype": dtype}
+        if workers > 1:
+            with Pool(workers, initializer=init_worker, initargs=(state,)) as pool:
+                for _ in progress(pool.imap_unordered(write_shard, shards), "export", total=len(shards)):
+                    pass
+        else:
+            init_worker(state)
+            for shard in progress(shards, "export"):
+                write_shard(shard)
+
+        #Remove any shards past our last from an earlier export, so only ours are next to our index
+        self.remove_shards(set(fpath for shard_cells, shard_fpaths in shards for fpath in shard_fpaths))
+
+        save_json(self.output_fname + "_index.json", index)
+        return index
 
     def __iter__(self):
-        #Return (X,Y,I) for each index via calling __getitem__ on each index.
-        for i in range(len(self.classifications)):
+        #Return the grid for each index via calling __getitem__ on each index.
+        for i in range(len(self)):
             yield self.__getitem__(i)
 
     def __getitem__(self, i):
-        #Return (X,Y,I) for this index via loading all 3 files and putting them in a tuple.
-        fpath = self.classifications[i]
-        data = (np.load(fpath + "_X.npy"), np.load(fpath + "_Y.npy"), np.load(fpath + "_I.npy"))
-        return data 
+        #Our grid in memory has any edits not yet saved to its file
+        with self.lock:
+            if i in self.grids:
+                return self.grids[i].copy()
+        return self.load(i)
 
-    def __setitem__(self, i, classification):
-        fpath = self.classifications[i]
-        np.save(fpath + "_X.npy", X)
-        np.save(fpath + "_Y.npy", Y)
-        np.save(fpath + "_I.npy", I)
+    def __setitem__(self, i, grid):
+        #Logged as one edit per label in the grid, so it's saved the same as any other edit
+        for label_id in np.unique(grid):
+            self.label(i, 0, 0, grid == label_id, label_id)
 
     def __len__(self):
-        return len(self.classifications)
-
+        return len(self.imgs)
@@ -0,0 +1,150 @@
+import os, json, sqlite3, threading
+from itertools import repeat
+import numpy as np
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cells (
+    image INTEGER NOT NULL,
+    row INTEGER NOT NULL,
+    col INTEGER NOT NULL,
+    label INTEGER NOT NULL,
+    PRIMARY KEY (image, row, col)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cells_image_label ON cells (image, label);
+CREATE INDEX IF NOT EXISTS cells_label_image ON cells (label, image);
+
+CREATE TABLE IF NOT EXISTS images (
+    image INTEGER PRIMARY KEY,
+    fpath TEXT,
+    size INTEGER,
+    mtime REAL,
+    hash TEXT,
+    y INTEGER,
+    x INTEGER,
+    height INTEGER,
+    width INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS sessions (
+    uid TEXT PRIMARY KEY,
+    progress TEXT NOT NULL
+);
+"""
+
+class Database():
+    """
+    A single SQLite file holding our classifications, the progress of each user's session,
+        and where each of our images came from, as an alternative to our .npy files.
+
+    Classifications are stored sparsely, as one row per labeled cell of each image's grid
+        (see Classifications), since most cells are "Nothing" and don't need a row.
+        With indices on (image, label) and (label, image), questions like how many cells of each
+        label each image has, or which images have any of a label, are answered without
+        loading any grids.
+
+    new is whether our file didn't exist before we opened it, e.g. for the first session with the
+        sqlite store after sessions with .npy files.
+
+    The database is in WAL mode, so other processes (e.g. export workers) can read it while
+        we write to it. Edits are only committed on commit(), so that many edits in a short
+        time only cost one sync, the same as our EditLog.
+    """
+    def __init__(self, fpath):
+        self.fpath = fpath
+        self.new = not os.path.exists(fpath)
+        self.lock = threading.RLock()
+
+        #Shared between the GUI and the thread saving our classifications, guarded by our lock
+        self.conn = sqlite3.connect(fpath, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def commit(self):
+        with self.lock:
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
+
+    def clear(self):
+        #Removes all classifications, images and sessions
+        with self.lock:
+            for table in ("cells", "images", "sessions"):
+                self.conn.execute("DELETE FROM {}".format(table))
+            self.conn.commit()
+
+    def clear_cells(self, i):
+        #Removes all of image i's classifications, so its grid is all "Nothing"
+        with self.lock:
+            self.conn.execute("DELETE FROM cells WHERE image = ?", (i,))
+
+    def label(self, i, row, col, mask, label_id):
+        """
+        Sets the cells of image i's grid where mask is True to label_id,
+            with the top-left of mask at (row, col) in the grid.
+
+        "Nothing" cells have no row, so labelling them 0 removes their rows.
+        """
+        rows, cols = np.nonzero(mask)
+        cells = zip(repeat(int(i)), (rows+row).tolist(), (cols+col).tolist())
+        with self.lock:
+            if label_id == 0:
+                self.conn.executemany("DELETE FROM cells WHERE image = ? AND row = ? AND col = ?", cells)
+            else:
+                self.conn.executemany("INSERT OR REPLACE INTO cells VALUES (?, ?, ?, ?)",
+                        ((image, row, col, int(label_id)) for image, row, col in cells))
+
+    def grid(self, i, shape):
+        #Image i's grid of the given shape, from its labeled cells
+        with self.lock:
+            cells = np.array(self.conn.execute("SELECT row, col, label FROM cells WHERE image = ?", (i,)).fetchall(), dtype=np.int64).reshape(-1, 3)
+        grid = np.zeros(shape, dtype=np.uint8)
+        grid[cells[:, 0], cells[:, 1]] = cells[:, 2]
+        return grid
+
+    def label_counts(self):
+        #Returns {image: {label id: amount of cells}} for every image with any labeled cells
+        counts = {}
+        with self.lock:
+            for i, label_id, count in self.conn.execute("SELECT image, label, COUNT(*) FROM cells GROUP BY image, label"):
+                counts.setdefault(i, {})[label_id] = count
+        return counts
+
+    def images_with_label(self, label_id):
+        #Indices of the images with at least one cell of label_id
+        with self.lock:
+            return [i for i, in self.conn.execute("SELECT DISTINCT image FROM cells WHERE label = ? ORDER BY image", (label_id,))]
+
+    def record_images(self, imgs):
+        """
+        Records the source file, size, mtime, hash and tile origin of each of our Images,
+            from their manifest. Without a manifest, we only know each tile's shape.
+        """
+        rows = []
+        if imgs.manifest is not None:
+            for fpath, entry in imgs.manifest["images"].items():
+                for i, (y, x, h, w) in zip(entry["tiles"], entry["origins"]):
+                    rows.append((i, fpath, entry["size"], entry["mtime"], entry["hash"], y, x, h, w))
+        else:
+            for i in range(len(imgs)):
+                h, w = imgs.shape(i)[:2]
+                rows.append((i, None, None, None, None, 0, 0, h, w))
+
+        with self.lock:
+            self.conn.execute("DELETE FROM images")
+            self.conn.executemany("INSERT INTO images VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self.conn.commit()
+
+    def progress(self, uid):
+        #The progress of the given user's session, or an empty dict if they haven't had one
+        with self.lock:
+            row = self.conn.execute("SELECT progress FROM sessions WHERE uid = ?", (uid,)).fetchone()
+        return json.loads(row[0]) if row is not None else {}
+
+    def save_progress(self, uid, progress):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?)", (uid, json.dumps(progress)))
+            self.conn.commit()
@@ -1,12 +1,38 @@
 from Images import *
 from Labels import * 
 from Classifications import *
+from Database import Database
+from config import WORKERS, CLASSIFICATION_STORE, DATABASE_FNAME
+import getpass
 
 class Dataset():
 
-    def __init__(self, input_dir, output_fname, label_fname, reset):
+    def __init__(self, input_dir, output_fname, label_fname, reset, win_h, win_w, workers=WORKERS, store=CLASSIFICATION_STORE):
 
-        self.images = Images(input_dir, reset)
+        self.images = Images(input_dir, reset, win_h, win_w, workers)
         self.labels = Labels(label_fname)
-        self.classifications = Classifications(self.images, output_fname, reset)
+
+        #With the sqlite store, our classifications, images and each user's progress are kept in one database
+        self.uid = getpass.getuser()
+        self.database = None
+        if store == "sqlite":
+            self.database = Database(DATABASE_FNAME)
+            if reset:
+                self.database.clear()
+            self.database.record_images(self.images)
+
+        self.classifications = Classifications(self.images, output_fname, reset, self.database)
+
+    def progress(self):
+        #Our user's progress from their last session, which we only keep with the sqlite store
+        return self.database.progress(self.uid) if self.database is not None else {}
+
+    def save_progress(self, **progress):
+        if self.database is not None:
+            self.database.save_progress(self.uid, dict(self.progress(), **progress))
+
+    def close(self):
+        #Closes our database, once our classifications are closed and we're done reading them
+        if self.database is not None:
+            self.database.close()
 
@@ -0,0 +1,103 @@
+import os, time, struct
+import numpy as np
+
+"""
+Each record in our log is this header, followed by the packed bits of the
+    mask if the edit is masked, in the format
+    timestamp, image, row, col, h, w, label, masked
+"""
+RECORD = struct.Struct("<dIIIIIB?")
+
+class EditLog():
+    """
+    Append-only log of classification edits, so that an edit can be saved
+        by appending a few bytes to this file rather than rewriting the grid
+        it was made to.
+
+    Each edit sets the cells of image's grid in the h x w region at (row, col)
+        to label, either all of them or only those where its mask is True.
+
+    Appends are buffered, and only reach the disk on flush(), so that many
+        edits in a short time only cost one fsync.
+
+    To save the edits to their grids, we rotate() the log to fpath.old and start a new one,
+        so that edits made while the old one is being saved still end up in a log.
+        Until the old log is removed, both are replayed on recovery.
+    """
+    def __init__(self, fpath):
+        self.fpath = fpath
+        self.old_fpath = fpath + ".old"
+        self.f = open(self.fpath, "ab")
+
+    def append(self, i, row, col, mask, label_id):
+        h, w = mask.shape
+        masked = not mask.all()
+        self.f.write(RECORD.pack(time.time(), i, row, col, h, w, label_id, masked))
+        if masked:
+            self.f.write(np.packbits(mask).tobytes())
+
+    def flush(self):
+        self.f.flush()
+        os.fsync(self.f.fileno())
+
+    def close(self):
+        self.f.close()
+
+    def rotate(self):
+        """
+        Moves our log to old_fpath and starts a new one.
+
+        If the old log is still there (we crashed before it was removed),
+            we add our edits to the end of it instead, so none are lost.
+        """
+        self.flush()
+        self.f.close()
+        if os.path.exists(self.old_fpath):
+            with open(self.fpath, "rb") as src, open(self.old_fpath, "ab") as dst:
+                dst.write(src.read())
+                dst.flush()
+                os.fsync(dst.fileno())
+            os.remove(self.fpath)
+        else:
+            os.replace(self.fpath, self.old_fpath)
+        self.f = open(self.fpath, "ab")
+
+    def remove_old(self):
+        if os.path.exists(self.old_fpath):
+            os.remove(self.old_fpath)
+
+    def clear(self):
+        self.f.close()
+        self.remove_old()
+        self.f = open(self.fpath, "wb")
+
+    def records(self):
+        """
+        Yields (timestamp, image, row, col, mask, label) for each edit in the old
+            log and then our log, in the order they were made.
+
+        If we crashed partway through appending an edit, the last record is incomplete,
+            so we stop at the first record we can't read entirely.
+        """
+        for fpath in (self.old_fpath, self.fpath):
+            if not os.path.exists(fpath):
+                continue
+
+            with open(fpath, "rb") as f:
+                data = f.read()
+
+            offset = 0
+            while offset + RECORD.size <= len(data):
+                timestamp, i, row, col, h, w, label_id, masked = RECORD.unpack_from(data, offset)
+                offset += RECORD.size
+
+                if masked:
+                    n_bytes = -(-h*w//8)
+                    if offset + n_bytes > len(data):
+                        break
+                    mask = np.unpackbits(np.frombuffer(data, dtype=np.uint8, count=n_bytes, offset=offset), count=h*w).reshape(h, w).astype(bool)
+                    offset += n_bytes
+                else:
+                    mask = np.ones((h, w), dtype=bool)
+
+                yield timestamp, i, row, col, mask, label_id
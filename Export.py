@@ -0,0 +1,165 @@
+from base import *
+from config import EXPORT_OVERLAY_SCALE, EXPORT_PNG_COMPRESSION, EXPORT_SHARD_BYTES, LABEL_TRANSPARENCY
+from Session import pop_option, Command
+
+import csv
+import numpy as np
+from multiprocessing import Pool
+
+def label_overlay(img, grid, h, w, win_h, win_w, palette):
+    """
+    Arguments:
+        img: the h x w image grid was made on, resized to any size
+        grid: classifications of the image, see Classifications
+        palette: RGBA color of each label id, see label_palette()
+
+    Returns:
+        img as RGB with the color of each window's label blended over it.
+
+    Rather than drawing each window, we find the window each pixel of img is in and look up all
+        of their colors at once. Pixels past the last whole window are in an extra row or column
+        of "Nothing", which is transparent.
+    """
+    if img.ndim == 2:
+        img = np.stack([img]*3, axis=-1)
+    img = img[..., :3].astype(np.uint16)
+
+    rows = np.minimum(np.arange(img.shape[0])*h//img.shape[0]//win_h, grid.shape[0])
+    cols = np.minimum(np.arange(img.shape[1])*w//img.shape[1]//win_w, grid.shape[1])
+    padded = np.zeros((grid.shape[0]+1, grid.shape[1]+1), dtype=grid.dtype)
+    padded[:-1, :-1] = grid
+
+    colors = palette[padded[rows[:, None], cols[None, :]]].astype(np.uint16)
+    alpha = colors[..., 3:]
+    return ((img*(255-alpha) + colors[..., :3]*alpha + 127)//255).astype(np.uint8)
+
+def export_image(args):
+    """
+    Ran in a worker process for each image i and its classifications grid,
+        which are small enough to send to the worker rather than have it read them.
+        Everything else it needs is in worker, see export_stats().
+
+    Returns the amount of windows with each label id in image i's classifications,
+        and writes image i with its classifications overlaid if we have an overlay_dir.
+    """
+    i, grid = args
+    counts = np.bincount(grid.ravel(), minlength=worker["n_label_ids"])[:worker["n_label_ids"]]
+
+    if worker["overlay_dir"] is not None and grid.size > 0:
+        from PIL import Image
+        images = worker["images"]
+        h, w = images.shape(i)[:2]
+        overlay = label_overlay(images.level(i, EXPORT_OVERLAY_SCALE), grid, h, w, images.win_h, images.win_w, worker["palette"])
+        Image.fromarray(overlay).save(os.path.join(worker["overlay_dir"], "{:04d}.png".format(i)), compress_level=worker["compression"])
+
+    return counts
+
+def database_counts(dataset):
+    """
+    Yields the amount of windows with each label id in each image of dataset, as export_image() would,
+        from the label counts of its database rather than from each image's grid.
+    """
+    label_counts = dataset.database.label_counts()
+    n_label_ids = len(dataset.labels)+1
+    for i in range(len(dataset.images)):
+        counts = np.zeros(n_label_ids, dtype=np.int64)
+        for label_id, count in label_counts.get(i, {}).items():
+            if label_id < n_label_ids:
+                counts[label_id] = count
+        counts[0] = int(np.prod(dataset.classifications.grid_shape(i))) - sum(label_counts.get(i, {}).values())
+        yield counts
+
+def export_stats(dataset, csv_fname, overlay_dir, workers, compression=EXPORT_PNG_COMPRESSION):
+    """
+    Writes the amount of windows with each label in each image of dataset to csv_fname, along with
+        the percentage of each image's labeled windows each label is, and if we have an overlay_dir,
+        each image with its classifications overlaid to it, see export_image().
+
+    Images are spread across workers processes, and each one's stats are written to the csv
+        in order by this process as they finish. With a database and no overlay_dir, we only
+        need its label counts, see database_counts().
+
+    Returns the total amount of windows with each label id across all images.
+    """
+    images, labels, classifications = dataset.images, dataset.labels, dataset.classifications
+    if overlay_dir is not None:
+        os.makedirs(overlay_dir, exist_ok=True)
+
+    #Source image file of each image relative to our input directory, if we know it
+    sources = {}
+    if images.manifest is not None:
+        for fpath, entry in images.manifest["images"].items():
+            for i in entry["tiles"]:
+                sources[i] = fpath
+
+    totals = np.zeros(len(labels)+1, dtype=np.int64)
+    with open(csv_fname, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Image", "Source", "Windows", "Nothing"] + list(labels) + [""] + ["{} (%)".format(label) for label in labels])
+
+        def write_counts(all_counts):
+            #Writes the counts of each image in order, adding them to our totals
+            for i, counts in enumerate(progress(all_counts, "stats", total=len(images))):
+                labeled = max(counts[1:].sum(), 1)
+                writer.writerow([i, sources.get(i, ""), counts.sum()] + counts.tolist() + [""] + ["{:.2f}".format(100*count/labeled) for count in counts[1:]])
+                totals[:] += counts
+
+        if overlay_dir is None and dataset.database is not None:
+            #Without overlays, we don't need any grids, since our database counts the labels of each image itself
+            write_counts(database_counts(dataset))
+        else:
+            state = {"images": images, "n_label_ids": len(labels)+1, "overlay_dir": overlay_dir, "compression": compression,
+                    "palette": label_palette(round(255*(1-LABEL_TRANSPARENCY/100)))}
+            with Pool(workers, initializer=init_worker, initargs=(state,)) as pool:
+                grids = ((i, classifications[i]) for i in range(len(images)))
+                write_counts(pool.imap(export_image, grids))
+
+    return totals
+
+class Export(Command):
+    """
+    Exports a session without the GUI, via
+
+        python tako.py export input/ output.npy labels.txt 512 512 [--workers N] [--compression N] [--store npy|sqlite]
+            [--shard-samples N] [--shard-gb N] [--shuffle SEED]
+
+    Which converts any new or changed images in input/ as a session would, then writes
+        output_X.npy, output_Y.npy, output_I.npy - our classifications, see Classifications.export()
+        output_stats.csv - the amount of windows with each label in each image, and the percentage
+            of each image's labeled windows each label is
+        output_overlays/ - each image with its classifications overlaid, at EXPORT_OVERLAY_SCALE,
+            as a .png with zlib compression level --compression
+
+    Images are spread across --workers processes (by default one per core), see export_stats().
+
+    If given any of --shard-samples, --shard-gb or --shuffle, our classifications are instead
+        written in shards of that many samples or GB (by default EXPORT_SHARD_BYTES), optionally shuffled
+        with the given seed, along with an index of them, see Classifications.export_shards().
+        These are written by --workers processes as well.
+    """
+
+    def __init__(self, argv):
+        #Parse and remove our own flags before those every command has
+        self.compression, argv = pop_option(argv, "--compression", EXPORT_PNG_COMPRESSION, valid=lambda compression: 0 <= compression <= 9)
+        self.shard_samples, argv = pop_option(argv, "--shard-samples", None, valid=lambda shard_samples: shard_samples >= 1)
+        self.shard_gb, argv = pop_option(argv, "--shard-gb", None, cast=float, valid=lambda shard_gb: shard_gb > 0)
+        self.seed, argv = pop_option(argv, "--shuffle", None)
+        self.sharded = self.shard_samples is not None or self.shard_gb is not None or self.seed is not None
+        super(Export, self).__init__(argv)
+
+        self.read_dataset()
+        output_fname = self.output_fname.replace(".npy", "")
+        if self.sharded:
+            shard_bytes = self.shard_gb*1e9 if self.shard_gb is not None else EXPORT_SHARD_BYTES
+            index = self.dataset.classifications.export_shards(self.shard_samples, shard_bytes, self.seed, self.workers, self.dataset.labels)
+            outputs = [shard[output] for shard in index["shards"] for output in "XYI"] + [output_fname + "_index.json"]
+        else:
+            self.dataset.classifications.export()
+            outputs = [output_fname + "_{}.npy".format(output) for output in "XYI"]
+
+        csv_fname, overlay_dir = output_fname + "_stats.csv", output_fname + "_overlays"
+        totals = export_stats(self.dataset, csv_fname, overlay_dir, self.workers, self.compression)
+        self.dataset.close()
+
+        #What we did, for whoever ran us, see Batch
+        self.result = {"images": len(self.dataset.images), "windows": int(totals[1:].sum()), "outputs": outputs + [csv_fname, overlay_dir]}
@@ -4,7 +4,7 @@ from PyQt5.QtCore import *
 from PyQt5.QtWidgets import *
 from PyQt5.QtGui import *
 
-from config import *
+from gui_config import *
 from gui_base import *
 from Dataset import *
 
@@ -12,13 +12,13 @@ from Dataset import *
 class GUI():
 
     def __init__(self, dataset, win_h, win_w):
-        app = QApplication([])
+        #Reuse the QApplication made to calculate our screen dependent config, see gui_config
+        app = QApplication.instance() or QApplication([])
         screen = QDesktopWidget().screenGeometry()
         screen_h, screen_w = screen.height(), screen.width()
 
         canvas = Canvas(dataset, screen_h, screen_w, win_h, win_w)
         toolbar = Toolbar(dataset, canvas, screen_h, screen_w, win_h, win_w)
-        app.installEventFilter(canvas)
         sys.exit(app.exec_())
 
 
@@ -31,81 +31,151 @@ class Canvas(QWidget):
         self.win_h = win_h
         self.win_w = win_w
 
+        self.color = SELECTION_RECT_FILL_COLOR #For now it's just one color
+
+        #Current tool being used to make selections in our image (defaults to RECT_SELECT)
+        self.tool = RECT_SELECT
+
+        #Current label to fill in those selections with (defaults to first)
+        self.label = 0
+
+        #Radius of our pencil and eraser, and the window the cursor was last in while drawing with them
+        self.pencil_size = PENCIL_SIZE
+        self.eraser_size = ERASER_SIZE
+        self.stroke_cell = None
+
         self.h = CANVAS_HEIGHT
         self.w = CANVAS_WIDTH
         self.y = CANVAS_Y
         self.x = CANVAS_X
 
         self.setWindowTitle("| Canvas |")
-        self.setGeometry(self.x,self.y,self.w,self.h)
+        self.setGeometry(int(self.x),int(self.y),int(self.w),int(self.h))
 
         #Create GraphicsScene and GraphicsView of it
         self.scene = QGraphicsScene()
         self.view = QGraphicsView(self.scene)
-        self.view.viewport().installEventFilter(self)
 
         #Add view to the layout
         self.layout = QGridLayout(self)
         self.layout.addWidget(self.view)
 
-        #Load and add the current pixmap
-        self.pixmap = QPixmap('yang.png')
-        self.img_h, self.img_w = self.pixmap.height(), self.pixmap.width()
-        self.scene.addPixmap(self.pixmap)
+        #Zoom in and out around the mouse
+        self.view.setTransformationAnchor(QGraphicsView.AnchorUnderMouse)
+        self.zoom = 1.0
+        self.zoom_slider = None
 
-        self.color = SELECTION_RECT_FILL_COLOR #For now it's just one color
+        #Add the current image, which is loaded through our cache in tiles so only what's in view is loaded
+        self.cache = ImageCache(self.dataset.images)
+        self.image = TiledImage(self.cache)
+        self.scene.addItem(self.image)
 
-        self.pencil_rects = QGraphicsItemGroup()
+        #Add the classifications of the current image over it
+        self.overlay = LabelOverlay(self.win_h, self.win_w)
+        self.scene.addItem(self.overlay)
 
-        #Current tool being used to make selections in our image (defaults to RECT_SELECT)
-        self.tool = RECT_SELECT
-
-        #Current label to fill in those selections with (defaults to first)
-        self.label = 0
+        """
+        Current selection being displayed over both, as a rectangle, polygon, or mask of windows.
+            These items always stay in the scene, and are changed in place and shown or
+            hidden rather than adding and removing items, so displaying a selection
+            never depends on what else is in the scene.
+        """
+        self.selection_rect = self.scene.addRect(QRectF())
+        self.selection_polygon = self.scene.addPolygon(QPolygonF())
+        self.selection_mask = self.scene.addPixmap(QPixmap())
+        self.selection_mask.setTransform(QTransform.fromScale(self.win_w, self.win_h))
+        self.selection_mask_array = None
+        self.selections = [self.selection_rect, self.selection_polygon, self.selection_mask]
+        for item in self.selections:
+            item.setZValue(2)
+            item.hide()
+
+        #Resume from the image our user was last on, if we know it
+        self.load_image(min(self.dataset.progress().get("image", 0), max(len(self.dataset.images)-1, 0)))
 
         #Drawing Attributes for the Canvas
         self.painter = QPainter()
 
+        #Only handle events once everything they use exists, since configuring our view sends some
+        self.view.viewport().installEventFilter(self)
+
         #Show our widget
         self.show()
 
-    def render_selection(self, selection, polygon=False):
+    def load_image(self, i):
+        #Display image i on the canvas
+        self.img_i = i
+        if len(self.dataset.images) == 0:
+            self.img_h, self.img_w = 0, 0
+            return
+
+        self.image.set_image(i)
+        self.img_h, self.img_w = self.image.h, self.image.w
+        self.scene.setSceneRect(0, 0, self.img_w, self.img_h)
+        self.overlay.set_grid(self.dataset.classifications[i])
+        self.dataset.save_progress(image=i)
+
+    def set_zoom(self, zoom):
+        #Scale our view by zoom, keeping our zoom slider (if we have one) in sync
+        self.zoom = min(max(zoom, ZOOM_MIN), ZOOM_MAX)
+        self.view.setTransform(QTransform.fromScale(self.zoom, self.zoom))
+        if self.zoom_slider is not None:
+            self.zoom_slider.blockSignals(True)
+            self.zoom_slider.setValue(slider_from_zoom(self.zoom))
+            self.zoom_slider.blockSignals(False)
+
+    def classify(self, row, col, mask, erase=False):
         """
-        Updates the current displayed selection shape
-            on the canvas to be the given selection.
+        Labels the windows where mask is True with our current label, or as "Nothing" if erasing,
+            with the top-left of mask at (row, col) in the current image's windows.
+            Saved via our Classifications, and displayed via our overlay.
         """
+        label_id = 0 if erase else self.label+1
+        row, col, mask = self.dataset.classifications.label(self.img_i, row, col, mask, label_id)
+        self.overlay.label(row, col, mask, label_id)
 
-        #Always remove anything other than our pixmap when re-rendering
-        while len(self.scene.items()) > 1:
-            self.scene.removeItem(self.scene.items()[0])
-
-        #Add new selection 
-        if polygon:
-            #They have a special method for this we have to use to add them
-            self.scene.addPolygon(selection)
-
-        else:
-            self.scene.addItem(selection)
-
-    def relative_coordinates(view, event):
+    def render_selection(self, rect=None, polygon=None, mask=None):
         """
-        Gets the relative coordinates of the x and y 
-            position of this event, relative to the
-            given graphicsview scroll position(s).
+        Updates the current displayed selection shape
+            on the canvas to be the given selection, one of
+            rect - a QRectF
+            polygon - a QPolygonF
+            mask - (mask, row, col), a mask of windows with its top-left window at (row, col)
+
+        Hides the selection if none are given.
         """
-        x = event.x()
-        y = event.y()
-        scroll_x = view.horizontalScrollBar().value()
-        scroll_y = view.verticalScrollBar().value()
+        if rect is not None:
+            self.selection_rect.setRect(rect)
+            shown = self.selection_rect
+
+        elif polygon is not None:
+            self.selection_polygon.setPolygon(polygon)
+            shown = self.selection_polygon
 
-        return (scroll_x + x, scroll_y + y)
+        elif mask is not None:
+            mask, row, col = mask
 
+            #Our brushes show the same mask as they move, so we only make its pixmap when it changes
+            if mask is not self.selection_mask_array:
+                self.selection_mask.setPixmap(mask_pixmap(mask, self.color))
+                self.selection_mask_array = mask
+            self.selection_mask.setPos(col*self.win_w, row*self.win_h)
+            shown = self.selection_mask
 
+        else:
+            shown = None
 
+        for item in self.selections:
+            item.setVisible(item is shown)
 
     def eventFilter(self, source, event):
         if source is self.view.viewport():
 
+            #Zoom with the mouse wheel, rather than scrolling
+            if event.type() == QEvent.Wheel:
+                self.set_zoom(self.zoom*ZOOM_WHEEL_STEP**(event.angleDelta().y()/120))
+                return True
+
             #Selection events are dependent on the current selection tool
 
             #Users select a rectangle portion
@@ -123,7 +193,7 @@ class Canvas(QWidget):
                     self.outline_rect = get_outline_rect(self.select_rect, self.win_h, self.win_w)
 
                     #Render it
-                    self.render_selection(self.outline_rect)
+                    self.render_selection(rect=self.outline_rect)
 
                 elif (event.type() == QEvent.MouseMove and event.buttons() != Qt.NoButton):
 
@@ -136,7 +206,7 @@ class Canvas(QWidget):
                     self.outline_rect = get_outline_rect(self.select_rect, self.win_h, self.win_w)
 
                     #Render it
-                    self.render_selection(self.outline_rect)
+                    self.render_selection(rect=self.outline_rect)
 
                 elif (event.type() == QEvent.MouseButtonRelease):
                     #Get new rectangle from our initial select_rect point to this point
@@ -147,8 +217,11 @@ class Canvas(QWidget):
                     #   so that we lock on to areas in these step sizes to allow easier rectangle selection.
                     outline_rect = get_outline_rect(self.select_rect, self.win_h, self.win_w)
 
-                    #Render it
-                    self.render_selection(self.outline_rect)
+                    #Label every window in it, and remove the selection now that it's shown by our labels
+                    row, col = int(outline_rect.y())//self.win_h, int(outline_rect.x())//self.win_w
+                    rows, cols = int(round(outline_rect.height()))//self.win_h, int(round(outline_rect.width()))//self.win_w
+                    self.classify(row, col, np.ones((rows, cols), dtype=bool))
+                    self.render_selection()
 
             #Users select an arbitrary region of the image which is then approximated by win_h x win_w windows
             elif self.tool == LASSO_SELECT:
@@ -160,7 +233,7 @@ class Canvas(QWidget):
                     self.select_polygon = QPolygonF([self.select_start])
 
                     #Render it
-                    self.render_selection(self.select_polygon, polygon=True)
+                    self.render_selection(polygon=self.select_polygon)
 
                 elif (event.type() == QEvent.MouseMove and event.buttons() != Qt.NoButton):
 
@@ -169,7 +242,7 @@ class Canvas(QWidget):
                     self.select_polygon.append(QPoint(x,y))
 
                     #Render it
-                    self.render_selection(self.select_polygon, polygon=True)
+                    self.render_selection(polygon=self.select_polygon)
 
                 elif (event.type() == QEvent.MouseButtonRelease):
                     """
@@ -177,98 +250,39 @@ class Canvas(QWidget):
                         the area encompassed by it with rectangles of 
                         shape win_h x win_w and render these in its place.
                     """
-                    self.select_rect_group = approximate_polygon(self.select_polygon, self.img_h, self.img_w, self.win_h, self.win_w)
+                    self.select_mask, self.select_row, self.select_col = approximate_polygon(self.select_polygon, self.img_h, self.img_w, self.win_h, self.win_w)
 
-                    #Render the approximation
-                    self.render_selection(self.select_rect_group)
+                    #Label it, and remove the selection now that it's shown by our labels
+                    self.classify(self.select_row, self.select_col, self.select_mask)
+                    self.render_selection()
 
-            #Users can select around the given cursor wherever they drag the pencil, with this selection area depending on pencil_size
-            elif self.tool == PENCIL:
+            #Users can select around the given cursor wherever they drag the pencil, or unlabel wherever they drag the eraser,
+            #   with this area depending on pencil_size or eraser_size
+            elif self.tool == PENCIL or self.tool == ERASER:
+                r = self.pencil_size if self.tool == PENCIL else self.eraser_size
 
-                if (event.type() == QEvent.MouseMove):
+                if (event.type() == QEvent.MouseMove or event.type() == QEvent.MouseButtonPress):
                     #This tool begins doing things immediately, in order to
                     #   show the selection area around the cursor as they move it
-                    self.pencil_rects = QGraphicsItemGroup()
-                    r = 6
-                    rsqrd = r**2
-                    cx,cy = relative_coordinates(self.view, event.x(), event.y())
-                    #Round cx and cy to be the center of whatever window they're in atm
-                    cx = np.floor(cx/self.win_w)*self.win_w + self.win_w//2
-                    cy = np.floor(cy/self.win_h)*self.win_h + self.win_h//2
-
-                    #Iterate through outer boundary rectangle for our circle
-                    for x in range(-r,r+1):
-                        for y in range(-r,r+1):
-                            if x**2 + y**2 <= rsqrd:
-                                #Point at these cords should have a rect, get the coordinates for the rect
-                                #Convert the relative cords to the absolute ones
-                                px = cx + x*self.win_w
-                                py = cy + y*self.win_h
-                                rect = QGraphicsRectItem(QRectF(QPointF(px-self.win_w//2, py-self.win_h//2), QPointF(px+self.win_w//2, py+self.win_h//2)))
-                                self.pencil_rects.addToGroup(rect)
-                    self.render_selection(self.pencil_rects)
-
+                    x,y = relative_coordinates(self.view, event.x(), event.y())
 
-                    """
-                    for x,rectx in enumerate(range(max(self.win_w//2, cx-r), min(self.img_w, cx+r), self.win_w):
-                        for y,recty in enumerate(range(max(0, cy-r), min(self.img_h, cy+r), self.win_h):
-                            if x**2 + y**2 <= rsqrd:
-                                pencil_rects.addToGroup(
-                    """
+                    #Circle of windows around the window the cursor is in
+                    cell = (int(y//self.win_h), int(x//self.win_w))
+                    self.render_selection(mask=(brush_stencil(r), cell[0]-r, cell[1]-r))
 
                     """
-                    for radius in range(1,3):
-
-                        r2 = radius**2;
-
-                        addrect = lambda x,y: self.pencil_rects.addToGroup(get_outline_rect(QRect(QPoint(x,y),QPoint(x,y)), self.win_h, self.win_w))
-                        addrect(cx, cy + radius*self.win_h);
-                        addrect(cx, cy - radius*self.win_h);
-                        addrect(cx + radius*self.win_w, cy);
-                        addrect(cx - radius*self.win_w, cy);
-
-                        x = 1;
-                        y = int(np.sqrt(r2 - 1) + 0.5);
-                        while (x < y): 
-                            addrect(cx + x*self.win_w, cy + y*self.win_h);
-                            addrect(cx + x*self.win_w, cy - y*self.win_h);
-                            addrect(cx - x*self.win_w, cy + y*self.win_h);
-                            addrect(cx - x*self.win_w, cy - y*self.win_h);
-                            addrect(cx + y*self.win_h, cy + x*self.win_w);
-                            addrect(cx + y*self.win_h, cy - x*self.win_w);
-                            addrect(cx - y*self.win_h, cy + x*self.win_w);
-                            addrect(cx - y*self.win_h, cy - x*self.win_w);
-                            x += 1;
-                            y = int(np.sqrt(r2 - x**2) + 0.5);
-
-                        if (x == y) :
-                            addrect(cx + x*self.win_w, cy + y*self.win_h);
-                            addrect(cx + x*self.win_w, cy - y*self.win_h);
-                            addrect(cx - x*self.win_w, cy + y*self.win_h);
-                            addrect(cx - x*self.win_w, cy - y*self.win_h);
-
-                    self.render_selection(self.pencil_rects)
-                    self.pencil_rects = QGraphicsItemGroup()
+                    Label it while the mouse is held down, along with everything between it and
+                        the window the cursor was last in, so fast strokes don't leave gaps.
+                        Moving within the same window changes nothing, so we skip it.
                     """
-                    
-                    
-
-                if (event.type() == QEvent.MouseButtonPress):
-
-                    print("Press")
-                    #Initialize selection polygon with this
-                    x,y = relative_coordinates(self.view, event.x(), event.y())
-
-
-                    x,y = relative_coordinates(self.view, event.x(), event.y())
+                    if event.buttons() != Qt.NoButton and cell != self.stroke_cell:
+                        start = cell if self.stroke_cell is None else self.stroke_cell
+                        mask, row, col = brush_stroke(start[0], start[1], cell[0], cell[1], r)
+                        self.classify(row, col, mask, erase=self.tool == ERASER)
+                        self.stroke_cell = cell
 
                 elif (event.type() == QEvent.MouseButtonRelease):
-                    print("Release")
-                    
-
-
-                    
-                    
+                    self.stroke_cell = None
 
         return False
 
@@ -293,7 +307,7 @@ class Toolbar(QWidget):
         self.x = TOOLBAR_X
 
         self.setWindowTitle("| Toolbar |")
-        self.setGeometry(self.x,self.y,self.w,self.h)
+        self.setGeometry(int(self.x),int(self.y),int(self.w),int(self.h))
 
         #All buttons on the toolbar
         self.tool_buttons = []
@@ -316,12 +330,12 @@ class Toolbar(QWidget):
 
         #Pencil Tool
         pencil = ToolButton(self, PENCIL_ICON_FNAME, PENCIL, item_x, item_y)
-        pencil.button.setEnabled(False)
+        self.tool_buttons.append(pencil)
         item_x += pencil.w + TOOLBAR_PADDING
 
         #Eraser Tool
         eraser = ToolButton(self, ERASER_ICON_FNAME, ERASER, item_x, item_y)
-        eraser.button.setEnabled(False)
+        self.tool_buttons.append(eraser)
         item_x += eraser.w + TOOLBAR_PADDING
 
         #Reset for next row
@@ -329,10 +343,16 @@ class Toolbar(QWidget):
         item_y += rect_select.h + TOOLBAR_PADDING
 
         #Add initial toolbar slider items
-        pencil_size = ToolSlider(self, "Pencil Size (N/A)", item_x, item_y)
+        pencil_size = ToolSlider(self, "Pencil Size", item_x, item_y)
+        pencil_size.slider.setRange(0, BRUSH_MAX_RADIUS)
+        pencil_size.slider.setValue(self.canvas.pencil_size)
+        pencil_size.slider.valueChanged.connect(lambda value: setattr(self.canvas, "pencil_size", value))
         item_y += pencil_size.h
 
-        eraser_size = ToolSlider(self, "Eraser Size (N/A)", item_x, item_y)
+        eraser_size = ToolSlider(self, "Eraser Size", item_x, item_y)
+        eraser_size.slider.setRange(0, BRUSH_MAX_RADIUS)
+        eraser_size.slider.setValue(self.canvas.eraser_size)
+        eraser_size.slider.valueChanged.connect(lambda value: setattr(self.canvas, "eraser_size", value))
         item_y += eraser_size.h
 
         #Add toolbar label buttons
@@ -345,9 +365,14 @@ class Toolbar(QWidget):
 
         #Add remaining toolbar slider items
         label_transparency = ToolSlider(self, "Label Transparency", item_x, item_y)
+        label_transparency.slider.setValue(LABEL_TRANSPARENCY)
+        label_transparency.slider.valueChanged.connect(self.canvas.overlay.set_transparency)
         item_y += label_transparency.h
 
         zoom_factor = ToolSlider(self, "Zoom Factor", item_x, item_y)
+        zoom_factor.slider.setValue(slider_from_zoom(self.canvas.zoom))
+        zoom_factor.slider.valueChanged.connect(lambda value: self.canvas.set_zoom(zoom_from_slider(value)))
+        self.canvas.zoom_slider = zoom_factor.slider
         item_y += zoom_factor.h 
         
         #Add Image Navigation
@@ -388,7 +413,5 @@ class Toolbar(QWidget):
             self.close()
             sys.exit() 
 
-GUI(Dataset("testinput/", "testoutput/", "testlabels.txt", False), 10, 10)
-#GUI(None, 100, 50)
 
 
@@ -0,0 +1,77 @@
+import numpy as np
+from config import IMAGE_MAX_GB
+
+def tile_shape(img_shape, itemsize, win_h, win_w, max_bytes):
+    """
+    Arguments:
+        img_shape: shape of the image we're tiling
+        itemsize: bytes per element of the image, i.e. img.dtype.itemsize
+        win_h, win_w: shape of the windows we classify the image with
+        max_bytes: maximum allowed memory size of each tile
+
+    Returns:
+        (tile_h, tile_w), the shape of each tile, which are multiples of
+            win_h and win_w respectively so that no window crosses tiles.
+
+    Amount we divide each dimension of our image by to get tiles
+        division_factor = 1 means the original image,
+        division_factor = 2 means we divide both height and width
+            by 2, resulting in 2**2 = 4 tiles, or quarters,
+            of the image.
+        division_factor = 3 repeats this, resulting in 9 tiles,
+
+        And so on.
+
+    We increase this until each tile is at most max_bytes, or
+        until each tile is a single window.
+    """
+    #Bytes taken up by each pixel, over all channels
+    pixel_bytes = itemsize*int(np.prod(img_shape[2:]))
+
+    #Amount of windows along each axis of the image, including partial ones at the edges
+    rows = -(-img_shape[0]//win_h)
+    cols = -(-img_shape[1]//win_w)
+
+    division_factor = 1
+    while True:
+        tile_rows = -(-rows//division_factor)
+        tile_cols = -(-cols//division_factor)
+        if tile_rows*win_h*tile_cols*win_w*pixel_bytes <= max_bytes or (tile_rows == 1 and tile_cols == 1):
+            return tile_rows*win_h, tile_cols*win_w
+        division_factor += 1
+
+class ImageTiles():
+    """
+    Given an image and a window height and width, this class
+        acts as an interface for the image as if it were a vector
+        of tiles each at most max_bytes in memory, without actually
+        dividing the image, as doing so would require a copy of it.
+
+    Tile edges are aligned to multiples of win_h and win_w, so no
+        window crosses a tile boundary, and the tiles on the bottom and
+        right edges are smaller if the image doesn't divide evenly,
+        so the entire image is covered.
+
+    origins holds (y, x, h, w) for each tile, the offset of its top-left
+        corner in the image and its shape.
+    """
+    def __init__(self, img, win_h, win_w, max_bytes=IMAGE_MAX_GB*1e9):
+        self.img = img
+        self.tile_h, self.tile_w = tile_shape(img.shape, img.dtype.itemsize, win_h, win_w, max_bytes)
+
+        img_h, img_w = img.shape[:2]
+        self.origins = [(y, x, min(self.tile_h, img_h-y), min(self.tile_w, img_w-x))
+                for y in range(0, img_h, self.tile_h)
+                for x in range(0, img_w, self.tile_w)]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, i):
+        #Slices are views, so this doesn't copy the image
+        y, x, h, w = self.origins[i]
+        return self.img[y:y+h, x:x+w]
+
+    def __len__(self):
+        return len(self.origins)
@@ -1,8 +1,59 @@
 from base import *
-from scipy.misc import imread
-from config import NPY_IMAGE_DIR
+from config import WORKERS, NPY_IMAGE_DIR, NPY_LEVEL_DIR, MANIFEST_FNAME, IMAGE_MMAP_MODE, IMAGE_STORE, CHUNK_STORE_FNAME, INGEST_QUEUE_SIZE, PYRAMID_MIN_SIZE
+from exceptions import WindowShapeChangedException
+from ImageTiles import ImageTiles
+from ChunkStore import ChunkStore
 
+import time
+import queue
+import threading
+import collections
 import numpy as np
+from multiprocessing import Pool
+
+def load_image(fpath):
+    """
+    Decode stage of our ingestion pipeline, ran in a worker process.
+
+    Returns (image, content hash, bytes read, seconds spent), where image
+        is None if the file wasn't an image file.
+    """
+    from scipy.misc import imread
+
+    start = time.time()
+    fhash = file_hash(fpath)
+
+    #Try to load the image file, if we fail it wasn't an image file so we ignore it
+    try:
+        img = imread(fpath)
+    except:
+        img = None
+
+    return img, fhash, os.path.getsize(fpath), time.time()-start
+
+def decoded_images(fpaths, workers, max_pending=INGEST_QUEUE_SIZE):
+    """
+    Yields the result of load_image for each of the fpaths, in order.
+
+    With more than one worker, the images are decoded in a process pool. We only
+        ever have max_pending images submitted but not yet yielded, so that
+        a slow consumer can't result in all of our decoded images sitting in memory.
+    """
+    if workers <= 1:
+        for fpath in fpaths:
+            yield load_image(fpath)
+        return
+
+    with Pool(workers) as pool:
+        pending = collections.deque()
+        for fpath in fpaths:
+            #Wait on the oldest image once we have the maximum amount in flight
+            if len(pending) >= max_pending:
+                yield pending.popleft().get()
+            pending.append(pool.apply_async(load_image, (fpath,)))
+
+        while pending:
+            yield pending.popleft().get()
 
 class Images():
     """
@@ -10,51 +61,356 @@ class Images():
         in the class initialization, reading and writing to any instance
         of this class will read and write the exact same images
         as other instances.
+
+    Each source image is stored whole as one .npy file, and this class
+        provides an interface for the tiles of those images, as given by
+        ImageTiles, so that each index is a tile at most IMAGE_MAX_GB in size
+        with edges aligned to our win_h x win_w windows. Tiles are sliced out
+        of their source image on demand rather than being copied into files.
+
+    Source images are stored according to store:
+            "npy" - one .npy file per image in NPY_IMAGE_DIR (default)
+            "chunked" - one ChunkStore file at CHUNK_STORE_FNAME, with each image compressed
+                in chunks aligned to our windows, so tiles are lazy ChunkedImage views
+                which only decompress the chunks a slice of them touches.
+
+    With the "npy" store, images are memory-mapped when read according to mmap_mode, so that
+        cropping a window or getting the shape of an image only reads the pages it needs from disk:
+            "r" - read-only np.memmap views (default)
+            "c" - copy-on-write np.memmap views, edits stay in memory until saved via __setitem__
+            None - load the entire image into memory
+
+    Each source image also has a pyramid of downsampled levels, stored as .npy files in NPY_LEVEL_DIR,
+        where level k is the image halved k times with area interpolation, down to PYRAMID_MIN_SIZE.
+        These are written once when the image is converted, so anything which needs a smaller
+        image can start from the nearest level via level() rather than resizing the full image.
     """
 
-    def __init__(self, input_dir, reset):
+    def __init__(self, input_dir, reset, win_h, win_w, workers=WORKERS, mmap_mode=IMAGE_MMAP_MODE, store=IMAGE_STORE):
+        self.input_dir = input_dir
+        self.win_h, self.win_w = win_h, win_w
+        self.mmap_mode = mmap_mode
+        os.makedirs(NPY_IMAGE_DIR, exist_ok=True)
+        os.makedirs(NPY_LEVEL_DIR, exist_ok=True)
+        self.store = ChunkStore(CHUNK_STORE_FNAME, win_h, win_w) if store == "chunked" else None
+
+        """
+        Our manifest records the size, mtime and content hash of every source image
+            we've converted, along with the tile indices and tile origins it produced,
+            so that we only ever need to convert the images which are new or have changed.
 
-        #Only convert if resetting
-        if reset:
+        Images are recorded by their path relative to input_dir, so that the same input_dir
+            given another way (e.g. ./input rather than input/), or moved, still matches them.
+
+        Sessions converted before we had a manifest have no record of which
+            source produced which .npy, so for those we only convert on reset.
+        """
+        self.manifest = load_json(MANIFEST_FNAME, None)
+        if self.manifest is not None and "win_shape" not in self.manifest:
+            #Manifest from before tiles were computed on demand, where each .npy was a tile
+            self.manifest = None
+
+        if reset or (self.manifest is None and self.n_sources() == 0):
             #Delete all old files in the image directory
             clear_dir(NPY_IMAGE_DIR)
+            clear_dir(NPY_LEVEL_DIR)
+            if self.store is not None:
+                self.store.clear()
+            self.manifest = {"win_shape": [win_h, win_w], "images": {}, "n_tiles": 0, "orphans": [], "relative": True}
+
+        #Our tile origins depend on the window shape, so existing tiles can't be used with another.
+        if self.manifest is not None and self.manifest["win_shape"] != [win_h, win_w]:
+            raise WindowShapeChangedException()
+
+        if self.manifest is not None and not self.manifest.get("relative", False):
+            #Manifest from before our images were recorded relative to input_dir, with the input_dir it was made with
+            self.manifest["images"] = {os.path.relpath(fpath, input_dir): entry for fpath, entry in self.manifest["images"].items()}
+            self.manifest["relative"] = True
+
+        #Indices of the tiles we (re)write or orphan this session, so our classifications can match
+        self.ingested = []
+
+        if self.manifest is not None:
+            #Convert the new or changed image files in input_dir to .npy files in an intermediate directory.
+            changed = [fpath for fpath in fpaths(input_dir) if self.source_changed(fpath)]
+            if len(changed) > 0:
+                self.ingest(changed, workers)
+            save_json(MANIFEST_FNAME, self.manifest)
+
+        #Our list of source image files we provide an interface for the tiles of with this class
+        self.sources = fpaths(NPY_IMAGE_DIR)
+
+        """
+        Our list of (source index, y, x, h, w) for each tile.
+
+        Without a manifest, each .npy file is its own tile.
+        Orphaned tiles (see ingest()) have no source and are None.
+        """
+        if self.manifest is None:
+            self.tiles = [(s, 0, 0) + self.source(s, "r").shape[:2] for s in range(self.n_sources())]
+        else:
+            self.tiles = [None]*self.manifest["n_tiles"]
+            for entry in self.manifest["images"].values():
+                for i, origin in zip(entry["tiles"], entry["origins"]):
+                    self.tiles[i] = tuple([entry["source"]] + origin)
+
+    def manifest_key(self, fpath):
+        #Where fpath is recorded in our manifest, see __init__()
+        return os.path.relpath(fpath, self.input_dir)
+
+    def source_changed(self, fpath):
+        """
+        Checks the given source image against our manifest.
+
+        We only hash the file if its size or mtime differ from the manifest,
+            since that's the only expensive part of this check. If only the mtime
+            changed (e.g. the file was copied), we update it and treat it as unchanged.
+        """
+        entry = self.manifest["images"].get(self.manifest_key(fpath))
+        if entry is None:
+            return True
+
+        stat = os.stat(fpath)
+        if entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            return False
+
+        if entry["hash"] != file_hash(fpath):
+            return True
+
+        entry["size"], entry["mtime"] = stat.st_size, stat.st_mtime
+        return False
+
+    def ingest(self, img_fpaths, workers):
+        """
+        Converts the given image files to .npy files, as a pipeline of three stages:
+            decode - worker processes load each image
+            queue - a bounded queue of decoded images waiting to be written
+            write - a single writer thread saving each image and its pyramid levels, and computing its tiles in order
+
+        Since the decoded images are yielded in the order of img_fpaths and only one
+            thread writes, our {:04d}.npy and tile indices are the same regardless of the
+            number of workers.
 
-            #Convert the image files in input_dir to .npy files in an intermediate directory.
-            i = 0
-            for fpath in tqdm(fpaths(input_dir)):
+        A changed image overwrites its old .npy and reuses the tile indices it produced previously,
+            and any new images (or extra tiles of a changed image) are appended after our existing ones,
+            so the indices of all other tiles never move. If a changed image now has fewer
+            tiles, its leftover indices are kept as orphans rather than renumbering.
 
-                #Try to load the image file, if we fail it wasn't an image file so we ignore it
+        Records every image in our manifest, and prints the throughput of each stage once finished.
+
+        If writing fails (i.e. the disk is full), we stop decoding and raise the writer's exception.
+        """
+        """
+        Our INGEST_QUEUE_SIZE decoded images are split between those decoded but not yet given to our writer,
+            and those waiting in its queue, leaving room for the one it's writing and the one we're giving it.
+        """
+        max_pending = max(INGEST_QUEUE_SIZE//2, 1)
+        write_queue = queue.Queue(maxsize=max(INGEST_QUEUE_SIZE-max_pending-2, 1))
+        write_stats = {"bytes": 0, "seconds": 0.0, "error": None}
+
+        def write():
+            try:
+                write_all()
+            except BaseException as e:
+                write_stats["error"] = e
+
+        def write_all():
+            next_source = self.n_sources()
+            while True:
+                item = write_queue.get()
+                if item is None:
+                    break
+
+                start = time.time()
+                fpath, img, fhash = item
+                entry = self.manifest["images"].get(self.manifest_key(fpath), {"source": None, "tiles": []})
+
+                source, origins = entry["source"], []
+                if img is not None:
+                    if source is None:
+                        source = next_source
+                        next_source+=1
+
+                    self.save_source(source, img)
+                    self.save_levels(source, img)
+                    write_stats["bytes"] += img.nbytes
+
+                    origins = [list(origin) for origin in ImageTiles(img, self.win_h, self.win_w).origins]
+
+                #Reuse this image's old tile indices first, then append
+                tiles = entry["tiles"][:len(origins)]
+                while len(tiles) < len(origins):
+                    tiles.append(self.manifest["n_tiles"])
+                    self.manifest["n_tiles"]+=1
+                orphans = entry["tiles"][len(origins):]
+                self.manifest["orphans"].extend(orphans)
+
+                #Orphans no longer have any part of an image, so they've changed this session too
+                self.ingested.extend(tiles + orphans)
+
+                #Non-image files are recorded too, so we don't try to decode them again next time
+                stat = os.stat(fpath)
+                self.manifest["images"][self.manifest_key(fpath)] = {"size": stat.st_size, "mtime": stat.st_mtime, "hash": fhash,
+                        "source": source, "tiles": tiles, "origins": origins}
+                write_stats["seconds"] += time.time()-start
+
+        writer = threading.Thread(target=write)
+        writer.start()
+
+        def put(item):
+            #Waits for room in our writer's queue, unless our writer has stopped, returning whether it was queued
+            while writer.is_alive():
                 try:
-                    img = imread(fpath)
-                    
-                    """
-                    We then iterate through image subsection(s) on the image,
-                        via a method which will dynamically divide the image
-                        into smaller equally-sized parts if the image
-                        is too big for us to efficiently manipulate it in memory
-                        by itself. If the image doesn't need to be divided,
-                        then we'll only iterate through this generator once.
-                    """
-                    for img_sub in image_subsections(img):
-                        np.save("{:04d}.npy".format(os.path.join(NPY_IMAGE_DIR,i), img_sub))
-                        i+=1
-
-                except: pass
-
-
-        #Our list of image files we provide an interface for with this class
-        self.imgs = fpaths(NPY_IMAGE_DIR)
+                    write_queue.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        n_imgs, decode_bytes, decode_seconds = 0, 0, 0.0
+        start = time.time()
+        try:
+            #Our progress comes first, so it sees the end of our images and reports that we've finished
+            for (img, fhash, n_bytes, seconds), fpath in zip(progress(decoded_images(img_fpaths, workers, max_pending), "ingest", total=len(img_fpaths)), img_fpaths):
+                decode_bytes += n_bytes
+                decode_seconds += seconds
+                if img is not None:
+                    n_imgs += 1
+                if not put((fpath, img, fhash)):
+                    break
+        finally:
+            #Always let the writer finish what it has, even if decoding failed
+            put(None)
+            writer.join()
+
+        if write_stats["error"] is not None:
+            raise write_stats["error"]
+
+        #Our workers decoded in parallel, so their combined busy time is spread across them
+        print_throughput("Decode", n_imgs, decode_bytes, decode_seconds/max(workers, 1))
+        print_throughput("Write", n_imgs, write_stats["bytes"], write_stats["seconds"])
+        print_throughput("Total", n_imgs, decode_bytes, time.time()-start)
+
+    def n_sources(self):
+        return len(self.store) if self.store is not None else len(fpaths(NPY_IMAGE_DIR))
+
+    def source(self, s, mmap_mode):
+        #Lazy view of the entire source image s, a np.memmap or ChunkedImage depending on our store
+        if self.store is not None:
+            return self.store[s]
+        return np.load(self.sources[s], mmap_mode=mmap_mode)
+
+    def save_source(self, s, img):
+        #Saves img as source image s, where s may be n_sources() to add a new one
+        if self.store is not None:
+            self.store[s] = img
+            return
+
+        #Save to a temporary file first, since memmaps of the old image may still be reading it
+        source_fpath = os.path.join(NPY_IMAGE_DIR, "{:04d}.npy".format(s))
+        np.save(source_fpath + ".tmp.npy", img)
+        os.replace(source_fpath + ".tmp.npy", source_fpath)
+
+    def level_fpath(self, s, k):
+        return os.path.join(NPY_LEVEL_DIR, "{:04d}_{}.npy".format(s, k))
+
+    def save_levels(self, s, img):
+        #Saves each pyramid level of img as those of source image s, replacing any it had before
+        k = 1
+        while os.path.exists(self.level_fpath(s, k)):
+            os.remove(self.level_fpath(s, k))
+            k+=1
+
+        level, k = img, 0
+        while max(level.shape[:2]) > PYRAMID_MIN_SIZE:
+            level = halve(level)
+            k+=1
+            np.save(self.level_fpath(s, k), level)
+
+    def pyramid(self, i, k):
+        """
+        Returns (tile, k) for tile i at pyramid level k, or the nearest level below k if
+            its source image doesn't have that many (or any, if converted before we had pyramids).
+
+        Each level's tile is the region of that level of its source image covering the tile,
+            with its edges rounded down to that level's pixels.
+        """
+        if self.tiles[i] is None:
+            return self[i], 0
+
+        s, y, x, h, w = self.tiles[i]
+        while k > 0 and not os.path.exists(self.level_fpath(s, k)):
+            k-=1
+        if k == 0:
+            return self[i], 0
+
+        level = np.load(self.level_fpath(s, k), mmap_mode=self.mmap_mode)
+        return level[y>>k:(y+h)>>k, x>>k:(x+w)>>k], k
+
+    def level(self, i, scale):
+        """
+        Returns tile i resized by scale, either one factor for both axes or (fy, fx).
+
+        We start from the smallest pyramid level at least as large as the result, so we never
+            read more than 4 times the pixels of the result, and only that level is resized the rest
+            of the way, with linear interpolation since it's never shrunk by more than half.
+        """
+        fy, fx = scale if isinstance(scale, tuple) else (scale, scale)
+        h, w = self.shape(i)[:2]
+        if h == 0 or w == 0:
+            return np.asarray(self[i])
+        out_h, out_w = max(int(round(h*fy)), 1), max(int(round(w*fx)), 1)
+
+        k = max(int(np.floor(np.log2(1/max(fy, fx)))), 0) if max(fy, fx) > 0 else 0
+        img, k = self.pyramid(i, k)
+        img = np.asarray(img)
+        if img.shape[:2] == (out_h, out_w):
+            return img
+
+        from scipy.ndimage import zoom
+        return zoom(img, (out_h/img.shape[0], out_w/img.shape[1]) + (1,)*(img.ndim-2), order=1)
 
     def __iter__(self):
-        for img in self.imgs:
-            yield np.load(img)
+        for i in range(len(self)):
+            yield self[i]
 
     def __getitem__(self, i):
-        return np.load(self.imgs[i])
+        if self.tiles[i] is None:
+            #Orphaned tile, which no longer has any part of an image
+            return np.zeros((0, 0), dtype=np.uint8)
+
+        s, y, x, h, w = self.tiles[i]
+        if self.store is not None:
+            return self.store[s].view(y, x, h, w)
+        return self.source(s, self.mmap_mode)[y:y+h, x:x+w]
 
     def __setitem__(self, i, img):
-        np.save(self.imgs[i], img)
+        #Writes the tile in place in its source image, which any memmaps of it will also see
+        s, y, x, h, w = self.tiles[i]
+        if self.store is not None:
+            self.store.write(s, y, x, img)
+            return
+
+        source = self.source(s, "r+")
+        source[y:y+h, x:x+w] = img
+        source.flush()
 
     def __len__(self):
-        return len(self.imgs)
+        return len(self.tiles)
+
+    def shape(self, i):
+        #Only reads the header of the .npy file, or the index of our chunked store
+        if self.tiles[i] is None:
+            return (0, 0)
+        s, y, x, h, w = self.tiles[i]
+        return (h, w) + self.source(s, "r").shape[2:]
+
+    def max_shape(self):
+        #Maximum dimensions of all images
+        shapes = [self.shape(i) for i in range(len(self))]
+        return [max(dims) for dims in zip(*shapes)] if len(shapes) > 0 else []
 
+    def sample_format(self):
+        #Shape and dtype of each of our windows as a sample, see Classifications.export()
+        sample_shape = (self.win_h, self.win_w) + tuple(self.max_shape()[2:])
+        return sample_shape, self[0].dtype if len(self) > 0 else np.uint8
@@ -0,0 +1,182 @@
+from base import *
+from config import LOADER_BATCH_SIZE, LOADER_PREFETCH_BATCHES
+
+import queue
+import threading
+import numpy as np
+
+class ArraySource():
+    """
+    Samples of our exported output_X.npy, output_Y.npy, output_I.npy, or of their shards
+        if we have an output_index.json, see Classifications.export_shards().
+
+    X and I are memory-mapped, so only the samples we read are ever loaded. Y is loaded
+        entirely, since it's one byte per sample and we need all of it to sample by label.
+    """
+    def __init__(self, output_fname):
+        output_fname = output_fname.replace(".npy", "")
+        index_fpath = output_fname + "_index.json"
+        index = load_json(index_fpath, None)
+        if index is not None:
+            #Shards are always next to their index, wherever they were when they were exported
+            shard_dir = os.path.dirname(index_fpath)
+            shards = [[os.path.join(shard_dir, os.path.basename(shard[output])) for output in "XYI"] for shard in index["shards"]]
+        else:
+            shards = [[output_fname + "_{}.npy".format(output) for output in "XYI"]]
+
+        self.X = [np.load(shard[0], mmap_mode="r") for shard in shards]
+        self.I = [np.load(shard[2], mmap_mode="r") for shard in shards]
+        self.Y = np.concatenate([np.zeros(0, dtype=np.uint8)] + [np.load(shard[1]) for shard in shards])
+
+        #Index of the first sample of each shard, and the end of the last
+        self.starts = np.cumsum([0] + [len(X) for X in self.X])
+        self.sample_shape = self.X[0].shape[1:] if len(self.X) > 0 else ()
+        self.dtype = self.X[0].dtype if len(self.X) > 0 else np.uint8
+
+    def read(self, indices):
+        """
+        Returns (X, I) of the samples at indices, in that order.
+
+        We read them in order of their index, one shard at a time, so that reads from each
+            memory-mapped file are sequential when the indices are close together.
+        """
+        X = np.empty((len(indices),) + self.sample_shape, dtype=self.dtype)
+        I = np.empty((len(indices), 3), dtype=np.int64)
+
+        order = np.argsort(indices, kind="stable")
+        shards = np.searchsorted(self.starts, indices[order], side="right")-1
+        for k in np.unique(shards):
+            positions = order[shards == k]
+            offsets = indices[positions] - self.starts[k]
+            X[positions] = self.X[k][offsets]
+            I[positions] = self.I[k][offsets]
+        return X, I
+
+class ClassificationSource():
+    """
+    Samples read directly from our Classifications and the Images they're of, without exporting them.
+
+    Each sample is read from its image when needed, so this is slower than reading exported
+        samples, but always has the latest classifications.
+    """
+    def __init__(self, classifications):
+        self.imgs = classifications.imgs
+        self.cells = classifications.labeled_cells()
+        self.Y = (self.cells[:, 3]-1).astype(np.uint8)
+        self.sample_shape, self.dtype = self.imgs.sample_format()
+
+    def read(self, indices):
+        #Returns (X, I) of the samples at indices, in that order
+        win_h, win_w = self.imgs.win_h, self.imgs.win_w
+        cells = self.cells[indices]
+        X = np.empty((len(indices),) + self.sample_shape, dtype=self.dtype)
+        for p, (i, row, col, label_id) in enumerate(cells):
+            X[p] = self.imgs[i][row*win_h:(row+1)*win_h, col*win_w:(col+1)*win_w]
+        return X, cells[:, :3]
+
+class Loader():
+    """
+    Iterates over batches of (X, Y, I) numpy arrays of our samples, in the same format as our output,
+        for training on them without loading them all into memory first. Each iteration is one epoch.
+
+    Our samples are either those exported to output_fname (i.e. "output.npy"), sharded or not, or read
+        directly from a Classifications. See ArraySource and ClassificationSource.
+
+    Each epoch, our samples are
+        shuffled, if shuffle,
+        or if balanced, drawn at random (with replacement) so that every label is drawn equally often,
+            by weighting each sample by one over the amount of samples with its label.
+        Otherwise, they're in the order of our output.
+
+    With n_workers, e.g. the processes of a distributed training job, each worker only iterates over
+        every n_workers-th sample of the epoch starting at worker_id. Every worker gets the same order
+        from the same seed and epoch, so together they iterate over each sample exactly once.
+
+    Batches are read in a background thread up to prefetch batches ahead of the one being used,
+        so that reading the next batch overlaps with training on this one.
+    """
+    def __init__(self, source, batch_size=LOADER_BATCH_SIZE, shuffle=True, balanced=False, seed=0, worker_id=0, n_workers=1, prefetch=LOADER_PREFETCH_BATCHES, drop_last=False):
+        self.source = ArraySource(source) if isinstance(source, str) else ClassificationSource(source)
+        self.batch_size = batch_size
+        self.shuffle, self.balanced = shuffle, balanced
+        self.seed = seed
+        self.worker_id, self.n_workers = worker_id, n_workers
+        self.prefetch = prefetch
+        self.drop_last = drop_last
+        self.epoch = 0
+
+    def histogram(self):
+        #Amount of samples with each label
+        return np.bincount(self.source.Y)
+
+    def indices(self, epoch):
+        #Indices of the samples this worker iterates over in the given epoch, in order
+        Y = self.source.Y
+        rng = np.random.RandomState([self.seed, epoch])
+        if self.balanced and len(Y) > 0:
+            weights = 1/self.histogram()[Y]
+            indices = rng.choice(len(Y), size=len(Y), p=weights/weights.sum())
+        elif self.shuffle:
+            indices = rng.permutation(len(Y))
+        else:
+            indices = np.arange(len(Y))
+        return indices[self.worker_id::self.n_workers]
+
+    def batches(self, indices):
+        #Reads and yields each batch of the given indices
+        end = len(indices) - len(indices)%self.batch_size if self.drop_last else len(indices)
+        for start in range(0, end, self.batch_size):
+            batch = indices[start:start+self.batch_size]
+            X, I = self.source.read(batch)
+            yield X, self.source.Y[batch], I
+
+    def __len__(self):
+        #Amount of batches in each epoch for this worker
+        n = len(range(self.worker_id, len(self.source.Y), self.n_workers))
+        return n//self.batch_size if self.drop_last else -(-n//self.batch_size)
+
+    def __iter__(self):
+        indices = self.indices(self.epoch)
+        self.epoch += 1
+        if self.prefetch <= 0:
+            yield from self.batches(indices)
+            return
+
+        """
+        Our thread puts each batch it reads in a bounded queue, followed by None once it's done,
+            or any exception it raised so we can raise it here. If we stop iterating early,
+            our thread stops once it sees we've stopped, rather than waiting on a full queue forever.
+        """
+        batches = queue.Queue(maxsize=self.prefetch)
+        stopped = threading.Event()
+
+        def put(item):
+            while not stopped.is_set():
+                try:
+                    batches.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def read():
+            try:
+                for batch in self.batches(indices):
+                    if not put(batch):
+                        return
+                put(None)
+            except Exception as e:
+                put(e)
+
+        reader = threading.Thread(target=read, daemon=True)
+        reader.start()
+        try:
+            while True:
+                batch = batches.get()
+                if batch is None:
+                    return
+                if isinstance(batch, Exception):
+                    raise batch
+                yield batch
+        finally:
+            stopped.set()
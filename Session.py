@@ -1,34 +1,100 @@
 from exceptions import *
+from config import WORKERS, CLASSIFICATION_STORE, CLASSIFICATION_STORES
+from Dataset import Dataset
 import os
 
-class Session():
+def pop_option(argv, flag, default, cast=int, valid=lambda value: True):
+    """
+    Parses and removes an optional flag from argv, such as --workers 8, so the
+        rest of argv is only our positional args.
 
-    def __init__(self, argv):
-        #Parse commandline args
-        if len(argv) < 6:
-            raise InvalidArgumentsException()
+    Returns (value, argv without the flag), where value is default if the flag wasn't given.
+    """
+    if flag not in argv:
+        return default, argv
 
-        #Assign and Parse each
-        self.input_dir = argv[1]
-        if not os.path.isdir(self.input_dir):
-            raise InvalidArgumentsException()
+    i = argv.index(flag)
+    try:
+        value = cast(argv[i+1])
+    except:
+        raise InvalidArgumentsException()
+    if not valid(value):
+        raise InvalidArgumentsException()
+    return value, argv[:i] + argv[i+2:]
 
-        self.output_fname = argv[2]
-        if ".npy" not in self.output_fname:
-            raise InvalidArgumentsException()
+def parse_dataset_args(argv):
+    """
+    Parses the positional args every command has, in the format
+        tako.py input_dir output_file labels_file window_height window_width ...
 
-        self.label_fname = argv[3]
-        if ".txt" not in self.label_fname:
-            raise InvalidArgumentsException()
+    Returns (input_dir, output_fname, label_fname, win_h, win_w)
+    """
+    #Parse commandline args
+    if len(argv) < 6:
+        raise InvalidArgumentsException()
 
-        self.win_h = argv[4]
-        self.win_w = argv[5]
-        try:
-            self.win_h = int(self.win_h)
-            self.win_w = int(self.win_w)
-        except:
+    #Assign and Parse each
+    input_dir = argv[1]
+    if not os.path.isdir(input_dir):
+        raise InvalidArgumentsException()
+
+    output_fname = argv[2]
+    if ".npy" not in output_fname:
+        raise InvalidArgumentsException()
+
+    label_fname = argv[3]
+    if ".txt" not in label_fname or not os.path.isfile(label_fname):
+        raise InvalidArgumentsException()
+
+    try:
+        win_h = int(argv[4])
+        win_w = int(argv[5])
+    except:
+        raise InvalidArgumentsException()
+
+    return input_dir, output_fname, label_fname, win_h, win_w
+
+class Command():
+    """
+    What every command has in common, from a session to those ran without the GUI (see Batch):
+        the --workers and --store flags, the positional args of parse_dataset_args(),
+        and the Dataset they're for.
+
+    Commands parse and remove any flags of their own from argv before ours, so that ours
+        are the last flags, and the rest of argv is at most max_args positional args.
+    """
+
+    def __init__(self, argv, max_args=6):
+        #Parse and remove our optional flags first, so the rest are positional
+        self.workers, argv = pop_option(argv, "--workers", WORKERS, valid=lambda workers: workers >= 1)
+        self.store, argv = pop_option(argv, "--store", CLASSIFICATION_STORE, cast=str, valid=lambda store: store in CLASSIFICATION_STORES)
+        if len(argv) > max_args:
             raise InvalidArgumentsException()
 
+        self.input_dir, self.output_fname, self.label_fname, self.win_h, self.win_w = parse_dataset_args(argv)
+        self.argv = argv
+
+    def open_dataset(self, reset=False):
+        #Opens our Dataset, converting any new or changed images in our input_dir
+        self.dataset = Dataset(self.input_dir, self.output_fname, self.label_fname, reset, self.win_h, self.win_w, self.workers, self.store)
+        return self.dataset
+
+    def read_dataset(self):
+        """
+        Opens our Dataset only to read it, as our commands without the GUI do. Its classifications
+            are closed right away, saving any edits still in their log before they're read,
+            and the Dataset itself is closed by the command once it's done with it.
+        """
+        self.open_dataset()
+        self.dataset.classifications.close()
+        return self.dataset
+
+class Session(Command):
+
+    def __init__(self, argv):
+        super(Session, self).__init__(argv, max_args=7)
+        argv = self.argv
+
         self.reset = False
         if len(argv) >= 7:
             if argv[6] != "reset":
@@ -44,8 +110,16 @@ class Session():
                     elif self.reset_confirm == "N":
                         break
 
-        self.dataset = Dataset(self.input_dir, self.output_fname, self.label_fname, self.reset)
-        self.gui = GUI(self.dataset, self.win_h, self.win_w)
+        self.open_dataset(self.reset)
+        try:
+            #Only imported now, since it needs Qt and a display
+            from GUI import GUI
+            self.gui = GUI(self.dataset, self.win_h, self.win_w)
+        finally:
+            #Save and combine all our classifications into our output file whenever the session ends, even if interrupted
+            self.dataset.classifications.close()
+            self.dataset.classifications.export()
+            self.dataset.close()
 
     def start(self):
         pass
@@ -1,5 +1,19 @@
-import os
-from config import IMAGE_MAX_GB
+import os, time, shutil, json, hashlib
+import numpy as np
+from config import EPSILON, LABEL_COLORS, PROGRESS_FORMAT, PROGRESS_JSON_SECONDS
+
+#How progress() and print_throughput() report, see set_progress_format()
+progress_format = PROGRESS_FORMAT
+
+"""
+What each of our worker processes needs, set once when the worker starts
+    rather than being sent along with every task, see init_worker().
+"""
+worker = {}
+
+def init_worker(state):
+    #Pool initializer, or called directly when we do a pool's tasks ourselves
+    worker.update(state)
 
 def fpaths(directory):
     """
@@ -13,8 +27,8 @@ def fpaths(directory):
 
 def clear_dir(directory):
     #Removes all files and subdirectories from directory 
-    for fname in os.listdir(d):
-        fpath = os.path.join(d, fname)
+    for fname in os.listdir(directory):
+        fpath = os.path.join(directory, fname)
         try: 
             if os.path.isfile(fpath):
                 os.unlink(fpath)
@@ -26,62 +40,100 @@ def clear_dir(directory):
 def has_duplicates(l):
     return len(l) != len(set(l))
 
-def image_subsections(img):
+def file_hash(fpath, chunk_size=2**20):
+    #Returns the sha1 hex digest of the contents of the file at fpath, read in chunks
+    h = hashlib.sha1()
+    with open(fpath, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def load_json(fpath, default):
+    #Returns the parsed contents of the json at fpath, or default if it doesn't exist yet
+    if not os.path.exists(fpath):
+        return default
+    with open(fpath, "r") as f:
+        return json.load(f)
+
+def save_json(fpath, data):
+    #Writes data to a temporary file first and then moves it over fpath,
+    #   so that we never leave a half-written json behind if interrupted.
+    tmp_fpath = fpath + ".tmp"
+    with open(tmp_fpath, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_fpath, fpath)
+
+def set_progress_format(fmt):
+    #"bar" for progress bars and readable messages, or "json" for json lines, for when we're ran by another program
+    global progress_format
+    progress_format = fmt
+
+def report(**fields):
+    #Prints fields as one json line, flushed immediately so whatever is reading us sees it right away
+    print(json.dumps(fields), flush=True)
+
+def progress(iterable, stage, total=None):
     """
-    Dynamically divide the image
-        into smaller equally-sized parts if the image
-        is too big for us to efficiently manipulate it in memory
-        by itself. 
-        
-    We determine this size via a constant maximum allowed memory size
-        for our image subsection(s), defined in the config file under
-        IMAGE_MAX_GB. 
-
-    We additionally forcibly convert the given image into the
-        np.uint8 datatype, as otherwise we're wasting space to store
-        the pixels of the image, and this additionally allows
-        us to accurately compute the memory take up by
-        each of our image subsections.
-
-    Yields each subsection in the image, and may just yield
-        the original image if it is smaller than IMAGE_MAX_GB
-    """
-    
-    """
-    Amount we divide each dimension of our image by to get subsections
-        division_factor = 1 means the original image,
-        division_factor = 2 means we divide both height and width
-            by 2, resulting in 2**2 = 4 subsections, or quarters,
-            of the image.
-        division_factor = 3 repeats this, resulting in 9 subsections,
+    Yields each item of iterable, showing our progress through it as a tqdm progress bar,
+        or with the "json" progress format, as json lines on stdout like
 
-        And so on.
+        {"event": "progress", "stage": "export", "done": 10, "total": 100}
 
-    We increase this until each subsection is less than our maximum
-        allowed memory size.
+        at most once every PROGRESS_JSON_SECONDS, along with when we start and finish.
     """
+    if total is None and hasattr(iterable, "__len__"):
+        total = len(iterable)
+
+    if progress_format != "json":
+        from tqdm import tqdm
+        yield from tqdm(iterable, total=total, desc=stage)
+        return
+
+    done, last = 0, time.time()
+    report(event="progress", stage=stage, done=done, total=total)
+    for item in iterable:
+        yield item
+        done += 1
+        if time.time()-last >= PROGRESS_JSON_SECONDS:
+            report(event="progress", stage=stage, done=done, total=total)
+            last = time.time()
+    report(event="progress", stage=stage, done=done, total=total)
+
+def print_throughput(stage, n_imgs, n_bytes, seconds):
+    #Prints the images/s and MB/s a stage of a pipeline processed over the given time
+    seconds = max(seconds, EPSILON)
+    if progress_format == "json":
+        report(event="throughput", stage=stage.lower(), images=n_imgs, bytes=n_bytes, seconds=seconds)
+        return
+    print("{}: {} images, {:.1f} MB in {:.2f}s ({:.2f} images/s, {:.2f} MB/s)".format(
+        stage, n_imgs, n_bytes/1e6, seconds, n_imgs/seconds, n_bytes/1e6/seconds))
+
+def halve(img, band_h=1024):
+    """
+    Downsamples img by 2 along both axes with area interpolation, i.e. each pixel
+        is the mean of a 2x2 block of img's pixels, dropping the last row or
+        column of img if it has an odd amount of them.
 
-    division_factor = 1
-
-    #While each subsection's memory size is larger than our allowed size
-    while img.size//(division_factor**2) > IMAGE_MAX_GB:
-
-        #Increase the amount of divisions
-        division_factor += 1
-
-    #We now know how many divisions are necessary / what division_factor
-    #   needs to be, so we iterate through our subsections
-    step = img.size//division_factor
-    for si in range(0, img.size-step, step):
-        for sj in range(0, img.size-step, step):
-            yield img[si:si+step, sj:sj+step]
-
-
-
-
-
-
-
-
-    
-
+    We go through img in bands of band_h output rows, so that if img is a
+        memmap, only one band of it is ever in memory at once.
+    """
+    h, w = img.shape[0]//2, img.shape[1]//2
+    halved = np.empty((h, w) + img.shape[2:], dtype=img.dtype)
+    for y in range(0, h, band_h):
+        band = np.asarray(img[2*y:2*min(y+band_h, h), :2*w], dtype=np.float32)
+        band = band.reshape((band.shape[0]//2, 2, w, 2) + band.shape[2:]).mean(axis=(1, 3))
+        if np.issubdtype(img.dtype, np.integer):
+            band = np.rint(band)
+        halved[y:y+band.shape[0]] = band
+    return halved
+
+def label_palette(alpha=255):
+    """
+    Returns the RGBA color of each label id in our classification grids as a uint8 array,
+        so a grid can be colored with palette[grid]. Label id 0 ("Nothing") is transparent,
+        and label id k is LABEL_COLORS[k-1] with the given alpha.
+    """
+    palette = np.zeros((len(LABEL_COLORS)+1, 4), dtype=np.uint8)
+    palette[1:, :3] = [[int(value) for value in color[4:-1].split(",")] for color in LABEL_COLORS]
+    palette[1:, 3] = alpha
+    return palette
@@ -0,0 +1,49 @@
+"""
+Measures how long tako takes to start without the GUI, via
+
+    python benchmark_startup.py [runs]
+
+Each run imports everything a headless command (i.e. tako.py export) needs in a new interpreter,
+    and we print the median time taken to start the interpreter and import them, along with
+    which of our heavy dependencies were imported. These should only be imported by the
+    code which uses them, and Qt only by the GUI.
+
+Exits with status 1 if the median is over STARTUP_BUDGET_SECONDS or Qt was imported,
+    so that it can be ran as a check.
+"""
+import os, sys, json, time, statistics, subprocess
+from config import STARTUP_BUDGET_SECONDS
+
+HEADLESS_MODULES = ["base", "Images", "ChunkStore", "Classifications", "EditLog", "Database", "Dataset", "Export", "Session", "Batch", "Loader"]
+HEAVY_MODULES = ["PyQt5", "scipy", "tqdm", "PIL"]
+
+#Ran in each new interpreter, printing how long the imports took and which heavy modules they imported
+SNIPPET = """
+import sys, time, json
+start = time.perf_counter()
+import {}
+print(json.dumps({{"seconds": time.perf_counter()-start, "heavy": [module for module in {} if module in sys.modules]}}))
+""".format(", ".join(HEADLESS_MODULES), HEAVY_MODULES)
+
+def run():
+    #Returns (total seconds, import seconds, heavy modules imported) of one new interpreter
+    start = time.perf_counter()
+    output = subprocess.check_output([sys.executable, "-c", SNIPPET], cwd=os.path.dirname(os.path.abspath(__file__)))
+    total = time.perf_counter()-start
+    result = json.loads(output.decode().strip().splitlines()[-1])
+    return total, result["seconds"], result["heavy"]
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    results = [run() for _ in range(runs)]
+
+    total = statistics.median([result[0] for result in results])
+    imports = statistics.median([result[1] for result in results])
+    heavy = sorted(set(module for result in results for module in result[2]))
+
+    print("Startup: {:.3f}s median over {} runs ({:.3f}s importing {})".format(total, runs, imports, ", ".join(HEADLESS_MODULES)))
+    print("Heavy modules imported: {}".format(", ".join(heavy) if len(heavy) > 0 else "None"))
+
+    if total > STARTUP_BUDGET_SECONDS or "PyQt5" in heavy:
+        print("Over our budget of {:.3f}s, or imported Qt".format(STARTUP_BUDGET_SECONDS))
+        sys.exit(1)
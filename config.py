@@ -1,48 +1,36 @@
-from PyQt5.QtGui import QColor
-from PyQt5.QtWidgets import *
-from PyQt5.QtGui import *
-
-#Calculate our config variables which depend on screen size
-app = QApplication([])
-SCREEN = QDesktopWidget().screenGeometry()
-SCREEN_HEIGHT, SCREEN_WIDTH = SCREEN.height(), SCREEN.width()
+import os
 
 NPY_IMAGE_DIR = "data/images"
 NPY_CLASSIFICATION_DIR = "data/classifications"
+NPY_LEVEL_DIR = "data/levels"#Downsampled pyramid levels of each image in NPY_IMAGE_DIR
+MANIFEST_FNAME = "data/manifest.json"#Source image metadata and the .npy indices each produced
+EDIT_LOG_FNAME = "data/edits.log"#Append-only log of classification edits not yet saved to NPY_CLASSIFICATION_DIR
+EDIT_LOG_FSYNC_SECONDS = 0.25#How often new edits in the log are flushed to disk
+EDIT_LOG_COMPACT_SECONDS = 5.0#How often the edits in the log are saved to NPY_CLASSIFICATION_DIR and the log emptied
+CLASSIFICATION_STORE = "npy"#How classifications and user progress are stored, "npy" for NPY_CLASSIFICATION_DIR or "sqlite" for one DATABASE_FNAME, overriden with --store
+CLASSIFICATION_STORES = ("npy", "sqlite")#Every value of CLASSIFICATION_STORE, and so of --store
+DATABASE_FNAME = "data/tako.db"
 IMAGE_MAX_GB = 1.0#Maximum allowed size of a viewable image, in GB.
+IMAGE_MMAP_MODE = "r"#How images are memory-mapped when read, "r" for read-only views, "c" for copy-on-write, None to load into memory
+IMAGE_STORE = "npy"#How images are stored, "npy" for a .npy file per image or "chunked" for one compressed CHUNK_STORE_FNAME
+CHUNK_STORE_FNAME = "data/images.chunks"
+CHUNK_CODECS = ["lz4", "zstd", "blosc", "zlib"]#Compressors for the chunked store in order of preference, the first installed is used
+CHUNK_MIN_BYTES = 2**16#Minimum uncompressed size of each chunk in the chunked store
+WORKERS = os.cpu_count() or 1#Default amount of processes converting or exporting images for every command, one per core, overriden with --workers
+INGEST_QUEUE_SIZE = 8#Maximum amount of decoded images held in memory at once while converting them, at least 4, see Images.ingest()
+PYRAMID_MIN_SIZE = 512#Images are halved into pyramid levels until both dimensions are at most this
+EXPORT_OVERLAY_SCALE = 1/8#Size of the overlay images written by tako.py export, relative to the images
+EXPORT_PNG_COMPRESSION = 6#zlib compression level of the overlay images, from 0 (fastest) to 9 (smallest), overriden with --compression
+EXPORT_BAND_DENSITY = 0.5#Fraction of the windows from the first to the last labeled one in a row which must be labeled to export them by reading them all at once, rather than one at a time
+EXPORT_SHARD_BYTES = 10**9#Maximum size of each shard of output_X.npy when exporting in shards, overriden with --shard-samples or --shard-gb
+LOADER_BATCH_SIZE = 32#Default amount of samples in each batch of a Loader
+LOADER_PREFETCH_BATCHES = 4#Default amount of batches a Loader reads ahead in the background
+PROGRESS_FORMAT = "bar"#How progress is shown, "bar" for progress bars or "json" for json lines on stdout, overriden with --progress
+PROGRESS_JSON_SECONDS = 1.0#Minimum time between json progress lines of the same stage
+STARTUP_BUDGET_SECONDS = 1.0#Maximum time to start a command without the GUI, checked by benchmark_startup.py
 EPSILON = 1e-7
 
-#TOOLBAR_SCREEN_HEIGHT_PERCENTAGE = .925
-TOOLBAR_SCREEN_HEIGHT_PERCENTAGE = .70
-TOOLBAR_SCREEN_WIDTH_PERCENTAGE = .13
-TOOLBAR_SCREEN_Y_HEIGHT_PERCENTAGE = 0.0375
-
-#Compute size of our toolbar relative to screen dimensions
-TOOLBAR_HEIGHT = TOOLBAR_SCREEN_HEIGHT_PERCENTAGE*SCREEN_HEIGHT
-TOOLBAR_WIDTH = TOOLBAR_SCREEN_WIDTH_PERCENTAGE*SCREEN_WIDTH
-TOOLBAR_Y = TOOLBAR_SCREEN_Y_HEIGHT_PERCENTAGE*SCREEN_HEIGHT
-TOOLBAR_X = TOOLBAR_Y#Same padding as y
-
-#CANVAS_SCREEN_HEIGHT_PERCENTAGE = .925
-CANVAS_SCREEN_HEIGHT_PERCENTAGE = .70
-CANVAS_SCREEN_WIDTH_PERCENTAGE = .80
-CANVAS_SCREEN_Y_HEIGHT_PERCENTAGE = 0.0375 
-
-#Compute size of our canvas relative to screen dimensions
-CANVAS_HEIGHT = CANVAS_SCREEN_HEIGHT_PERCENTAGE*SCREEN_HEIGHT
-CANVAS_WIDTH = CANVAS_SCREEN_WIDTH_PERCENTAGE*SCREEN_WIDTH
-CANVAS_Y = CANVAS_SCREEN_Y_HEIGHT_PERCENTAGE*SCREEN_HEIGHT
-CANVAS_X = TOOLBAR_X + TOOLBAR_WIDTH + CANVAS_Y 
-
-#Compute size of toolbar elements relative to the toolbar dimensions
-TOOLBAR_PADDING = TOOLBAR_WIDTH/25
-TOOLBAR_MIN_ITEM_HEIGHT = TOOLBAR_WIDTH/15#I'd make this /25 if it didn't clip the text
-TOOLBAR_MAX_ITEM_HEIGHT = TOOLBAR_WIDTH/5 
-TOOLBAR_MIN_ITEM_WIDTH = TOOLBAR_WIDTH/5 
-TOOLBAR_MAX_ITEM_WIDTH = TOOLBAR_WIDTH - 2*TOOLBAR_PADDING
-
 #Tools
-SELECTION_RECT_FILL_COLOR = QColor(255, 0, 0, 255)#TO BE UPDATED
 RECT_SELECT = 0
 RECT_SELECT_ICON_FNAME = "assets/icons/rectangle_selection_tool.png"
 LASSO_SELECT = 1
@@ -66,6 +54,28 @@ LABEL_COLORS = [
     "rgb(255, 0, 128)",
 ]
 
+#Default label transparency, as a percentage, 0 being opaque and 100 being invisible
+LABEL_TRANSPARENCY = 50
+
+#Image navigation, how many images before and after the current one to load in the background,
+#   and the maximum memory we keep loaded display tiles in.
+IMAGE_CACHE_PREFETCH = 2
+IMAGE_CACHE_WORKERS = 2
+IMAGE_CACHE_MAX_BYTES = 2**30
+
+#Images are displayed in tiles of this many pixels square at each level of detail
+DISPLAY_TILE_SIZE = 512
+
+#Default radius in windows of the circle the pencil and eraser label around the cursor, and the maximum of their size sliders
+PENCIL_SIZE = 6
+ERASER_SIZE = 6
+BRUSH_MAX_RADIUS = 32
+
+#Range of our zoom slider, and how much each step of the mouse wheel zooms by
+ZOOM_MIN = 1/64
+ZOOM_MAX = 4
+ZOOM_WHEEL_STEP = 1.25
+
 #Percentages each element (individualLy) takes up of the total width of this element
 #   in the toolbar.
 IMAGE_NAVIGATOR_BUTTON_WIDTH_PERC = .25
@@ -1,7 +1,7 @@
 
 class InvalidArgumentsException(Exception):
     def __init__(self):
-        raise Exception("""
+        super(InvalidArgumentsException, self).__init__("""
 Invalid Arguments Provided.
 
 Example Usage:
@@ -20,11 +20,41 @@ Arguments:
     window_height - Height of your selections in the GUI
     window_width - Height of your selections in the GUI
     reset (optional) - if provided as the string "reset", will prompt you to restart your session.
+    --workers N (optional) - Number of processes used to decode images when converting them, defaults to one per core
+    --store npy|sqlite (optional) - Store classifications as a .npy file per image (the default), or in one SQLite
+        database along with each user's progress and where each image came from, in data/tako.db
+
+Running without the GUI:
+
+    python tako.py ingest input/ output.npy labels.txt 512 512
+
+    Only converts any new or changed images in input/, so a session can start right away.
+
+    python tako.py export input/ output.npy labels.txt 512 512
+
+    Writes output_X.npy, output_Y.npy and output_I.npy, output_stats.csv with the amount of windows
+        with each label in each image, and output_overlays/ with each image with its classifications overlaid.
+
+    python tako.py stats input/ output.npy labels.txt 512 512
+
+    Only writes output_stats.csv.
+
+    --workers N (optional) - Number of processes used to convert or export images, defaults to one per core
+    --compression N (optional) - Compression level of the overlay .png files, from 0 (fastest) to 9 (smallest)
+    --store npy|sqlite (optional) - Where the classifications are stored, as above
+    --shard-samples N, --shard-gb N (optional) - Export output_X_00000.npy, output_Y_00000.npy, output_I_00000.npy, ...
+        in shards of at most N samples or N GB each, with output_index.json listing the samples and labels in each
+    --shuffle SEED (optional) - Export in shards, with the samples shuffled across them the same way for the same SEED
+    --progress bar|json (optional) - Show progress as progress bars (the default), or as json lines on stdout,
+        ending with a "done" or "error" line
+
+    These exit with 0 if successful, 1 if something went wrong, and 2 if given invalid arguments,
+        labels or window shape.
 """)
 
 class InvalidLabelsException(Exception):
     def __init__(self):
-        raise Exception("""
+        super(InvalidLabelsException, self).__init__("""
 Invalid Labels Provided.
 
 Example Label File:
@@ -41,7 +71,13 @@ Example Label File:
     There must be at least one label, there must be no empty lines or labels, and there must be no duplicate labels.
 """)
 
-    
-
+class WindowShapeChangedException(Exception):
+    def __init__(self):
+        super(WindowShapeChangedException, self).__init__("""
+Window Shape Changed.
 
+Your images were divided into tiles aligned to the window height and width of your previous session,
+    so they can't be used with a different window height and width.
 
+Either use the same window height and width as before, or provide "reset" to start over with the new ones.
+""")
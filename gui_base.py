@@ -1,8 +1,14 @@
+import threading
+import functools
+import traceback
+import collections
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from PyQt5.QtCore import *
 from PyQt5.QtWidgets import *
 from PyQt5.QtGui import *
-from config import * 
+from gui_config import *
+from base import label_palette
 
 def get_rectangle_from_points(p1, p2):
     x1, y1 = p1.x(), p1.y()
@@ -67,48 +73,397 @@ def get_outline_rect(rect, step_h, step_w):
     outline_y2 = np.ceil(y2/step_h)*step_h
 
 
-    return QGraphicsRectItem(QRectF(QPointF(outline_x1, outline_y1), QPointF(outline_x2, outline_y2)))
+    return QRectF(QPointF(outline_x1, outline_y1), QPointF(outline_x2, outline_y2))
 
 def approximate_polygon(polygon, img_h, img_w, step_h, step_w):
     """
     We approximate the area encompassed by our QPolygonF
-        with rectangles of shape step_h x step_w, and
-        we obtain the list of approximate rectangles via iterating
-        through each rectangle on the image and checking
-        if it's center is inside the polygon.
-
-    We add these all to a QGraphicsItemGroup, and return that.
+        with windows of shape step_h x step_w, where a window
+        is selected if its center is inside the polygon.
+
+    Rather than checking each window center with Qt, we fill the
+        polygon's bounding box one row of window centers at a time
+        with the even-odd rule, all rows at once with numpy:
+        1. Find where each polygon edge crosses each row's center line.
+        2. Each crossing flips whether the window centers to the right of it
+            are inside the polygon, so we mark the first window center at or past each
+            crossing, and a cumulative count of marks along the row gives
+            how many crossings are left of each center. Odd means inside.
+
+    Returns (mask, row, col), a boolean mask of the selected windows in the bounding box,
+        and the row and column of its top-left window in our grid of (img_h//step_h, img_w//step_w)
+        whole windows.
     """
-    #Ensure int data types
     img_h, img_w, step_h, step_w = int(img_h), int(img_w), int(step_h), int(step_w)
+    rows, cols = img_h//step_h, img_w//step_w
+
+    points = np.array([(point.x(), point.y()) for point in polygon], dtype=np.float64).reshape(-1, 2)
+    if len(points) < 3:
+        return np.zeros((0, 0), dtype=bool), 0, 0
+
+    #Bounding box of the polygon in windows, clipped to the grid
+    (x1, y1), (x2, y2) = points.min(axis=0), points.max(axis=0)
+    row1, col1 = max(int(np.floor(y1/step_h)), 0), max(int(np.floor(x1/step_w)), 0)
+    row2, col2 = min(int(np.ceil(y2/step_h)), rows), min(int(np.ceil(x2/step_w)), cols)
+    if row2 <= row1 or col2 <= col1:
+        return np.zeros((0, 0), dtype=bool), 0, 0
+
+    #Edges of the polygon, closing it back to the start
+    ex1, ey1 = points[:, 0], points[:, 1]
+    ex2, ey2 = np.roll(ex1, -1), np.roll(ey1, -1)
+
+    #Rows each edge crosses, the ones whose center y is within it (counting its top end but not its bottom),
+    #   listed as one (row, edge) pair per crossing so we only compute the crossings which exist
+    edge_row1 = np.ceil((np.minimum(ey1, ey2) - step_h//2)/step_h).astype(np.int64).clip(row1, row2)
+    edge_row2 = np.ceil((np.maximum(ey1, ey2) - step_h//2)/step_h).astype(np.int64).clip(row1, row2)
+    counts = edge_row2 - edge_row1
+    edge_i = np.repeat(np.arange(len(points)), counts)
+    row_i = edge_row1[edge_i] + np.arange(len(edge_i)) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    #Where each crossing is, as the first column whose center is at or right of it, relative to the bounding box
+    cy = row_i*step_h + step_h//2
+    cross_x = ex1[edge_i] + (cy-ey1[edge_i])*(ex2[edge_i]-ex1[edge_i])/(ey2[edge_i]-ey1[edge_i])
+    col_i = np.ceil((cross_x - step_w//2)/step_w).astype(np.int64) - col1
+    col_i = np.clip(col_i, 0, col2-col1)
+    row_i = row_i - row1
 
-    #Create group
-    rects = QGraphicsItemGroup()
-    #Iterate through centers
-    for i in range(int(step_h//2), img_h, step_h):
-        for j in range(int(step_w//2), img_w, step_w):
+    """
+    Every row crosses the polygon an even amount of times, so we can count
+        along the flattened rows rather than each row separately, which is much faster.
+        Only the parity of the count matters, so it can wrap around in uint8.
+    """
+    flips = np.zeros((row2-row1, col2-col1+1), dtype=np.uint8)
+    np.add.at(flips, (row_i, col_i), 1)
+    mask = (np.cumsum(flips, dtype=np.uint8).reshape(flips.shape)[:, :-1] & 1).astype(bool)
 
-            #Check if center is inside polygon
-            if polygon.containsPoint(QPointF(j, i), Qt.OddEvenFill):
+    return mask, row1, col1
 
-                #Get the rectangle at this position
-                rect = QGraphicsRectItem(QRectF(QPointF(j-step_w//2, i-step_h//2), QPointF(j+step_w//2, i+step_h//2)))
+@functools.lru_cache(maxsize=None)
+def brush_stencil(r):
+    """
+    Circle of windows within radius r of the center window, as a (2r+1, 2r+1) boolean mask.
+        Each radius is only computed once, and the same mask is returned every time after.
+    """
+    circle_y, circle_x = np.ogrid[-r:r+1, -r:r+1]
+    stencil = circle_x**2 + circle_y**2 <= r**2
+    stencil.flags.writeable = False
+    return stencil
 
-                #Append to our item group
-                rects.addToGroup(rect)
+def bresenham_line(row1, col1, row2, col2):
+    """
+    Returns (rows, cols) of the cells on the line from (row1, col1) to (row2, col2), including both.
 
-    return rects
+    This is the line Bresenham's algorithm gives, one cell per step along the longer axis
+        and the nearest cell along the other, but computed for every step at once
+        with integer arithmetic rather than stepping through them.
+    """
+    n = max(abs(row2-row1), abs(col2-col1))
+    if n == 0:
+        return np.array([row1]), np.array([col1])
+
+    t = np.arange(n+1)
+    rows = row1 + (2*t*(row2-row1) + n)//(2*n)
+    cols = col1 + (2*t*(col2-col1) + n)//(2*n)
+    return rows, cols
 
+def brush_stroke(row1, col1, row2, col2, r):
+    """
+    Windows covered by dragging a brush_stencil(r) from window (row1, col1) to window (row2, col2),
+        as (mask, row, col), see approximate_polygon(). The mask may extend past the grid.
+
+    Rather than stamping the whole stencil at each cell of the line between them, we use that each
+        row of the stencil is one span of columns. We mark where each span starts and ends in every
+        row of the mask it covers, and a cumulative count of marks along each row is positive
+        wherever at least one span covers it, all at once with numpy.
+    """
+    rows, cols = bresenham_line(row1, col1, row2, col2)
+    row, col = min(row1, row2)-r, min(col1, col2)-r
+    h, w = abs(row2-row1)+2*r+1, abs(col2-col1)+2*r+1
+
+    #Half the width of each row of the stencil, whose spans are centered on each cell of the line
+    half_widths = brush_stencil(r).sum(axis=1)//2
+    span_rows = (rows-row)[:, None] + np.arange(-r, r+1)[None, :]
+    span_starts = (cols-col)[:, None] - half_widths[None, :]
+    span_ends = (cols-col)[:, None] + half_widths[None, :] + 1
+
+    #Marks are counted over the flattened rows, with an extra column so span ends at the edge have a place
+    size = h*(w+1)
+    marks = np.bincount((span_rows*(w+1) + span_starts).ravel(), minlength=size) - np.bincount((span_rows*(w+1) + span_ends).ravel(), minlength=size)
+    mask = np.cumsum(marks.reshape(h, w+1), axis=1)[:, :-1] > 0
+
+    return mask, row, col
+
+def mask_pixmap(mask, color):
+    """
+    Creates a pixmap showing the given mask of windows in color,
+        with one pixel per window, to be scaled up to the window size when displayed.
+    """
+    rgba = np.zeros(mask.shape + (4,), dtype=np.uint8)
+    rgba[mask] = (color.red(), color.green(), color.blue(), color.alpha())
+    return QPixmap.fromImage(array_to_qimage(rgba))
+
+def array_to_qimage(img):
+    """
+    Converts the given grayscale, RGB or RGBA image array into a QImage.
+
+    The QImage only references the array's memory, so we copy it
+        into a QImage which owns its own memory before returning it.
+    """
+    img = np.ascontiguousarray(img, dtype=np.uint8)
+    h, w = img.shape[:2]
+    if img.ndim == 2:
+        fmt, channels = QImage.Format_Grayscale8, 1
+    elif img.shape[2] == 4:
+        fmt, channels = QImage.Format_RGBA8888, 4
+    else:
+        fmt, channels = QImage.Format_RGB888, 3
+    return QImage(img.data, w, h, w*channels, fmt).copy()
+
+def display_levels(img_shape, size=DISPLAY_TILE_SIZE):
+    #Amount of levels of detail above full resolution for an image, until it fits in one display tile
+    return max(int(np.ceil(np.log2(max(img_shape[0], img_shape[1], 1)/size))), 0)
+
+def display_tile(img, level, row, col, size=DISPLAY_TILE_SIZE):
+    """
+    Returns the size x size display tile at (row, col) of img at the given level of detail,
+        where each level halves the resolution of the last, so that level 0 is img itself.
+
+    Levels are sampled from every 2**level-th pixel of img, so that only those pixels are read.
+        Since img is normally already the nearest pyramid level of an image (see Images.pyramid),
+        this is only needed past its most zoomed-out precomputed level.
+    """
+    factor = 2**level
+    y, x = row*size*factor, col*size*factor
+    return np.asarray(img[y:y+size*factor:factor, x:x+size*factor:factor])
+
+class ImageCache(QObject):
+    """
+    Loads display tiles of our Images in the background as display-ready QImages.
+
+    Tiles are keyed by (image, level, row, col), see display_tile(), and are loaded from the
+        nearest precomputed pyramid level of their image in a thread pool, with loaded
+        emitted with the key of each one once it's ready.
+        Loaded tiles are kept until they're the least recently used and we have more
+        than IMAGE_CACHE_MAX_BYTES loaded.
+
+    So that navigating between images doesn't have to wait on loading them, the
+        IMAGE_CACHE_PREFETCH images before and after the current one have their
+        most zoomed-out level loaded ahead of time.
+
+    QImages (unlike QPixmaps) can be made outside of the GUI thread, so nothing
+        but drawing them is left for the GUI thread.
+    """
+    loaded = pyqtSignal(tuple)
+
+    def __init__(self, images, prefetch=IMAGE_CACHE_PREFETCH, max_bytes=IMAGE_CACHE_MAX_BYTES):
+        super(ImageCache, self).__init__()
+        self.images = images
+        self.prefetch = prefetch
+        self.max_bytes = max_bytes
+
+        self.pool = ThreadPoolExecutor(max_workers=IMAGE_CACHE_WORKERS)
+        self.lock = threading.Lock()
+        self.cache = collections.OrderedDict()#key: QImage, from least to most recently used
+        self.loading = set()#keys of tiles being loaded in the pool
+        self.n_bytes = 0
+
+    def load(self, key):
+        #Ran in the pool. If loading fails, we print why, and it's loaded again the next time it's requested
+        try:
+            i, level, row, col = key
+            img, pyramid_level = self.images.pyramid(i, level)
+            qimg = array_to_qimage(display_tile(img, level-pyramid_level, row, col))
+            with self.lock:
+                self.cache[key] = qimg
+                self.n_bytes += qimg.byteCount()
+                self.evict()
+        except Exception:
+            traceback.print_exc()
+            return
+        finally:
+            with self.lock:
+                self.loading.discard(key)
+        self.loaded.emit(key)
+
+    def evict(self):
+        #Remove least recently used tiles until we're within our limit, always keeping the most recent
+        while self.n_bytes > self.max_bytes and len(self.cache) > 1:
+            key, qimg = self.cache.popitem(last=False)
+            self.n_bytes -= qimg.byteCount()
+
+    def request(self, key):
+        #Starts loading the tile in the pool if it's not already loaded or loading
+        with self.lock:
+            if key in self.cache or key in self.loading:
+                return
+            self.loading.add(key)
+        self.pool.submit(self.load, key)
+
+    def get(self, key, load=True):
+        #Returns the tile if it's loaded, otherwise returns None and starts loading it if load
+        with self.lock:
+            qimg = self.cache.get(key)
+            if qimg is not None:
+                self.cache.move_to_end(key)
+                return qimg
+        if load:
+            self.request(key)
+        return None
+
+    def prefetch_around(self, i):
+        #Nearest images first, since they're the most likely to be navigated to next
+        for j in [i] + [j for offset in range(1, self.prefetch+1) for j in (i+offset, i-offset)]:
+            if 0 <= j < len(self.images):
+                self.request((j, display_levels(self.images.shape(j)), 0, 0))
+
+class TiledImage(QGraphicsItem):
+    """
+    Displays an image of our Images as display tiles, see ImageCache, loading only
+        the tiles in view, at the level of detail closest to our current zoom.
+
+    While the tiles at that level are loading we draw whatever more zoomed-out
+        level of them is already loaded, so there's always something to see.
+    """
+    def __init__(self, cache):
+        super(TiledImage, self).__init__()
+        self.cache = cache
+        self.cache.loaded.connect(self.tile_loaded)
+        self.i, self.h, self.w, self.levels = None, 0, 0, 0
+
+        #So that paint() is given the part of us which needs repainting
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)
+
+    def set_image(self, i):
+        self.prepareGeometryChange()
+        self.i = i
+        self.h, self.w = self.cache.images.shape(i)[:2]
+        self.levels = display_levels((self.h, self.w))
+        self.cache.prefetch_around(i)
+        self.update()
+
+    def tile_rect(self, level, row, col):
+        #Area of our image a display tile covers
+        size = DISPLAY_TILE_SIZE*2**level
+        x, y = col*size, row*size
+        return QRectF(x, y, min(size, self.w-x), min(size, self.h-y))
+
+    def tile_loaded(self, key):
+        if key[0] == self.i:
+            self.update(self.tile_rect(*key[1:]))
+
+    def boundingRect(self):
+        return QRectF(0, 0, self.w, self.h)
+
+    def paint(self, painter, option, widget=None):
+        if self.i is None:
+            return
+
+        #The level with the closest resolution at or above our zoom, i.e. one pixel per screen pixel or better
+        zoom = option.levelOfDetailFromTransform(painter.worldTransform())
+        level = min(max(int(np.floor(np.log2(1/zoom))), 0), self.levels)
+
+        #Only the tiles in the part of us which needs repainting
+        rect = option.exposedRect
+        size = DISPLAY_TILE_SIZE*2**level
+        for row in range(max(int(rect.top()//size), 0), min(int(np.ceil(rect.bottom()/size)), -(-self.h//size))):
+            for col in range(max(int(rect.left()//size), 0), min(int(np.ceil(rect.right()/size)), -(-self.w//size))):
+                target = self.tile_rect(level, row, col)
+
+                #Load this tile, drawing the nearest loaded zoomed-out level containing it in the meantime
+                for fallback in range(level, self.levels+1):
+                    shift = fallback - level
+                    qimg = self.cache.get((self.i, fallback, row >> shift, col >> shift), load=fallback == level)
+                    if qimg is not None:
+                        break
+                if qimg is None:
+                    continue
+
+                origin = self.tile_rect(fallback, row >> shift, col >> shift)
+                scale = 2**fallback
+                source = QRectF((target.x()-origin.x())/scale, (target.y()-origin.y())/scale, target.width()/scale, target.height()/scale)
+                painter.drawImage(target, qimg, source)
+
+class LabelOverlay(QGraphicsItem):
+    """
+    Displays the classifications of an image as a single item over it,
+        rather than an item for each labeled window.
+
+    We keep the grid of label ids for the image, see Classifications, and an RGBA image
+        with one pixel per window, which is the grid looked up in our palette of LABEL_COLORS.
+        This is drawn scaled up to the window size, with "Nothing" (0) transparent.
+
+    Our QImage uses the memory of our RGBA array rather than a copy, so labeling
+        only has to update the RGBA pixels of the windows it changed,
+        and only that part of the item is repainted.
+    """
+    def __init__(self, step_h, step_w, transparency=LABEL_TRANSPARENCY):
+        super(LabelOverlay, self).__init__()
+        self.step_h, self.step_w = step_h, step_w
+
+        #So that paint() is given the part of us which needs repainting
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)
+        self.setZValue(1)
+
+        #RGBA color of each label id
+        self.palette = label_palette(round(255*(1-transparency/100)))
+
+        self.set_grid(np.zeros((0, 0), dtype=np.uint8))
+
+    def set_grid(self, grid):
+        #Display the given grid, i.e. when changing images
+        self.prepareGeometryChange()
+        self.grid = grid
+        self.rgba = self.palette[grid]
+        h, w = grid.shape
+        self.qimage = QImage(self.rgba.data, w, h, w*4, QImage.Format_RGBA8888) if grid.size > 0 else QImage()
+        self.update()
+
+    def set_transparency(self, transparency):
+        #transparency is a percentage, as given by our transparency slider
+        self.palette[1:, 3] = round(255*(1-transparency/100))
+        self.rgba[:] = self.palette[self.grid]
+        self.update()
+
+    def label(self, row, col, mask, label_id):
+        #Sets the windows where mask is True to label_id, with the top-left of mask at (row, col) in our grid
+        h, w = mask.shape
+        if h == 0 or w == 0:
+            return
+
+        region = self.grid[row:row+h, col:col+w]
+        region[mask] = label_id
+        self.rgba[row:row+h, col:col+w] = self.palette[region]
+        self.update(QRectF(col*self.step_w, row*self.step_h, w*self.step_w, h*self.step_h))
+
+    def boundingRect(self):
+        return QRectF(0, 0, self.grid.shape[1]*self.step_w, self.grid.shape[0]*self.step_h)
+
+    def paint(self, painter, option, widget=None):
+        #Only draw the windows in the part of us which needs repainting
+        rect = option.exposedRect
+        row1, col1 = max(int(rect.top()//self.step_h), 0), max(int(rect.left()//self.step_w), 0)
+        row2 = min(int(np.ceil(rect.bottom()/self.step_h)), self.grid.shape[0])
+        col2 = min(int(np.ceil(rect.right()/self.step_w)), self.grid.shape[1])
+        if row2 <= row1 or col2 <= col1:
+            return
+
+        target = QRectF(col1*self.step_w, row1*self.step_h, (col2-col1)*self.step_w, (row2-row1)*self.step_h)
+        painter.drawImage(target, self.qimage, QRectF(col1, row1, col2-col1, row2-row1))
 
 def relative_coordinates(view, x, y):
     """
-    Gets the x and y coordinates, relative 
-        to the given graphicsview scroll position(s).
+    Gets the x and y coordinates in the image of the given x and y coordinates
+        in the given graphicsview, accounting for its scroll position(s) and zoom.
     """
-    scroll_x = view.horizontalScrollBar().value()
-    scroll_y = view.verticalScrollBar().value()
+    point = view.mapToScene(int(x), int(y))
+    return (int(np.floor(point.x())), int(np.floor(point.y())))
+
+def zoom_from_slider(value):
+    #Our zoom slider goes from 0 to 100, which we scale exponentially between ZOOM_MIN and ZOOM_MAX
+    return ZOOM_MIN*(ZOOM_MAX/ZOOM_MIN)**(value/100)
 
-    return (scroll_x + x, scroll_y + y)
+def slider_from_zoom(zoom):
+    return int(round(100*np.log(zoom/ZOOM_MIN)/np.log(ZOOM_MAX/ZOOM_MIN)))
 
 
 class ToolButton():
@@ -118,7 +473,7 @@ class ToolButton():
         tool to this tool id on pushing this button.
     """
     def __init__(self, parent, icon_fname, tool_id, x, y, w=TOOLBAR_MIN_ITEM_WIDTH, h=TOOLBAR_MAX_ITEM_HEIGHT):
-        self.w, self.h = w, h
+        self.w, self.h = int(w), int(h)#Qt only takes whole pixels
         self.tool_id = tool_id
 
         #These callback methods are forced to be staticmethods with no args in PyQt,
@@ -141,7 +496,7 @@ class ToolButton():
 
         self.button = QPushButton('', parent)
         self.button.resize(self.w, self.h)
-        self.button.move(x, y)
+        self.button.move(int(x), int(y))
         self.button.setIcon(QIcon(icon_fname))
         self.button.setIconSize(QSize(self.w, self.h))
         self.button.clicked.connect(on_click)
@@ -166,16 +521,17 @@ class ToolSlider():
         to be changed via movements of the slider.
     """
     def __init__(self, parent, slider_name, x, y, w=TOOLBAR_MAX_ITEM_WIDTH, h=TOOLBAR_MAX_ITEM_HEIGHT):
-        self.w, self.h = w, h
+        self.w, self.h = int(w), int(h)
 
         label = QLabel(slider_name, parent)
         label.setAlignment(Qt.AlignCenter)
-        label.resize(self.w, TOOLBAR_MIN_ITEM_HEIGHT)
-        label.move(x, y)
+        label.resize(self.w, int(TOOLBAR_MIN_ITEM_HEIGHT))
+        label.move(int(x), int(y))
 
-        slider = QSlider(Qt.Horizontal, parent)
-        slider.resize(self.w, self.h)
-        slider.move(x, y)
+        self.slider = QSlider(Qt.Horizontal, parent)
+        self.slider.setRange(0, 100)
+        self.slider.resize(self.w, self.h)
+        self.slider.move(int(x), int(y))
 
 class LabelButton():
     """
@@ -184,7 +540,7 @@ class LabelButton():
         label to this label on pushing this button.
     """
     def __init__(self, parent, label_id, label_name, x, y, w=TOOLBAR_MAX_ITEM_WIDTH, h=TOOLBAR_MAX_ITEM_HEIGHT):
-        self.w, self.h = w, h
+        self.w, self.h = int(w), int(h)
 
         #These callback methods are forced to be staticmethods with no args in PyQt,
         #   so we define it inside the __init__ method
@@ -206,7 +562,7 @@ class LabelButton():
 
         self.button = QPushButton(label_name, parent)
         self.button.resize(self.w, self.h)
-        self.button.move(x, y)
+        self.button.move(int(x), int(y))
         self.button.clicked.connect(on_click)
         self.button.setCheckable(True)
 
@@ -228,55 +584,69 @@ class ImageNavigator():
         navigate to the previous and next image, respectively.
     """
     def __init__(self, parent, x, y, w=TOOLBAR_MAX_ITEM_WIDTH, h=TOOLBAR_MAX_ITEM_HEIGHT):
-        self.w, self.h = w, h
+        self.w, self.h = int(w), int(h)
+        self.canvas = parent.canvas
 
-        self.button_w = self.w*IMAGE_NAVIGATOR_BUTTON_WIDTH_PERC
-        self.label_w = self.w*IMAGE_NAVIGATOR_LABEL_WIDTH_PERC
+        self.button_w = int(self.w*IMAGE_NAVIGATOR_BUTTON_WIDTH_PERC)
+        self.label_w = int(self.w*IMAGE_NAVIGATOR_LABEL_WIDTH_PERC)
 
         #Left / Previous Image Button
         button = QPushButton('Prev', parent)
-        button.resize(self.w*IMAGE_NAVIGATOR_BUTTON_WIDTH_PERC, self.h)
-        button.move(x, y)
+        button.resize(self.button_w, self.h)
+        button.move(int(x), int(y))
+        button.clicked.connect(lambda: self.navigate(-1))
 
         x += self.button_w
 
         #Label
-        label = QLabel("Image 4/9", parent)
-        label.setAlignment(Qt.AlignCenter)
-        label.resize(self.w*IMAGE_NAVIGATOR_LABEL_WIDTH_PERC, self.h)
-        label.move(x, y)
+        self.label = QLabel("", parent)
+        self.label.setAlignment(Qt.AlignCenter)
+        self.label.resize(self.label_w, self.h)
+        self.label.move(int(x), int(y))
+        self.update_label()
 
         x += self.label_w
 
         #Right / Next Image Button
         button = QPushButton('Next', parent)
-        button.resize(self.w*IMAGE_NAVIGATOR_BUTTON_WIDTH_PERC, self.h)
-        button.move(x, y)
+        button.resize(self.button_w, self.h)
+        button.move(int(x), int(y))
+        button.clicked.connect(lambda: self.navigate(1))
 
         x += self.button_w
 
+    def navigate(self, offset):
+        #Move the canvas to the image offset from the current one, if there is one
+        i = self.canvas.img_i + offset
+        if 0 <= i < len(self.canvas.dataset.images):
+            self.canvas.load_image(i)
+            self.update_label()
+
+    def update_label(self):
+        self.label.setText("Image {}/{}".format(self.canvas.img_i+1, len(self.canvas.dataset.images)))
+
 class StatsPanel():
     """
     Create a text panel to display several statistics about the ongoing session.
     """
     def __init__(self, parent, x, y, win_h, win_w, w=TOOLBAR_MAX_ITEM_WIDTH, h=TOOLBAR_MAX_ITEM_HEIGHT):
-        self.w, self.h = w, h
+        self.w, self.h = int(w), int(h)
 
         #Label
         label = QLabel("Classification Size: {}x{} pixels\nUsername: N/A".format(win_h,win_w), parent)
         label.setAlignment(Qt.AlignCenter)
         label.resize(self.w, self.h)
-        label.move(x, y)
+        label.move(int(x), int(y))
 
 class QuitButton():
     """
     Creates a quit button, to end the session.
     """
     def __init__(self, parent, x, y, w=TOOLBAR_MAX_ITEM_WIDTH, h=TOOLBAR_MAX_ITEM_HEIGHT):
-        self.w, self.h = w, h
+        self.w, self.h = int(w), int(h)
         button = QPushButton("Quit Session", parent)
         button.resize(self.w, self.h)
-        button.move(x, y)
+        button.move(int(x), int(y))
 
 
 
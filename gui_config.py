@@ -0,0 +1,45 @@
+from PyQt5.QtGui import QColor
+from PyQt5.QtWidgets import QApplication, QDesktopWidget
+from config import *
+
+"""
+Config variables which depend on the screen size, or need Qt.
+
+These are only calculated once the GUI is started and imports this, rather than in config,
+    so that everything which doesn't use the GUI can be imported without Qt or a display.
+    Qt needs a QApplication before we can query the screen, which the GUI then reuses.
+"""
+app = QApplication.instance() or QApplication([])
+SCREEN = QDesktopWidget().screenGeometry()
+SCREEN_HEIGHT, SCREEN_WIDTH = SCREEN.height(), SCREEN.width()
+
+#TOOLBAR_SCREEN_HEIGHT_PERCENTAGE = .925
+TOOLBAR_SCREEN_HEIGHT_PERCENTAGE = .70
+TOOLBAR_SCREEN_WIDTH_PERCENTAGE = .13
+TOOLBAR_SCREEN_Y_HEIGHT_PERCENTAGE = 0.0375
+
+#Compute size of our toolbar relative to screen dimensions
+TOOLBAR_HEIGHT = TOOLBAR_SCREEN_HEIGHT_PERCENTAGE*SCREEN_HEIGHT
+TOOLBAR_WIDTH = TOOLBAR_SCREEN_WIDTH_PERCENTAGE*SCREEN_WIDTH
+TOOLBAR_Y = TOOLBAR_SCREEN_Y_HEIGHT_PERCENTAGE*SCREEN_HEIGHT
+TOOLBAR_X = TOOLBAR_Y#Same padding as y
+
+#CANVAS_SCREEN_HEIGHT_PERCENTAGE = .925
+CANVAS_SCREEN_HEIGHT_PERCENTAGE = .70
+CANVAS_SCREEN_WIDTH_PERCENTAGE = .80
+CANVAS_SCREEN_Y_HEIGHT_PERCENTAGE = 0.0375 
+
+#Compute size of our canvas relative to screen dimensions
+CANVAS_HEIGHT = CANVAS_SCREEN_HEIGHT_PERCENTAGE*SCREEN_HEIGHT
+CANVAS_WIDTH = CANVAS_SCREEN_WIDTH_PERCENTAGE*SCREEN_WIDTH
+CANVAS_Y = CANVAS_SCREEN_Y_HEIGHT_PERCENTAGE*SCREEN_HEIGHT
+CANVAS_X = TOOLBAR_X + TOOLBAR_WIDTH + CANVAS_Y 
+
+#Compute size of toolbar elements relative to the toolbar dimensions
+TOOLBAR_PADDING = TOOLBAR_WIDTH/25
+TOOLBAR_MIN_ITEM_HEIGHT = TOOLBAR_WIDTH/15#I'd make this /25 if it didn't clip the text
+TOOLBAR_MAX_ITEM_HEIGHT = TOOLBAR_WIDTH/5 
+TOOLBAR_MIN_ITEM_WIDTH = TOOLBAR_WIDTH/5 
+TOOLBAR_MAX_ITEM_WIDTH = TOOLBAR_WIDTH - 2*TOOLBAR_PADDING
+
+SELECTION_RECT_FILL_COLOR = QColor(255, 0, 0, 255)#TO BE UPDATED
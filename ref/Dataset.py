@@ -90,13 +90,8 @@ class Dataset(object):
                 for i, (prediction_grid, detections) in enumerate(zip(self.prediction_grids.after_editing, self.type_one_detections.after_editing)):
                     sys.stdout.write("\rGenerating Stats on Image {}/{}...".format(i, len(self.imgs)-1))
 
-                    #Get counts of each classification type, excluding empty slide
-                    prediction_counts = np.zeros((6))
-                    classification_i=0
-                    for classification in range(7):
-                        if classification!=3:
-                            prediction_counts[classification_i]=np.sum(prediction_grid==classification)
-                            classification_i+=1
+                    #Get counts of each classification type in one pass, excluding empty slide
+                    prediction_counts = np.bincount(np.ravel(prediction_grid), minlength=7)[[0, 1, 2, 4, 5, 6]]
 
                     #Get total number of classifications for this image
                     prediction_n = np.sum(prediction_counts)
@@ -105,7 +100,7 @@ class Dataset(object):
                     prediction_avgs = prediction_counts/prediction_n
 
                     #Get the number of Type One Lesions / Type One Detection Clusters in this image
-                    detection_count = len(get_rect_clusters(detections))
+                    detection_count = len(rect_clusters(detections)[1])
 
                     #Write 
                     f.write("{},{},,{},,{}\n".format(self.imgs.fnames[i], ",".join(map(str,list(prediction_counts))), ",".join(map(str,list(prediction_avgs))), detection_count))
@@ -117,30 +112,22 @@ class Dataset(object):
             resize_factor = 1/8
             color_key = [(255, 0, 255), (0, 0, 255), (0, 255, 0), (200, 200, 200), (0, 255, 255), (255, 0, 0), (244,66,143)]
             alpha = 0.33
-            for i, (img, prediction_grid) in enumerate(zip(self.imgs, self.prediction_grids.after_editing)):
+            for i, prediction_grid in enumerate(self.prediction_grids.after_editing):
                 sys.stdout.write("\rGenerating Displayable Results for Image {}/{}...".format(i, len(self.imgs)-1))
 
                 #Since our image and predictions would be slightly misalgned from each other due to rounding,
                 #We recompute the sub_h and sub_w and img resize factors to make them aligned.
                 sub_h = int(resize_factor*self.prediction_grids.sub_h)
                 sub_w = int(resize_factor*self.prediction_grids.sub_w)
-                fy = (prediction_grid.shape[0]*sub_h)/img.shape[0]
-                fx = (prediction_grid.shape[1]*sub_w)/img.shape[1]
+                img_shape = self.imgs.shape(i)
+                fy = (prediction_grid.shape[0]*sub_h)/img_shape[0]
+                fx = (prediction_grid.shape[1]*sub_w)/img_shape[1]
 
-                #Then resize the image with these new factors
-                img = cv2.resize(img, (0,0), fx=fx, fy=fy)
+                #Then get the image resized with these new factors, from its nearest pyramid level
+                img = self.imgs.level(i, (fy, fx))
                
-                #Make overlay to store prediction rectangles on before overlaying on top of image
-                prediction_overlay = np.zeros_like(img)
-
-                for row_i, row in enumerate(prediction_grid):
-                    for col_i, col in enumerate(row):
-                        color = color_key[col]
-                        #draw rectangles of the resized sub_hxsub_w size on it
-                        cv2.rectangle(prediction_overlay, (col_i*sub_w, row_i*sub_h), (col_i*sub_w+sub_w, row_i*sub_h+sub_h), color, -1)
-
-                #Add overlay to image to get resulting image
-                display_img = weighted_overlay(img, prediction_overlay, alpha)
+                #Overlay the color of each prediction onto the image to get resulting image
+                display_img = grid_overlay(img, prediction_grid, color_key, sub_h, sub_w, alpha)
 
                 #Write img
                 cv2.imwrite("../../Output Stats/{}_overlay_{}.png".format(self.uid, self.imgs.fnames[i]), display_img)
@@ -15,6 +15,10 @@ class Images(object):
     def __init__(self, restart=False):
         self.img_dir = "../../Input Images/"#where image files are stored
         self.archive_dir = "../data/images/"#where we will create and store the .npy archive files
+        self.level_dir = "../data/image_levels/"#where we store the downsampled pyramid levels of each archive
+        self.level_min_size = 512#we halve each image into levels until both dimensions are at most this
+        if not os.path.exists(self.level_dir):
+            os.makedirs(self.level_dir)
         self.archives = []#where we will store list of full filepaths for each archive in our archive_dir
 
         if restart:
@@ -24,6 +28,7 @@ class Images(object):
             """
             #Delete all files in the archive directory if restarting
             clear_dir(self.archive_dir)
+            clear_dir(self.level_dir)
 
             for i, fname in enumerate(fnames(self.img_dir)):
                 #Progress indicator
@@ -32,9 +37,17 @@ class Images(object):
                 #Read src, Check max shape, Create archive at dst, add dst to archive list
                 src_fpath = os.path.join(self.img_dir, fname)
                 dst_fpath = os.path.join(self.archive_dir, "{}.npy".format(i))
-                np.save(dst_fpath, cv2.imread(src_fpath))
+                img = cv2.imread(src_fpath)
+                np.save(dst_fpath, img)
                 self.archives.append(dst_fpath)
 
+                #Save the pyramid of this image once now, so we never have to resize the full image later
+                level = 0
+                while max(img.shape[:2]) > self.level_min_size:
+                    img = cv2.resize(img, (img.shape[1]//2, img.shape[0]//2), interpolation=cv2.INTER_AREA)
+                    level += 1
+                    np.save(self.level_fpath(i, level), img)
+
             sys.stdout.flush()
             print("")
         else:
@@ -63,6 +76,31 @@ class Images(object):
     def __len__(self):
         return len(self.archives)
 
+    def level_fpath(self, i, level):
+        return os.path.join(self.level_dir, "{}_{}.npy".format(i, level))
+
+    def shape(self, i):
+        #load with mmap mode so we can just get the shape
+        return np.load(self.archives[i], mmap_mode='r').shape
+
+    def level(self, i, scale):
+        """
+        Returns image i resized by scale, either one factor for both axes or (fy, fx), with area interpolation.
+
+        Each pyramid level is the image halved again, so we start from the smallest level
+            which is still at least as large as the result, and only resize that the rest of the way.
+        """
+        fy, fx = scale if isinstance(scale, tuple) else (scale, scale)
+        h, w = self.shape(i)[:2]
+        dst_shape = (max(int(round(w*fx)), 1), max(int(round(h*fy)), 1))
+
+        level = max(int(np.floor(np.log2(1/max(fy, fx)))), 0)
+        while level > 0 and not os.path.exists(self.level_fpath(i, level)):
+            level -= 1
+        img = np.load(self.level_fpath(i, level)) if level > 0 else np.load(self.archives[i], mmap_mode='r')
+
+        return cv2.resize(np.asarray(img), dst_shape, interpolation=cv2.INTER_AREA)
+
     def max_shape(self):
         max_shape = [0,0,0]#maximum dimensions of all images
 
@@ -287,23 +287,9 @@ class PredictionGridEditor(object):
 
         #Save updated predictions
         self.dataset.prediction_grids.after_editing[self.dataset.progress["prediction_grids_image"]] = self.prediction_grid
-        #Load the resized image section (without any overlay) referenced by our current classification_selection rectangle (no need to cast to int b/c int*int = int)
-        self.img_section = self.resized_img[self.prediction_rect_y1*self.sub_h:self.prediction_rect_y2*self.sub_h, self.prediction_rect_x1*self.sub_w:self.prediction_rect_x2*self.sub_w]
-
-        #Create new overlay on this resized image section with the prediction grid section
-        self.prediction_overlay_section = np.zeros_like(self.img_section)
-        for row_i, row in enumerate(self.prediction_grid_section):
-            for col_i, col in enumerate(row):
-                color = self.color_key[col]
-                #draw rectangles of the resized sub_hxsub_w size on it
-                cv2.rectangle(self.prediction_overlay_section, (col_i*self.sub_w, row_i*self.sub_h), (col_i*self.sub_w+self.sub_w, row_i*self.sub_h+self.sub_h), color, -1)
-
-        #Combine the overlay section and the image section
-        self.img_section = weighted_overlay(self.img_section, self.prediction_overlay_section, self.editor_transparency_factor)
-        self.img_section = cv2.cvtColor(self.img_section, cv2.COLOR_BGR2RGB)#We need to convert so it will display the proper colors
-
-        #Insert the now-updated image section back into the full image
-        self.img[self.prediction_rect_y1*self.sub_h:self.prediction_rect_y2*self.sub_h, self.prediction_rect_x1*self.sub_w:self.prediction_rect_x2*self.sub_w] = self.img_section
+        #Overlay the updated section of the prediction grid onto the resized image (without any overlay), straight into the displayed image
+        grid_overlay(self.resized_img, self.prediction_grid, self.display_color_key, self.sub_h, self.sub_w, self.editor_transparency_factor,
+                region=(self.prediction_rect_y1, self.prediction_rect_x1, self.prediction_rect_y2, self.prediction_rect_x2), out=self.img)
 
         #And finally update the canvas
         self.main_canvas.image = ImageTk.PhotoImage(Image.fromarray(self.img))#Literally because tkinter can't handle references properly and needs this.
@@ -344,28 +330,20 @@ class PredictionGridEditor(object):
         self.sub_h = int(self.dataset.prediction_grids.sub_h * self.editor_resize_factor)
         self.sub_w = int(self.dataset.prediction_grids.sub_w * self.editor_resize_factor)
 
-        self.img = self.dataset.imgs[self.dataset.progress["prediction_grids_image"]]#Load img
+        img_shape = self.dataset.imgs.shape(self.dataset.progress["prediction_grids_image"])#Only need the shape of the full img
         self.prediction_grid = self.dataset.prediction_grids.after_editing[self.dataset.progress["prediction_grids_image"]]#Load prediction grid
 
         #Since our image and predictions would be slightly misalgned from each other due to rounding,
         #We compute the fx and fy img resize factors according to sub_h and sub_w to make them aligned.
-        self.fy = (self.prediction_grid.shape[0]*self.sub_h)/self.img.shape[0]
-        self.fx = (self.prediction_grid.shape[1]*self.sub_w)/self.img.shape[1]
+        self.fy = (self.prediction_grid.shape[0]*self.sub_h)/img_shape[0]
+        self.fx = (self.prediction_grid.shape[1]*self.sub_w)/img_shape[1]
         
-        self.img = cv2.resize(self.img, (0,0), fx=self.fx, fy=self.fy)#Resize img
-        self.resized_img = self.img#Save this so we don't have to resize later
-
-        #Make overlay to store prediction rectangles on before overlaying on top of image
-        self.prediction_overlay = np.zeros_like(self.img)
-
-        for row_i, row in enumerate(self.prediction_grid):
-            for col_i, col in enumerate(row):
-                color = self.color_key[col]
-                #draw rectangles of the resized sub_hxsub_w size on it
-                cv2.rectangle(self.prediction_overlay, (col_i*self.sub_w, row_i*self.sub_h), (col_i*self.sub_w+self.sub_w, row_i*self.sub_h+self.sub_h), color, -1)
+        self.img = self.dataset.imgs.level(self.dataset.progress["prediction_grids_image"], (self.fy, self.fx))#Load resized img from its nearest pyramid level
+        self.resized_img = cv2.cvtColor(self.img, cv2.COLOR_BGR2RGB)#Save this so we don't have to resize later, converted so it will display the proper colors
 
-        self.img = weighted_overlay(self.img, self.prediction_overlay, self.editor_transparency_factor)#Overlay prediction grid onto image
-        self.img = cv2.cvtColor(self.img, cv2.COLOR_BGR2RGB)#We need to convert so it will display the proper colors
+        #Overlay prediction grid onto a copy of the image, with our colors also in RGB order
+        self.display_color_key = [color[::-1] for color in self.color_key]
+        self.img = grid_overlay(self.resized_img, self.prediction_grid, self.display_color_key, self.sub_h, self.sub_w, self.editor_transparency_factor, out=self.resized_img.copy())
 
 
 
@@ -1,14 +1,33 @@
-import os, json
+import os, json, fcntl, atexit, threading
 
 from base import *
 
 class UserProgress(object):
-    #For use with our json for keeping track of user progress
-    def __init__(self, uid):
+    """
+    For keeping track of user progress, with the progress of every user stored in one json file,
+        as a dict of {uid: progress}.
+
+    Our progress is kept in memory, so reading it never touches the file. Changes are only
+        written once we've gone flush_delay seconds without another change, so a burst of changes
+        (e.g. navigating through images) is written once, and are always written on exit.
+
+    When we write, we re-read the file and only replace our own user's progress in it, so
+        other users' progress isn't lost, and we write to a temporary file and move it into place,
+        so a crash never leaves the file half-written. Other users' sessions may be writing it
+        at the same time, so we hold an exclusive lock on lock_fpath while we do.
+    """
+    def __init__(self, uid, flush_delay=1.0):
         self.uid = uid
+        self.flush_delay = flush_delay
 
-        #Create json for this uid
-        self.archive_dir = "../data/user_progress/" #where we will create and store the .json file for each user's progress
+        #Where we store the .json file of every user's progress
+        self.archive_fpath = "../data/user_progress.json"
+
+        #Locked by whichever session is writing our .json file, which can't be locked itself since we replace it
+        self.lock_fpath = self.archive_fpath + ".lock"
+
+        #Where each user's progress used to be stored as its own .json file
+        self.legacy_archive_dir = "../data/user_progress/"
 
         #Default starting json/dict
         self.initial_progress = {
@@ -22,44 +41,74 @@ class UserProgress(object):
           "prediction_grids_resize_factor": 0.1,#Default value
         }
 
-        #Get archive fpath
-        self.archive_fpath = os.path.join(self.archive_dir, "{}.json".format(uid))
+        #Load our progress, from the old per-user file if we don't have any in the combined one yet
+        progress = self.load().get(uid)
+        legacy_fpath = os.path.join(self.legacy_archive_dir, "{}.json".format(uid))
+        if progress is None and file_exists(legacy_fpath):
+            with open(legacy_fpath, 'r') as f:
+                progress = json.load(f)
+        self.progress = dict(self.initial_progress, **(progress or {}))
 
-    def ensure_progress_json(self):
-        #Create our json with our initial_progress attribute if it doesnt already exist
-        if not file_exists(self.archive_fpath):
-            with open(self.archive_fpath, 'w') as f:
-                json.dump(self.initial_progress, f)
+        self.lock = threading.Lock()
+        self.timer = None
+        self.dirty = progress is None
 
-    def __getitem__(self, key):
-        #Ensure our json exists, then load this as our progress and use this.
-        self.ensure_progress_json()
+        #Make sure any changes still waiting on the timer are written when we exit
+        atexit.register(self.flush)
 
+    def load(self):
+        #Progress of every user in our file, if it exists
+        if not file_exists(self.archive_fpath):
+            return {}
         with open(self.archive_fpath, 'r') as f:
-            return json.load(f)[key]
-
-    def __setitem__(self, key, data):
-        #Ensure our json exists, then load this as our progress and use this.
-        self.ensure_progress_json()
+            return json.load(f)
+
+    def schedule_flush(self):
+        #(Re)start the timer to flush our changes, so they're only written once changes stop
+        with self.lock:
+            self.dirty = True
+            if self.timer is not None:
+                self.timer.cancel()
+            self.timer = threading.Timer(self.flush_delay, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def flush(self):
+        #Writes our progress to the file if it's changed since we last did
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            if not self.dirty:
+                return
+
+            with open(self.lock_fpath, 'a') as lock_f:
+                fcntl.flock(lock_f, fcntl.LOCK_EX)
+                users = self.load()
+                users[self.uid] = self.progress
+
+                tmp_fpath = self.archive_fpath + ".tmp"
+                with open(tmp_fpath, 'w') as f:
+                    json.dump(users, f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_fpath, self.archive_fpath)
+            self.dirty = False
 
-        with open(self.archive_fpath, 'r') as f:
-            progress = json.load(f)
+    def __getitem__(self, key):
+        return self.progress[key]
 
-        with open(self.archive_fpath, 'w') as f:
-            progress[key] = data
-            json.dump(progress, f)
+    def __setitem__(self, key, data):
+        with self.lock:
+            self.progress[key] = data
+        self.schedule_flush()
 
     def editing_started(self):
-        #Ensure our json exists, then load this as our progress and use this.
-        self.ensure_progress_json()
-
-        #If the current json is not the default starting json.
-        with open(self.archive_fpath, 'r') as f:
-            return json.load(f) != self.initial_progress
+        #If the current progress is not the default starting progress.
+        return self.progress != self.initial_progress
 
     def restart(self):
-        #Set our json back to the default starting json.
-        with open(self.archive_fpath, 'w') as f:
-            json.dump(self.initial_progress, f)
-
-
+        #Set our progress back to the default starting progress.
+        with self.lock:
+            self.progress = dict(self.initial_progress)
+        self.schedule_flush()
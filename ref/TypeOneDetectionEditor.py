@@ -212,9 +212,7 @@ class TypeOneDetectionEditor(object):
 
     def reload_img_and_detections(self):
         #Updates the self.img and self.detections attributes. 
-        self.img = cv2.resize(self.dataset.imgs[self.dataset.progress["type_ones_image"]], (0,0), 
-                fx=self.editor_resize_factor,
-                fy=self.editor_resize_factor)
+        self.img = self.dataset.imgs.level(self.dataset.progress["type_ones_image"], self.editor_resize_factor)
         self.img = cv2.cvtColor(self.img, cv2.COLOR_BGR2RGB)#We need to convert so it will display the proper colors
         self.detections = list(self.dataset.type_one_detections.after_editing[self.dataset.progress["type_ones_image"]]*self.editor_resize_factor)#Make list so we can append
 
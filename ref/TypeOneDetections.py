@@ -1,6 +1,7 @@
 import sys, time
 import cv2, h5py
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from keras.models import load_model
 
 from base import *
@@ -26,50 +27,46 @@ class TypeOneDetections(object):
         self.detection_suppression = True
         self.detection_step_size = 64
         self.detection_window_shape = (128, 128)#On the RESIZED image
+        self.detection_batch_size = 256#Amount of windows given to the classifier at once
         self.detection_cluster_threshold = 30#For suppression
         self.detection_classifier = load_model("../classifiers/type_one_detection_classifier.h5")#For detection
 
     def generate(self):
         #Generates detections and suppresses them for each image, saving each detection array to self.before_editing.
-        sys.setrecursionlimit(8000)#Set limit larger due to recursive nature of this program
 
-        #Generate for each image
-        for i, img in enumerate(self.imgs):
-            
-            #Progress indicator
-            sys.stdout.write("\rGenerating Type One Detections on Image {}/{}...".format(i, len(self.imgs)-1))
+        #Load and resize each image in the background while we run detection on the last one
+        with ThreadPoolExecutor(max_workers=1) as loader:
+            next_img = loader.submit(self.imgs.level, 0, self.detection_resize_factor) if self.detection and len(self.imgs) > 0 else None
 
-            #final detections for img, will be archived after detection and suppression
-            detections = []
+            #Generate for each image
+            for i in range(len(self.imgs)):
+                
+                #Progress indicator
+                sys.stdout.write("\rGenerating Type One Detections on Image {}/{}...".format(i, len(self.imgs)-1))
 
-            if self.detection:
-                #resize img down for detection
-                img = cv2.resize(img, (0,0), fx=self.detection_resize_factor, fy=self.detection_resize_factor)
+                #final detections for img, will be archived after detection and suppression
+                detections = []
 
+                if self.detection:
+                    #get img resized down for detection, from its nearest pyramid level, and start on the next one
+                    img = next_img.result()
+                    if i+1 < len(self.imgs):
+                        next_img = loader.submit(self.imgs.level, i+1, self.detection_resize_factor)
 
-                #scan model input window across our now resized image
-                for (row_i, col_i, window) in windows(img, self.detection_step_size, self.detection_window_shape):
-                    #If classifier predicts positive (we use nparray to add one dimension to make 4d instead of 3d)
-                    if np.argmax(self.detection_classifier.predict(np.array([window]))):
-                        #Add window as detection in format [x1, y1, x2, y2]
-                        detections.append([col_i, row_i, col_i+self.detection_window_shape[1], row_i+self.detection_window_shape[0]])
+                    detections = self.detect(img)
 
-                if self.detection_suppression:
-                    #suppress detections for this image based on rectangle cluster size
-                    detections = get_rect_clusters(detections)
+                    if self.detection_suppression:
+                        #suppress detections for this image based on rectangle cluster size,
+                        #   removing those in clusters < detection_cluster_threshold
+                        labels, sizes = rect_clusters(detections)
+                        detections = detections[sizes[labels] >= self.detection_cluster_threshold]
 
-                    #Remove clusters < detection_cluster_threshold 
-                    detections = [cluster for cluster in detections if not len(cluster) < self.detection_cluster_threshold]
+                    #Resize detections to match original image, and cast to int.
+                    detections = (detections/self.detection_resize_factor).astype(int)
 
-                    #Reshape list of clusters of rects into list of rects nx4 
-                    detections = [rect[:] for cluster in detections for rect in cluster]
-
-                #Convert to np array and resize detections to match original image, and cast to int.
-                detections = (np.array(detections)/self.detection_resize_factor).astype(int)
-
-            #Save these detections to both the before and after editing datasets, since we initialize them to be the same.
-            self.before_editing[i] = detections
-            self.after_editing[i] = detections
+                #Save these detections to both the before and after editing datasets, since we initialize them to be the same.
+                self.before_editing[i] = detections
+                self.after_editing[i] = detections
 
         #Now that we've finished generating, we've started editing, so we update user progress.
         self.dataset.progress["type_ones_started_editing"] = True
@@ -77,6 +74,18 @@ class TypeOneDetections(object):
         sys.stdout.flush()
         print("")
 
+    def detect(self, img):
+        """
+        Runs our detection classifier across img in windows of detection_window_shape every detection_step_size,
+            giving it detection_batch_size windows at a time rather than one, and returns the [x1, y1, x2, y2]
+            coordinates of each window it classified as positive as an nx4 array.
+        """
+        detections = [np.zeros((0, 4), dtype=int)]
+        for rects, batch in window_batches(img, self.detection_step_size, self.detection_window_shape, self.detection_batch_size):
+            predictions = self.detection_classifier.predict(batch, batch_size=len(batch))
+            detections.append(rects[np.argmax(predictions, axis=1) != 0])
+        return np.concatenate(detections)
+
     def edit(self):
         #Displays detections on all images and allows the user to edit them until they are finished. The editor handles the saving of edits.
         editor = TypeOneDetectionEditor(self.dataset)
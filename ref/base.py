@@ -2,7 +2,8 @@
 import os, shutil
 import cv2
 import numpy as np
-from tco import *
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
 
 def fnames(dir):
     """
@@ -21,41 +22,59 @@ def fnames(dir):
 def file_exists(fname):
     return os.path.exists(fname)
 
-def rects_connected(rect1, rect2):
-    #Complicated conditional statements to check if coordinates of two 2d rects are bordering or overlapping (i.e. connected)
-    rect1_x1, rect1_y1, rect1_x2, rect1_y2 = rect1
-    rect2_x1, rect2_y1, rect2_x2, rect2_y2 = rect2
-    
-    return  ((rect1_x1 >= rect2_x1 and rect1_x1 <= rect2_x2) and (rect1_y1 >= rect2_y1 and rect1_y1 <= rect2_y2)) or \
-            ((rect1_x2 >= rect2_x1 and rect1_x2 <= rect2_x2) and (rect1_y1 >= rect2_y1 and rect1_y1 <= rect2_y2)) or \
-            ((rect1_x1 >= rect2_x1 and rect1_x1 <= rect2_x2) and (rect1_y2 >= rect2_y1 and rect1_y2 <= rect2_y2)) or \
-            ((rect1_x2 >= rect2_x1 and rect1_x2 <= rect2_x2) and (rect1_y2 >= rect2_y1 and rect1_y2 <= rect2_y2))
-
-def get_rect_clusters(rects):
-    #Get all rect clusters as a list of clusters, where each cluster is a list of rects in the cluster.
-    connected = set()#For reference and avoiding infinite recursion
-    clusters = []
-    for rect in rects:
-        if str(rect) not in connected:#if rect not part of a cluster yet
-            clusters.append(get_rect_cluster(rect, rects, connected))#add this rect's cluster to list of clusters
-    return clusters
-    
-@with_continuations()
-def get_rect_cluster(rect, rects, connected, self=None):
-    #Recursive function used by get_rect_clusters. Gets a cluster of rects from the given rect.
-
-    #Resulting list of rects for our cluster
-    cluster = [rect]
-
-    #After this function our rect will be done.
-    connected.add(str(rect))#str() in order to hash our list
-
-    for candidate_rect in rects:
-        if str(candidate_rect) not in connected:#Rects that are not part of a cluster yet 
-            if rects_connected(rect, candidate_rect):#These two rects are connected
-                cluster.append(candidate_rect)
-                cluster.extend(self(candidate_rect, rects, connected))#Extend this cluster to include all subclusters of this candidate rect
-    return cluster
+def rect_clusters(rects):
+    """
+    Arguments:
+        rects: nx4 array-like of [x1, y1, x2, y2] rects
+
+    Returns:
+        (labels, sizes), where labels[i] is the index of the cluster rects[i] is in,
+            and sizes[j] is the number of rects in cluster j.
+
+    A cluster is a group of rects which are connected by overlapping or bordering each other.
+
+    Rather than checking every pair of rects, we put each rect into a grid of cells as large as
+        the largest rect, by its top-left corner, so that a rect can only be connected to rects
+        in its own cell or the 8 around it. We then only check the pairs in neighboring cells,
+        and get the clusters from these connections as the connected components of a graph.
+        This is linear in the number of rects, as long as they don't all pile up in the same few cells.
+    """
+    rects = np.asarray(rects, dtype=np.int64).reshape(-1, 4)
+    n = len(rects)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    #Cell of each rect, and the rects sorted by cell, so each cell's rects are contiguous
+    cell_w = max(int((rects[:,2]-rects[:,0]).max()), 1)
+    cell_h = max(int((rects[:,3]-rects[:,1]).max()), 1)
+    cell_x, cell_y = rects[:,0]//cell_w, rects[:,1]//cell_h
+    cell_x -= cell_x.min()-1
+    cell_y -= cell_y.min()-1
+    n_cols = int(cell_x.max())+2
+    cells = cell_y*n_cols + cell_x
+    order = np.argsort(cells, kind="stable")
+    sorted_cells = cells[order]
+
+    #Pair each rect with every rect in its own cell after it, and in the 4 cells after its own, which covers every neighboring pair once
+    pairs = []
+    for offset in (0, 1, n_cols-1, n_cols, n_cols+1):
+        starts = np.searchsorted(sorted_cells, cells[order]+offset, side="left")
+        ends = np.searchsorted(sorted_cells, cells[order]+offset, side="right")
+        if offset == 0:
+            starts = np.arange(n)+1
+        counts = np.maximum(ends-starts, 0)
+        a = np.repeat(np.arange(n), counts)
+        b = np.repeat(starts, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts)-counts, counts)
+        pairs.append((order[a], order[b]))
+    a = np.concatenate([pair[0] for pair in pairs])
+    b = np.concatenate([pair[1] for pair in pairs])
+
+    #Keep the pairs which overlap or border each other
+    connected = (rects[a,0] <= rects[b,2]) & (rects[b,0] <= rects[a,2]) & (rects[a,1] <= rects[b,3]) & (rects[b,1] <= rects[a,3])
+    a, b = a[connected], b[connected]
+
+    _, labels = connected_components(coo_matrix((np.ones(len(a)), (a, b)), shape=(n, n)), directed=False)
+    return labels, np.bincount(labels)
 
 def windows(img, step_size, win_shape):
     #Yields windows of shape win_shape across our img, in steps step_size. Just uses img for the shape.
@@ -64,6 +83,66 @@ def windows(img, step_size, win_shape):
             if row_i + win_shape[0] <= img.shape[0] and col_i + win_shape[1] <= img.shape[1]:
                 yield (row_i, col_i, img[row_i:row_i + win_shape[0], col_i:col_i + win_shape[1]])
 
+def window_batches(img, step_size, win_shape, batch_size):
+    """
+    Yields the same windows as windows(), in batches of at most batch_size, as (rects, batch), where
+        rects: (n, 4) array of the [x1, y1, x2, y2] coordinates of each window in the batch
+        batch: (n, win_h, win_w, ...) array of those windows, ready to be given to a model
+
+    The windows are strided views of img from sliding_window_view, so nothing is copied
+        until a batch is gathered from them.
+    """
+    win_h, win_w = win_shape
+    if img.shape[0] < win_h or img.shape[1] < win_w:
+        return
+
+    #(rows, cols, ..., win_h, win_w) view with a window at every step_size, then move the window axes before any channels
+    views = np.lib.stride_tricks.sliding_window_view(img, win_shape, axis=(0,1))[::step_size, ::step_size]
+    views = np.moveaxis(views, (-2, -1), (2, 3))
+
+    row_i, col_i = np.divmod(np.arange(views.shape[0]*views.shape[1]), views.shape[1])
+    for start in range(0, len(row_i), batch_size):
+        rows, cols = row_i[start:start+batch_size], col_i[start:start+batch_size]
+        y1, x1 = rows*step_size, cols*step_size
+        yield np.stack([x1, y1, x1+win_w, y1+win_h], axis=1), views[rows, cols]
+
+def grid_overlay(img, grid, colors, sub_h, sub_w, alpha, region=None, out=None):
+    """
+    Arguments:
+        img: uint8 image the grid was made on, with each cell of the grid covering a sub_h x sub_w block of it
+        grid: 2d array of indices into colors
+        colors: list of the color of each index in grid, in the same channel order as img
+        alpha: opacity of the colors
+        region: (row1, col1, row2, col2) of the cells to overlay, defaults to all of them
+        out: uint8 image to write the result into, defaults to img, which is overlaid in place
+
+    Returns:
+        out, with the color of each cell in region blended with the img pixels it covers,
+            i.e. alpha*color + (1-alpha)*img, the same as weighted_overlay() with a rectangle drawn for each cell.
+
+    Rather than drawing each cell, we look up the color of every cell in the region at once and
+        repeat each one over its block, and blend in uint16 fixed point so nothing is converted to float.
+    """
+    if out is None:
+        out = img
+    row1, col1, row2, col2 = region if region is not None else (0, 0, grid.shape[0], grid.shape[1])
+    y1, x1, y2, x2 = row1*sub_h, col1*sub_w, min(row2*sub_h, img.shape[0]), min(col2*sub_w, img.shape[1])
+
+    #Colors premultiplied by alpha, as fractions of 256
+    a = int(round(alpha*256))
+    weighted_colors = np.asarray(colors, dtype=np.uint16)*a
+
+    overlay = weighted_colors[grid[row1:row2, col1:col2]]
+    overlay = np.repeat(np.repeat(overlay, sub_h, axis=0), sub_w, axis=1)[:y2-y1, :x2-x1]
+
+    blended = img[y1:y2, x1:x2].astype(np.uint16)
+    blended *= 256-a
+    blended += overlay
+    blended += 128
+    blended >>= 8
+    out[y1:y2, x1:x2] = blended
+    return out
+
 def weighted_overlay(img, overlay, alpha):
     #Overlays our overlay onto our img with alpha transparency, and returns the resulting combined img
     return cv2.addWeighted(overlay.astype(np.uint8), alpha, img, 1-alpha, 0)
@@ -1,6 +1,13 @@
-#Only starts the session.
-from Session import Session
+#Only starts the session, or runs one of our commands without the GUI.
 import sys
-Session(sys.argv)
-Session.start()
 
+#Commands which run without the GUI, see Batch
+BATCH_COMMANDS = ("ingest", "export", "stats")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] in BATCH_COMMANDS:
+        from Batch import run
+        sys.exit(run(sys.argv))
+    else:
+        from Session import Session
+        Session(sys.argv)
@@ -0,0 +1,82 @@
+import os, sys, types
+import numpy as np
+import pytest
+
+#Our modules are imported from the top of the repository, and the GUI is drawn without a display
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from config import CHUNK_STORE_FNAME
+from ChunkStore import ChunkStore
+import Images as images_module
+from Images import Images
+from base import file_hash
+from Labels import Labels
+from Classifications import Classifications
+from Dataset import Dataset
+
+@pytest.fixture
+def session_dir(tmp_path, monkeypatch):
+    """
+    An empty input directory and a labels file, in a temporary directory we run in,
+        since all of our data/ paths are relative to where we're ran.
+
+    Our images are given as an already converted 96x128 .npy file, as a session converted
+        before we had a manifest would have, so that they don't depend on decoding image files.
+    """
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("data/images")
+    os.makedirs("input")
+    np.save("data/images/0000.npy", np.random.RandomState(0).randint(0, 256, (96, 128, 3)).astype(np.uint8))
+    with open("labels.txt", "w") as f:
+        f.write("a\nb\n")
+    return tmp_path
+
+def load_npy(fpath):
+    #Decodes our input images, which are .npy files rather than image files, see Images.load_image()
+    return np.load(fpath), file_hash(fpath), os.path.getsize(fpath), 0.0
+
+@pytest.fixture
+def npy_inputs(session_dir, monkeypatch):
+    """
+    Has our input images decoded as .npy files, so they can be written as any array.
+        Returns a function writing input/{fname} with the given image.
+    """
+    monkeypatch.setattr(images_module, "load_image", load_npy)
+    def write_input(fname, img):
+        with open(os.path.join("input", fname), "wb") as f:
+            np.save(f, img)
+    return write_input
+
+@pytest.fixture
+def dataset(session_dir):
+    #Our session with 16x16 windows, saved and closed once the test is done
+    dataset = Dataset("input/", "output.npy", "labels.txt", False, 16, 16)
+    yield dataset
+    dataset.classifications.close()
+    dataset.close()
+
+@pytest.fixture
+def chunked_dataset(session_dir):
+    """
+    A session of 4 random 320x480 images in a chunked store, with every window of
+        the even images labeled "a" and of the odd images labeled "b".
+
+    The images are stored without a manifest, so each is its own tile, and without
+        pyramid levels, so everything reads them from the store.
+
+    Returns a namespace of the images as arrays (imgs), and our images, labels and classifications.
+    """
+    store = ChunkStore(CHUNK_STORE_FNAME, 16, 16)
+    rng = np.random.RandomState(1)
+    imgs = [rng.randint(0, 256, (320, 480, 3)).astype(np.uint8) for i in range(4)]
+    for i, img in enumerate(imgs):
+        store[i] = img
+    store.f.close()
+
+    images = Images("input/", False, 16, 16, workers=1, store="chunked")
+    classifications = Classifications(images, "output.npy", False)
+    for i in range(len(images)):
+        classifications.label(i, 0, 0, np.ones(classifications.grid_shape(i), dtype=bool), 1 + i%2)
+    classifications.close()
+    return types.SimpleNamespace(imgs=imgs, images=images, labels=Labels("labels.txt"), classifications=classifications)
@@ -0,0 +1,16 @@
+import json
+
+import Batch
+
+def test_stats(session_dir, capsys):
+    assert Batch.run(["tako.py", "stats", "input/", "output.npy", "labels.txt", "16", "16", "--workers", "1", "--progress", "json"]) == Batch.EXIT_SUCCESS
+    done = json.loads(capsys.readouterr().out.splitlines()[-1])
+    assert done["event"] == "done" and done["outputs"] == ["output_stats.csv"]
+    assert done["windows"] == {"Nothing": 48, "a": 0, "b": 0}
+
+def test_missing_labels_file_is_invalid(session_dir, capsys):
+    assert Batch.run(["tako.py", "ingest", "input/", "output.npy", "missing.txt", "16", "16", "--progress", "json"]) == Batch.EXIT_INVALID
+    assert json.loads(capsys.readouterr().out.splitlines()[-1])["event"] == "error"
+
+def test_extra_args_are_invalid(session_dir):
+    assert Batch.run(["tako.py", "export", "input/", "output.npy", "labels.txt", "16", "16", "reset"]) == Batch.EXIT_INVALID
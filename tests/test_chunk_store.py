@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+from ChunkStore import ChunkStore
+
+def test_crash_before_index_is_saved_keeps_stored_images(tmp_path, monkeypatch):
+    fpath = str(tmp_path / "images.chunks")
+    img = np.arange(40*48*3, dtype=np.uint8).reshape(40, 48, 3)
+    store = ChunkStore(fpath, 16, 16)
+    store[0] = img
+
+    #Crash after writing the chunks of a new image, before its index is saved
+    def crash():
+        raise OSError("crashed")
+    monkeypatch.setattr(store, "save_index", crash)
+    with pytest.raises(OSError):
+        store[1] = 255-img
+    store.f.close()
+
+    store = ChunkStore(fpath, 16, 16)
+    assert len(store) == 1
+    assert np.array_equal(store[0][:, :], img)
+
+    #And we can keep adding images after it
+    store[1] = 255-img
+    store.f.close()
+    store = ChunkStore(fpath, 16, 16)
+    assert np.array_equal(store[0][:, :], img)
+    assert np.array_equal(store[1][:, :], 255-img)
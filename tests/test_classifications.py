@@ -0,0 +1,66 @@
+import os
+import numpy as np
+
+from Classifications import write_windows
+
+def label_cells(classifications):
+    #Labels 5 cells of our 6x8 grid, across 3 rows
+    classifications.label(0, 1, 2, np.ones((2, 2), dtype=bool), 1)
+    classifications.label(0, 5, 7, np.ones((1, 1), dtype=bool), 2)
+    classifications.flush()
+
+def test_export(dataset):
+    label_cells(dataset.classifications)
+    dataset.classifications.export()
+
+    img = np.load("data/images/0000.npy")
+    X, Y, I = [np.load("output_{}.npy".format(output)) for output in "XYI"]
+    assert np.array_equal(Y, [0, 0, 0, 0, 1])
+    assert np.array_equal(I, [[0, 1, 2], [0, 1, 3], [0, 2, 2], [0, 2, 3], [0, 5, 7]])
+    for x, (i, row, col) in zip(X, I):
+        assert np.array_equal(x, img[row*16:(row+1)*16, col*16:(col+1)*16])
+
+def test_export_shards_removes_earlier_shards(dataset):
+    label_cells(dataset.classifications)
+    dataset.classifications.export_shards(shard_samples=1)
+    assert os.path.exists("output_X_00004.npy")
+
+    index = dataset.classifications.export_shards(shard_samples=2)
+    assert len(index["shards"]) == 3
+    assert sorted(f for f in os.listdir(".") if f.startswith("output_X_")) == ["output_X_00000.npy", "output_X_00001.npy", "output_X_00002.npy"]
+    assert np.array_equal(np.concatenate([np.load(shard["Y"]) for shard in index["shards"]]), [0, 0, 0, 0, 1])
+
+def test_export_shards_in_parallel_from_chunked_images(chunked_dataset):
+    imgs, classifications = chunked_dataset.imgs, chunked_dataset.classifications
+    index = classifications.export_shards(shard_samples=100, workers=4)
+    for shard in index["shards"]:
+        for x, (i, row, col) in zip(np.load(shard["X"]), np.load(shard["I"])):
+            assert np.array_equal(x, imgs[i][row*16:(row+1)*16, col*16:(col+1)*16])
+
+class ReadCounter():
+    #Images of one image, which count how many of its pixels are read
+    win_h, win_w = 16, 16
+
+    def __init__(self, img):
+        self.img = img
+        self.read = 0
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            return self
+        region = self.img[key]
+        self.read += region.shape[0]*region.shape[1]
+        return region
+
+def test_write_windows_only_reads_the_windows_it_needs(tmp_path):
+    img = ReadCounter(np.random.RandomState(0).randint(0, 256, (32, 16*100)).astype(np.uint8))
+
+    #A sparse row, read one window at a time, and a dense one read from its first to last window
+    cells = np.array([[0, 0, 90, 1], [0, 0, 3, 1]] + [[0, 1, col, 2] for col in range(10, 20) if col != 15])
+    fpaths = [str(tmp_path / "output_{}.npy".format(output)) for output in "XYI"]
+    write_windows(img, cells, fpaths, (16, 16), np.uint8)
+    assert img.read == (2 + 10)*16*16
+
+    X = np.load(fpaths[0])
+    for x, (i, row, col, label_id) in zip(X, cells):
+        assert np.array_equal(x, img.img[row*16:(row+1)*16, col*16:(col+1)*16])
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from ImageTiles import ImageTiles
+from Dataset import Dataset
+
+def test_sqlite_store_starts_with_npy_classifications(session_dir):
+    dataset = Dataset("input/", "output.npy", "labels.txt", False, 16, 16)
+    dataset.classifications.label(0, 1, 2, np.ones((2, 2), dtype=bool), 1)
+    dataset.classifications.label(0, 5, 7, np.ones((1, 1), dtype=bool), 2)
+    grid = dataset.classifications[0]
+    dataset.classifications.close()
+    dataset.close()
+
+    dataset = Dataset("input/", "output.npy", "labels.txt", False, 16, 16, store="sqlite")
+    assert np.array_equal(dataset.classifications[0], grid)
+    dataset.classifications.export()
+    dataset.classifications.close()
+    dataset.close()
+    assert np.array_equal(np.load("output_Y.npy"), [0, 0, 0, 0, 1])
+
+    #Only a new database is given them, so they aren't given again once edited
+    dataset = Dataset("input/", "output.npy", "labels.txt", False, 16, 16, store="sqlite")
+    dataset.classifications.label(0, 1, 2, np.ones((2, 2), dtype=bool), 0)
+    dataset.classifications.close()
+    dataset.close()
+    dataset = Dataset("input/", "output.npy", "labels.txt", False, 16, 16, store="sqlite")
+    assert dataset.classifications[0].sum() == 2
+    dataset.classifications.close()
+    dataset.close()
+
+@pytest.mark.parametrize("store", ["npy", "sqlite"])
+def test_orphaned_tiles_lose_their_classifications(npy_inputs, monkeypatch, store):
+    #Tiles of at most 64x64, so our 128x128 image has 4
+    monkeypatch.setattr(ImageTiles.__init__, "__defaults__", (64*64*3,))
+    npy_inputs("a.npy", np.zeros((128, 128, 3), dtype=np.uint8))
+    dataset = Dataset("input/", "output.npy", "labels.txt", True, 16, 16, workers=1, store=store)
+    assert len(dataset.images) == 4
+    dataset.classifications.label(1, 0, 0, np.ones((4, 4), dtype=bool), 1)
+    dataset.classifications.close()
+    dataset.close()
+
+    #Now only one tile, leaving the rest orphaned
+    npy_inputs("a.npy", np.zeros((64, 64, 3), dtype=np.uint8))
+    dataset = Dataset("input/", "output.npy", "labels.txt", False, 16, 16, workers=1, store=store)
+    assert dataset.images.tiles[1] is None
+    assert dataset.classifications[1].size == 0
+    dataset.classifications.export()
+    dataset.classifications.close()
+    dataset.close()
+    assert len(np.load("output_Y.npy")) == 0
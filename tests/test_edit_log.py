@@ -0,0 +1,70 @@
+import os
+import numpy as np
+
+from config import EDIT_LOG_FNAME
+from EditLog import EditLog, RECORD
+from Images import Images
+from Classifications import Classifications
+
+def crash(classifications):
+    #Stops saving in the background without saving anything, as if we were killed
+    classifications.stopped.set()
+    classifications.saver.join()
+
+def edit(classifications):
+    #Labels a masked and an unmasked region, and returns the grid they make
+    mask = np.array([[True, False, True], [False, True, False]])
+    classifications.label(0, 1, 2, mask, 1)
+    classifications.label(0, 4, 0, np.ones((2, 3), dtype=bool), 2)
+    return classifications[0].copy()
+
+def test_records_are_read_as_they_were_appended(tmp_path):
+    log = EditLog(str(tmp_path / "edits.log"))
+    mask = np.random.RandomState(0).rand(5, 11) < 0.5
+    log.append(3, 1, 2, mask, 1)
+    log.append(4, 0, 0, np.ones((2, 2), dtype=bool), 2)
+    log.flush()
+
+    records = list(log.records())
+    assert [record[1:4] + (record[5],) for record in records] == [(3, 1, 2, 1), (4, 0, 0, 2)]
+    assert np.array_equal(records[0][4], mask)
+    assert np.array_equal(records[1][4], np.ones((2, 2), dtype=bool))
+
+    #A record cut off partway through is left out
+    with open(log.fpath, "ab") as f:
+        f.write(RECORD.pack(0.0, 5, 0, 0, 4, 4, 1, True))
+    assert len(list(log.records())) == 2
+    log.close()
+
+def test_edits_are_recovered_after_a_crash(session_dir):
+    images = Images("input/", False, 16, 16, workers=1)
+    classifications = Classifications(images, "output.npy", False)
+    grid = edit(classifications)
+    classifications.flush()
+    crash(classifications)
+
+    #Our edits were only in the log, and are replayed into our grid when we start again
+    assert not np.load(classifications.classifications[0]).any()
+    classifications = Classifications(images, "output.npy", False)
+    assert np.array_equal(classifications[0], grid)
+    assert np.array_equal(np.load(classifications.classifications[0]), grid)
+    assert list(classifications.log.records()) == []
+    classifications.close()
+
+def test_edits_are_recovered_after_a_crash_while_compacting(session_dir):
+    images = Images("input/", False, 16, 16, workers=1)
+    classifications = Classifications(images, "output.npy", False)
+    grid = edit(classifications)
+
+    #Crashing after rotating the log but before saving the grids, with more edits made in the new log since
+    classifications.log.rotate()
+    classifications.label(0, 0, 0, np.ones((1, 1), dtype=bool), 2)
+    grid[0, 0] = 2
+    classifications.flush()
+    crash(classifications)
+    assert os.path.exists(EDIT_LOG_FNAME + ".old")
+
+    classifications = Classifications(images, "output.npy", False)
+    assert np.array_equal(classifications[0], grid)
+    assert not os.path.exists(EDIT_LOG_FNAME + ".old")
+    classifications.close()
@@ -0,0 +1,33 @@
+import os
+import numpy as np
+
+from Dataset import Dataset
+from Export import export_stats
+
+def test_export_stats_in_parallel_from_chunked_images(chunked_dataset):
+    #Our overlays are read from the chunked store itself, since our images have no pyramid levels
+    totals = export_stats(chunked_dataset, "serial.csv", "serial", 1)
+    assert totals.tolist() == [0, 2*20*30, 2*20*30]
+
+    assert np.array_equal(export_stats(chunked_dataset, "parallel.csv", "parallel", 4), totals)
+    with open("serial.csv") as serial, open("parallel.csv") as parallel:
+        assert serial.read() == parallel.read()
+    for fname in os.listdir("serial"):
+        with open(os.path.join("serial", fname), "rb") as serial, open(os.path.join("parallel", fname), "rb") as parallel:
+            assert serial.read() == parallel.read()
+
+def test_export_stats_counts_sqlite_labels_without_loading_grids(session_dir, monkeypatch):
+    dataset = Dataset("input/", "output.npy", "labels.txt", False, 16, 16, workers=1, store="sqlite")
+    dataset.classifications.label(0, 1, 2, np.ones((2, 3), dtype=bool), 1)
+    dataset.classifications.label(0, 5, 7, np.ones((1, 1), dtype=bool), 2)
+    dataset.classifications.close()
+    assert dataset.database.images_with_label(2) == [0] and dataset.database.images_with_label(3) == []
+    expected = export_stats(dataset, "grids.csv", "overlays", 1)
+
+    def load(i):
+        raise AssertionError("loaded a grid")
+    monkeypatch.setattr(dataset.classifications, "load", load)
+    assert export_stats(dataset, "database.csv", None, 1).tolist() == expected.tolist() == [48-7, 6, 1]
+    with open("grids.csv") as grids, open("database.csv") as database:
+        assert grids.read() == database.read()
+    dataset.close()
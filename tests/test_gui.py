@@ -0,0 +1,103 @@
+import pytest
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+pytest.importorskip("PyQt5.QtWidgets")
+from PyQt5.QtCore import Qt, QEvent, QPoint, QPointF
+from PyQt5.QtGui import QMouseEvent
+from PyQt5.QtWidgets import QApplication
+from GUI import Canvas, Toolbar
+from gui_base import ImageCache
+from config import RECT_SELECT, LASSO_SELECT, PENCIL
+
+@pytest.fixture
+def canvas(dataset, monkeypatch):
+    canvas = Canvas(dataset, 1080, 1920, 16, 16)
+
+    #Count every time we label, wrapping rather than replacing it so labels are still made
+    canvas.label_calls = []
+    label = dataset.classifications.label
+    def counted_label(*args):
+        canvas.label_calls.append(args)
+        return label(*args)
+    monkeypatch.setattr(dataset.classifications, "label", counted_label)
+
+    yield canvas
+    canvas.close()
+
+def send_mouse(canvas, event_type, x, y, button=Qt.LeftButton):
+    #Sends a mouse event at image coordinates (x, y) to our view, as Qt would
+    point = canvas.view.mapFromScene(QPointF(x, y))
+    buttons = Qt.NoButton if event_type == QEvent.MouseButtonRelease else button
+    QApplication.sendEvent(canvas.view.viewport(), QMouseEvent(event_type, QPointF(point), button, buttons, Qt.NoModifier))
+
+def test_canvas_constructs(canvas):
+    assert canvas.tool == RECT_SELECT
+    assert (canvas.img_h, canvas.img_w) == (96, 128)
+    assert canvas.overlay.grid.shape == (6, 8)
+
+def test_toolbar_constructs(canvas, dataset):
+    toolbar = Toolbar(dataset, canvas, 1080, 1920, 16, 16)
+    assert len(toolbar.tool_buttons) == 4 and len(toolbar.label_buttons) == len(dataset.labels)
+
+    #Its tools and sliders are connected to our canvas
+    toolbar.tool_buttons[2].button.click()
+    assert canvas.tool == PENCIL
+    canvas.zoom_slider.setValue(100)
+    assert canvas.zoom > 1
+    toolbar.close()
+
+def test_rect_select_labels_once(canvas):
+    send_mouse(canvas, QEvent.MouseButtonPress, 1, 1)
+    send_mouse(canvas, QEvent.MouseMove, 40, 40)
+    send_mouse(canvas, QEvent.MouseButtonRelease, 40, 40)
+
+    assert len(canvas.label_calls) == 1
+    assert canvas.dataset.classifications[0][:2, :2].all()
+
+def test_lasso_select_labels_once(canvas):
+    canvas.tool = LASSO_SELECT
+    send_mouse(canvas, QEvent.MouseButtonPress, 0, 0)
+    for x, y in [(80, 0), (80, 80), (0, 80)]:
+        send_mouse(canvas, QEvent.MouseMove, x, y)
+    send_mouse(canvas, QEvent.MouseButtonRelease, 0, 80)
+
+    assert len(canvas.label_calls) == 1
+    assert np.count_nonzero(canvas.dataset.classifications[0]) > 0
+
+def test_pencil_labels_once_per_window(canvas):
+    canvas.tool = PENCIL
+    canvas.pencil_size = 0
+    send_mouse(canvas, QEvent.MouseButtonPress, 8, 8)
+    send_mouse(canvas, QEvent.MouseMove, 10, 10)
+    send_mouse(canvas, QEvent.MouseMove, 8, 90)
+    send_mouse(canvas, QEvent.MouseButtonRelease, 8, 90)
+
+    #Once when pressed, not when moving within the same window, and once for the stroke to the last window
+    assert len(canvas.label_calls) == 2
+    assert canvas.dataset.classifications[0][:, 0].all()
+
+class FailingImages():
+    #Images whose pyramid fails to load the first time it's read
+    def __init__(self, images):
+        self.images = images
+        self.failed = False
+
+    def pyramid(self, i, k):
+        if not self.failed:
+            self.failed = True
+            raise OSError("Input/output error")
+        return self.images.pyramid(i, k)
+
+def test_image_cache_retries_failed_tiles(dataset, capsys):
+    cache = ImageCache(FailingImages(dataset.images))
+    key = (0, 0, 0, 0)
+    cache.request(key)
+    cache.pool.shutdown(wait=True)
+    assert cache.get(key, load=False) is None and key not in cache.loading
+    assert "Input/output error" in capsys.readouterr().err
+
+    cache.pool = ThreadPoolExecutor(max_workers=1)
+    cache.request(key)
+    cache.pool.shutdown(wait=True)
+    assert cache.get(key, load=False).size().width() == 128
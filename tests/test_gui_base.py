@@ -0,0 +1,70 @@
+import pytest
+import numpy as np
+
+pytest.importorskip("PyQt5.QtGui")
+from PyQt5.QtCore import QPointF
+from PyQt5.QtGui import QPolygonF
+from gui_base import approximate_polygon, brush_stencil, bresenham_line, brush_stroke
+
+def in_polygon(points, x, y):
+    #Whether (x, y) is inside the polygon by the even-odd rule, counting the edges crossing its row at or left of it
+    inside = False
+    for (x1, y1), (x2, y2) in zip(points, np.roll(points, -1, axis=0)):
+        if min(y1, y2) <= y < max(y1, y2) and x1 + (y-y1)*(x2-x1)/(y2-y1) <= x:
+            inside = not inside
+    return inside
+
+@pytest.mark.parametrize("seed", range(20))
+def test_lasso_selects_the_windows_whose_centers_are_inside(seed):
+    #Random polygons, including self-intersecting ones and ones partly outside the image
+    rng = np.random.RandomState(seed)
+    img_h, img_w, step_h, step_w = 200, 300, 16, 12
+    points = rng.uniform(-50, 350, (rng.randint(3, 12), 2))
+    mask, row, col = approximate_polygon(QPolygonF([QPointF(x, y) for x, y in points]), img_h, img_w, step_h, step_w)
+
+    selected = np.zeros((img_h//step_h, img_w//step_w), dtype=bool)
+    selected[row:row+mask.shape[0], col:col+mask.shape[1]] = mask
+    expected = np.array([[in_polygon(points, c*step_w + step_w//2, r*step_h + step_h//2) for c in range(selected.shape[1])] for r in range(selected.shape[0])])
+    assert np.array_equal(selected, expected)
+
+def test_lasso_selects_nothing_outside_the_image():
+    polygon = QPolygonF([QPointF(-100, -100), QPointF(-10, -100), QPointF(-10, -10)])
+    mask, row, col = approximate_polygon(polygon, 200, 300, 16, 16)
+    assert mask.size == 0
+
+@pytest.mark.parametrize("seed", range(20))
+def test_bresenham_line_steps_along_the_nearest_cells(seed):
+    row1, col1, row2, col2 = np.random.RandomState(seed).randint(-20, 20, 4)
+    rows, cols = bresenham_line(row1, col1, row2, col2)
+    n = max(abs(row2-row1), abs(col2-col1))
+    assert len(rows) == n+1
+    assert (rows[0], cols[0], rows[-1], cols[-1]) == (row1, col1, row2, col2)
+
+    #One cell per step along the longer axis, each the nearest to the exact line
+    t = np.arange(n+1)/max(n, 1)
+    assert np.abs(rows - (row1 + t*(row2-row1))).max() <= 0.5
+    assert np.abs(cols - (col1 + t*(col2-col1))).max() <= 0.5
+    assert (np.abs(np.diff(rows)) <= 1).all() and (np.abs(np.diff(cols)) <= 1).all()
+
+@pytest.mark.parametrize("seed", range(20))
+def test_brush_stroke_is_the_stencil_stamped_along_the_line(seed):
+    rng = np.random.RandomState(seed)
+    row1, col1, row2, col2 = rng.randint(-10, 30, 4)
+    r = rng.randint(0, 6)
+    mask, row, col = brush_stroke(row1, col1, row2, col2, r)
+
+    #Every window within r of a cell of the line, on a grid large enough for all of them
+    expected = np.zeros((60, 60), dtype=bool)
+    grid_row, grid_col = np.ogrid[-20:40, -20:40]
+    for line_row, line_col in zip(*bresenham_line(row1, col1, row2, col2)):
+        expected |= (grid_row-line_row)**2 + (grid_col-line_col)**2 <= r**2
+
+    stroke = np.zeros((60, 60), dtype=bool)
+    stroke[row+20:row+20+mask.shape[0], col+20:col+20+mask.shape[1]] = mask
+    assert np.array_equal(stroke, expected)
+
+def test_brush_stencil_is_cached_and_read_only():
+    assert brush_stencil(3) is brush_stencil(3)
+    assert brush_stencil(3).shape == (7, 7) and brush_stencil(0).tolist() == [[True]]
+    with pytest.raises(ValueError):
+        brush_stencil(3)[0, 0] = True
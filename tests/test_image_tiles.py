@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from ImageTiles import ImageTiles
+
+@pytest.mark.parametrize("shape", [(96, 128, 3), (100, 130, 3), (5, 7, 3), (16, 300), (1000, 17, 4)])
+@pytest.mark.parametrize("max_bytes", [1, 16*16*3, 40*40*3, 1e9])
+def test_tiles_cover_the_image_once_along_windows(shape, max_bytes):
+    img = np.zeros(shape, dtype=np.uint8)
+    tiles = ImageTiles(img, 16, 16, max_bytes)
+    assert tiles.tile_h % 16 == 0 and tiles.tile_w % 16 == 0
+
+    #Every pixel is in exactly one tile
+    covered = np.zeros(shape[:2], dtype=np.int64)
+    for (y, x, h, w), tile in zip(tiles.origins, tiles):
+        assert y % 16 == 0 and x % 16 == 0
+        assert 0 < h <= tiles.tile_h and 0 < w <= tiles.tile_w
+        assert tile.shape == (h, w) + shape[2:]
+        assert np.shares_memory(tile, img)
+        covered[y:y+h, x:x+w] += 1
+    assert (covered == 1).all()
+
+    #Each tile fits in max_bytes, unless it's already a single window
+    tile_bytes = tiles.tile_h*tiles.tile_w*int(np.prod(shape[2:]))
+    assert tile_bytes <= max_bytes or (tiles.tile_h, tiles.tile_w) == (16, 16)
+
+def test_tiles_are_as_large_as_fit():
+    #Halving each side of a 64x64 image is the first division which fits
+    tiles = ImageTiles(np.zeros((64, 64, 3), dtype=np.uint8), 16, 16, 32*32*3)
+    assert (tiles.tile_h, tiles.tile_w) == (32, 32) and len(tiles) == 4
+
+    tiles = ImageTiles(np.zeros((64, 64, 3), dtype=np.uint8), 16, 16, 64*64*3)
+    assert len(tiles) == 1 and tiles[0].shape == (64, 64, 3)
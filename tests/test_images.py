@@ -0,0 +1,109 @@
+import os, threading
+import numpy as np
+import pytest
+
+import Images as images_module
+from Images import Images
+from config import INGEST_QUEUE_SIZE, MANIFEST_FNAME
+from base import load_json, save_json
+
+def load_zeros(fpath):
+    #Decodes every input image as the same blank image, regardless of its contents, see Images.load_image()
+    return np.zeros((40, 40, 3), dtype=np.uint8), "hash", 1, 0.0
+
+@pytest.fixture
+def input_images(session_dir, monkeypatch):
+    #More input images than fit in our queues
+    for i in range(3*INGEST_QUEUE_SIZE):
+        with open(os.path.join("input", "{}.png".format(i)), "wb") as f:
+            f.write(bytes([i]))
+    monkeypatch.setattr(images_module, "load_image", load_zeros)
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_ingest(input_images, workers):
+    images = Images("input/", True, 16, 16, workers)
+    assert len(images) == 3*INGEST_QUEUE_SIZE
+    assert images.shape(0) == (40, 40, 3)
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_ingest_raises_when_writing_fails(input_images, monkeypatch, workers):
+    def save_source(self, s, img):
+        raise OSError("No space left on device")
+    monkeypatch.setattr(Images, "save_source", save_source)
+
+    #Ingest in a thread, so that if it hangs the test fails rather than hanging too
+    errors = []
+    def ingest():
+        try:
+            Images("input/", True, 16, 16, workers)
+        except OSError as e:
+            errors.append(e)
+    thread = threading.Thread(target=ingest, daemon=True)
+    thread.start()
+    thread.join(10)
+
+    assert not thread.is_alive()
+    assert len(errors) == 1 and "No space left" in str(errors[0])
+
+def test_ingest_only_new_or_changed_images(npy_inputs):
+    npy_inputs("a.npy", np.zeros((40, 40, 3), dtype=np.uint8))
+    npy_inputs("b.npy", np.ones((40, 40, 3), dtype=np.uint8))
+    images = Images("input/", True, 16, 16, workers=1)
+    assert images.ingested == [0, 1]
+
+    images = Images("input/", False, 16, 16, workers=1)
+    assert images.ingested == []
+
+    #Changed images keep their tiles, and new ones are added after them
+    npy_inputs("c.npy", np.full((40, 40, 3), 3, dtype=np.uint8))
+    npy_inputs("a.npy", np.full((48, 40, 3), 2, dtype=np.uint8))
+    images = Images("input/", False, 16, 16, workers=1)
+    assert sorted(images.ingested) == [0, 2]
+    assert [int(np.asarray(images[i])[0, 0, 0]) for i in range(3)] == [2, 1, 3]
+    assert images.shape(0) == (48, 40, 3)
+
+def test_ingest_matches_images_however_input_dir_is_given(npy_inputs):
+    npy_inputs("a.npy", np.zeros((40, 40, 3), dtype=np.uint8))
+    Images("input/", True, 16, 16, workers=1)
+    images = Images("./input", False, 16, 16, workers=1)
+    assert images.ingested == [] and len(images) == 1
+
+    #Including with a manifest from before our images were recorded relative to our input_dir
+    manifest = load_json(MANIFEST_FNAME, None)
+    manifest["images"] = {os.path.join("input/", fpath): entry for fpath, entry in manifest["images"].items()}
+    del manifest["relative"]
+    save_json(MANIFEST_FNAME, manifest)
+    images = Images("input/", False, 16, 16, workers=1)
+    assert images.ingested == [] and len(images) == 1
+    assert list(load_json(MANIFEST_FNAME, None)["images"]) == ["a.npy"]
+
+def test_ingest_only_hashes_images_whose_size_or_mtime_changed(npy_inputs, monkeypatch):
+    npy_inputs("a.npy", np.zeros((40, 40, 3), dtype=np.uint8))
+    npy_inputs("b.npy", np.ones((40, 40, 3), dtype=np.uint8))
+    Images("input/", True, 16, 16, workers=1)
+
+    hashed = []
+    original_file_hash = images_module.file_hash
+    def file_hash(fpath):
+        hashed.append(os.path.basename(fpath))
+        return original_file_hash(fpath)
+    monkeypatch.setattr(images_module, "file_hash", file_hash)
+
+    #Only touched, so it's hashed but not converted again, and its new mtime is recorded
+    stat = os.stat("input/a.npy")
+    os.utime("input/a.npy", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    images = Images("input/", False, 16, 16, workers=1)
+    assert images.ingested == [] and hashed == ["a.npy"]
+    assert load_json(MANIFEST_FNAME, None)["images"]["a.npy"]["mtime"] == os.stat("input/a.npy").st_mtime
+
+    hashed.clear()
+    images = Images("input/", False, 16, 16, workers=1)
+    assert images.ingested == [] and hashed == []
+
+    #Rewritten with the same size, but different contents
+    npy_inputs("b.npy", np.full((40, 40, 3), 5, dtype=np.uint8))
+    stat = os.stat("input/b.npy")
+    os.utime("input/b.npy", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    images = Images("input/", False, 16, 16, workers=1)
+    assert images.ingested == [1]
+    assert int(np.asarray(images[1])[0, 0, 0]) == 5
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from Loader import Loader
+
+def label_cells(classifications, n):
+    #Labels the first n cells of our grid in row-major order, alternating between our labels
+    for k in range(n):
+        classifications.label(0, k//8, k%8, np.ones((1, 1), dtype=bool), 1 + k%2)
+    classifications.flush()
+
+def test_exported_output_replaces_earlier_shards(dataset):
+    label_cells(dataset.classifications, 17)
+    dataset.classifications.export_shards(shard_samples=4)
+    label_cells(dataset.classifications, 33)
+    dataset.classifications.export()
+
+    loader = Loader("output.npy", batch_size=64, shuffle=False)
+    X, Y, I = next(iter(loader))
+    assert len(Y) == 33
+    assert np.array_equal(I, dataset.classifications.labeled_cells()[:, :3])
+
+def test_balanced_draws_each_label_equally(dataset):
+    #Many more "a" windows than "b" windows
+    for k in range(40):
+        dataset.classifications.label(0, k//8, k%8, np.ones((1, 1), dtype=bool), 1 if k < 36 else 2)
+    dataset.classifications.flush()
+
+    loader = Loader(dataset.classifications, batch_size=64, balanced=True, prefetch=0)
+    assert np.array_equal(loader.histogram(), [36, 4])
+    Y = np.concatenate([Y for epoch in range(50) for X, Y, I in loader])
+    assert len(Y) == 50*40
+    assert abs(np.mean(Y == 1) - 0.5) < 0.05
+
+@pytest.mark.parametrize("balanced", [False, True])
+def test_workers_iterate_over_each_sample_once(dataset, balanced):
+    label_cells(dataset.classifications, 40)
+    indices = [Loader(dataset.classifications, batch_size=8, balanced=balanced, seed=3, worker_id=worker_id, n_workers=3).indices(2) for worker_id in range(3)]
+
+    #Together they're the whole epoch of a single worker, each with its own every 3rd sample of it
+    epoch = Loader(dataset.classifications, batch_size=8, balanced=balanced, seed=3).indices(2)
+    assert sorted(np.concatenate(indices).tolist()) == sorted(epoch.tolist())
+    for worker_id in range(3):
+        assert np.array_equal(indices[worker_id], epoch[worker_id::3])
+
+    #And read exactly those samples
+    I = np.concatenate([I for worker_id in range(3) for X, Y, I in Loader(dataset.classifications, batch_size=8, seed=3, worker_id=worker_id, n_workers=3)])
+    assert sorted(map(tuple, I.tolist())) == sorted(map(tuple, dataset.classifications.labeled_cells()[:, :3].tolist()))
+
+@pytest.mark.parametrize("prefetch", [0, 2])
+def test_reader_errors_are_raised_while_iterating(dataset, prefetch):
+    label_cells(dataset.classifications, 40)
+    loader = Loader(dataset.classifications, batch_size=8, prefetch=prefetch)
+    read = loader.source.read
+    reads = []
+    def failing_read(indices):
+        #Reads the first batch, then fails
+        reads.append(indices)
+        if len(reads) > 1:
+            raise OSError("Input/output error")
+        return read(indices)
+    loader.source.read = failing_read
+
+    batches = iter(loader)
+    X, Y, I = next(batches)
+    assert len(Y) == 8
+    with pytest.raises(OSError, match="Input/output error"):
+        next(batches)
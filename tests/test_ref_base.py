@@ -0,0 +1,80 @@
+import os, importlib.util
+import numpy as np
+import pytest
+
+pytest.importorskip("cv2")
+
+#ref/base.py has the same name as our own base.py, so it's loaded from its path
+spec = importlib.util.spec_from_file_location("ref_base", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ref", "base.py"))
+ref_base = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(ref_base)
+
+def canonical(labels):
+    #Relabels clusters in order of their first rect, so the same clusters always have the same labels
+    firsts = {}
+    return [firsts.setdefault(label, len(firsts)) for label in labels]
+
+def brute_force_clusters(rects):
+    #Clusters by checking every pair of rects, joining them with union-find
+    parents = list(range(len(rects)))
+    def find(a):
+        while parents[a] != a:
+            a = parents[a]
+        return a
+    for a in range(len(rects)):
+        for b in range(a+1, len(rects)):
+            if rects[a][0] <= rects[b][2] and rects[b][0] <= rects[a][2] and rects[a][1] <= rects[b][3] and rects[b][1] <= rects[a][3]:
+                parents[find(a)] = find(b)
+    return canonical([find(a) for a in range(len(rects))])
+
+@pytest.mark.parametrize("seed", range(20))
+def test_rect_clusters_match_every_pair(seed):
+    #Rects of different sizes packed closely enough to overlap and border each other, some empty
+    rng = np.random.RandomState(seed)
+    n = rng.randint(1, 200)
+    x1, y1 = rng.randint(-100, 100, n), rng.randint(-100, 100, n)
+    rects = np.stack([x1, y1, x1 + rng.randint(0, 30, n), y1 + rng.randint(0, 10, n)], axis=1)
+
+    labels, sizes = ref_base.rect_clusters(rects)
+    assert canonical(labels) == brute_force_clusters(rects.tolist())
+    assert np.array_equal(sizes, np.bincount(labels))
+
+def test_rect_clusters_join_bordering_rects():
+    labels, sizes = ref_base.rect_clusters([[0, 0, 10, 10], [10, 0, 20, 10], [21, 0, 30, 10], [0, 10, 10, 20]])
+    assert canonical(labels) == [0, 0, 1, 0]
+    assert sorted(sizes.tolist()) == [1, 3]
+
+    labels, sizes = ref_base.rect_clusters(np.zeros((0, 4)))
+    assert len(labels) == 0 and len(sizes) == 0
+
+@pytest.mark.parametrize("region", [None, (1, 2, 4, 5), (3, 0, 7, 9)])
+@pytest.mark.parametrize("alpha", [0.0, 0.33, 0.5, 1.0])
+def test_grid_overlay_blends_each_pixel_with_its_cell(region, alpha):
+    #An image which doesn't divide evenly into cells, so the last row and column of cells are partial
+    rng = np.random.RandomState(0)
+    img = rng.randint(0, 256, (100, 130, 3)).astype(np.uint8)
+    grid = rng.randint(0, 4, (7, 9))
+    colors = rng.randint(0, 256, (4, 3)).tolist()
+
+    out = ref_base.grid_overlay(img, grid, colors, 16, 16, alpha, region, out=img.copy())
+
+    #Every pixel in region is its cell's color blended over it, and every other pixel is untouched
+    row1, col1, row2, col2 = region if region is not None else (0, 0, 7, 9)
+    expected = img.astype(np.float64)
+    for y in range(row1*16, min(row2*16, 100)):
+        for x in range(col1*16, min(col2*16, 130)):
+            expected[y, x] = alpha*np.array(colors[grid[y//16, x//16]]) + (1-alpha)*img[y, x]
+    assert np.abs(out - expected).max() <= 1
+
+    #As it would be with a rectangle drawn for each cell
+    drawn = img.copy()
+    for row in range(row1, row2):
+        for col in range(col1, col2):
+            drawn[row*16:(row+1)*16, col*16:(col+1)*16] = colors[grid[row, col]]
+    assert np.abs(out.astype(np.int64) - ref_base.weighted_overlay(img, drawn, alpha)).max() <= 1
+
+def test_grid_overlay_overlays_in_place():
+    img = np.zeros((32, 32, 3), dtype=np.uint8)
+    out = ref_base.grid_overlay(img, np.array([[0, 1], [1, 0]]), [[0, 0, 0], [255, 255, 255]], 16, 16, 1.0)
+    assert out is img
+    assert img[0, 16].tolist() == [255]*3 and img[0, 0].tolist() == [0]*3